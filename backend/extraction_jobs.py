@@ -0,0 +1,394 @@
+"""Blocking extraction jobs run in the extraction process pool (PyPDF2, openpyxl, python-docx, Pillow).
+
+Kept apart from server.py so spawned workers only import what the jobs need,
+not the web app, its MongoDB client and the retrieval stack.
+"""
+import os
+import logging
+import re
+import csv
+import codecs
+import random
+import signal
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+import PyPDF2
+import openpyxl
+from docx import Document
+from PIL import Image, ImageOps
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+try:
+    import xlrd  # .xls (Excel 97-2003) support - openpyxl only reads .xlsx
+    XLRD_AVAILABLE = True
+except ImportError:
+    XLRD_AVAILABLE = False
+
+# Spreadsheet ingestion - each sheet is summarized (column types and statistics, sampled rows) ahead of its rows;
+# rows past SPREADSHEET_MAX_ROWS only count towards the statistics
+SPREADSHEET_MAX_ROWS = int(os.environ.get("SPREADSHEET_MAX_ROWS", "20000"))  # Rows written out in full, per file
+SPREADSHEET_SAMPLE_ROWS = int(os.environ.get("SPREADSHEET_SAMPLE_ROWS", "20"))  # Random rows in each sheet summary, on top of the first ones
+SPREADSHEET_HEAD_ROWS = 5
+SPREADSHEET_TOP_VALUES = 5
+SPREADSHEET_DISTINCT_LIMIT = 1000  # Distinct values tracked per column
+SPREADSHEET_ROWS_HEADING = "=== Satırlar ==="  # Separates the summaries (always sent) from the rows (retrieved)
+
+# Vision preprocessing - images are reduced to what the vision model actually uses (it fits them into 2048px and then
+# scales the short side to 768px) and re-encoded as metadata-free JPEG
+VISION_MAX_LONG_EDGE = int(os.environ.get("VISION_MAX_LONG_EDGE", "2048"))
+VISION_MAX_SHORT_EDGE = int(os.environ.get("VISION_MAX_SHORT_EDGE", "768"))
+VISION_JPEG_QUALITY = int(os.environ.get("VISION_JPEG_QUALITY", "85"))
+
+INTEGER_CELL_PATTERN = re.compile(r"[+-]?\d+")
+DECIMAL_CELL_PATTERN = re.compile(r"[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?")
+TURKISH_DECIMAL_CELL_PATTERN = re.compile(r"[+-]?(\d{1,3}(\.\d{3})+(,\d+)?|\d+,\d+)")  # 1.234,56 / 12,5
+DATE_CELL_PATTERNS = (
+    re.compile(r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})([ T](?P<hour>\d{2}):(?P<minute>\d{2})(:(?P<second>\d{2}))?)?"),
+    re.compile(r"(?P<day>\d{1,2})[./](?P<month>\d{1,2})[./](?P<year>\d{4})( (?P<hour>\d{2}):(?P<minute>\d{2})(:(?P<second>\d{2}))?)?"),
+)
+
+def infer_cell_value(value: str):
+    """Type a CSV cell - integers, decimals (also Turkish 1.234,56), dates, otherwise text; empty cells are None"""
+    value = value.strip()
+    if not value:
+        return None
+    if not (value[0].isdigit() or value[0] in "+-."):
+        return value
+    if INTEGER_CELL_PATTERN.fullmatch(value):
+        # Keep codes like 007 or 0532... as text
+        return value if len(value.lstrip("+-")) > 1 and value.lstrip("+-").startswith("0") else int(value)
+    if DECIMAL_CELL_PATTERN.fullmatch(value):
+        return float(value)
+    if TURKISH_DECIMAL_CELL_PATTERN.fullmatch(value):
+        return float(value.replace(".", "").replace(",", "."))
+    for pattern in DATE_CELL_PATTERNS:
+        match = pattern.fullmatch(value)
+        if match:
+            try:
+                return datetime(*(int(match[field] or 0) for field in ("year", "month", "day", "hour", "minute", "second")))
+            except ValueError:
+                break
+    return value
+
+def format_cell(value) -> str:
+    """Render a cell for the LLM - compact numbers and dates, always on one line"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return str(round(value, 6))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=" ")
+    return " ".join(str(value).split())
+
+class SpreadsheetColumn:
+    """Streaming statistics for one column - memory stays bounded however many rows the sheet has"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.filled = 0
+        self.kinds = Counter()
+        self.total = 0.0
+        self.minimum = self.maximum = None
+        self.first_date = self.last_date = None
+        self.values = Counter()
+        self.distinct_capped = False
+    
+    def add(self, value):
+        self.filled += 1
+        if isinstance(value, bool):
+            self.kinds["mantıksal"] += 1
+        elif isinstance(value, (int, float)):
+            self.kinds["sayı"] += 1
+            self.total += value
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        elif isinstance(value, datetime):
+            self.kinds["tarih"] += 1
+            if self.first_date is None or value < self.first_date:
+                self.first_date = value
+            if self.last_date is None or value > self.last_date:
+                self.last_date = value
+        else:
+            self.kinds["metin"] += 1
+        
+        if value in self.values or len(self.values) < SPREADSHEET_DISTINCT_LIMIT:
+            self.values[value] += 1
+        else:
+            self.distinct_capped = True
+    
+    def describe(self, row_count: int) -> str:
+        if not self.filled:
+            return f"- {self.name}: boş"
+        kind, kind_count = self.kinds.most_common(1)[0]
+        parts = [kind if kind_count == self.filled else f"karışık, %{kind_count * 100 // self.filled} {kind}"]
+        parts.append(f"{self.filled} dolu" + (f", {row_count - self.filled} boş" if row_count > self.filled else ""))
+        if self.kinds["sayı"]:
+            parts.append(
+                f"min {format_cell(self.minimum)}, max {format_cell(self.maximum)}, "
+                f"ortalama {format_cell(self.total / self.kinds['sayı'])}, toplam {format_cell(self.total)}"
+            )
+        if self.kinds["tarih"]:
+            parts.append(f"{format_cell(self.first_date)} - {format_cell(self.last_date)}")
+        parts.append(f"{len(self.values)}{'+' if self.distinct_capped else ''} farklı değer")
+        most_common = self.values.most_common(SPREADSHEET_TOP_VALUES)
+        if most_common and most_common[0][1] > 1:
+            parts.append("en sık: " + ", ".join(f"{format_cell(value)} ({count})" for value, count in most_common))
+        return f"- {self.name}: " + "; ".join(parts)
+
+class SpreadsheetSheet:
+    """Streams one sheet's rows into column statistics, a row sample and (up to row_budget) the rendered rows"""
+    
+    def __init__(self, name: str, row_budget: int):
+        self.name = name
+        self.columns = None  # Named from the header row, or "Sütun N" when the first row is data
+        self.row_count = 0
+        self.rows = []
+        self.row_budget = row_budget
+        self.head = []
+        self.sample = []  # Reservoir sample of (row number, rendered row) after the head rows
+        self._random = random.Random(0)
+    
+    def add_row(self, values):
+        values = list(values)
+        while values and (values[-1] is None or values[-1] == ""):
+            values.pop()
+        if not values:
+            return
+        
+        if self.columns is None:
+            self.columns = []
+            if all(isinstance(value, str) or value is None for value in values):
+                self.columns = [SpreadsheetColumn(format_cell(value) or f"Sütun {number}") for number, value in enumerate(values, start=1)]
+                return
+        while len(self.columns) < len(values):
+            self.columns.append(SpreadsheetColumn(f"Sütun {len(self.columns) + 1}"))
+        
+        for column, value in zip(self.columns, values):
+            if value is not None and value != "":
+                column.add(value)
+        
+        self.row_count += 1
+        line = "\t".join(format_cell(value) for value in values)
+        if len(self.rows) < self.row_budget:
+            self.rows.append(line)
+        if len(self.head) < SPREADSHEET_HEAD_ROWS:
+            self.head.append((self.row_count, line))
+        elif len(self.sample) < SPREADSHEET_SAMPLE_ROWS:
+            self.sample.append((self.row_count, line))
+        else:
+            slot = self._random.randrange(self.row_count - SPREADSHEET_HEAD_ROWS)
+            if slot < SPREADSHEET_SAMPLE_ROWS:
+                self.sample[slot] = (self.row_count, line)
+    
+    def header_line(self) -> str:
+        return "\t".join(column.name for column in self.columns or [])
+    
+    def summary(self) -> str:
+        """Column types and statistics plus sampled rows - enough to answer aggregate questions without every row"""
+        lines = [f"=== Sayfa: {self.name} ({self.row_count} satır, {len(self.columns or [])} sütun) ==="]
+        if self.columns:
+            lines.append("Sütunlar:")
+            lines.extend(column.describe(self.row_count) for column in self.columns)
+        # Small sheets are in the rows section in full, no need to repeat them here
+        if len(self.rows) < self.row_count or self.row_count > SPREADSHEET_HEAD_ROWS + SPREADSHEET_SAMPLE_ROWS:
+            sampled = self.head + sorted(self.sample)
+            lines.append(f"Örnek satırlar ({len(sampled)}/{self.row_count}, ilk sütun satır no):")
+            lines.append("#\t" + self.header_line())
+            lines.extend(f"{row_number}\t{line}" for row_number, line in sampled)
+        return "\n".join(lines)
+    
+    def rows_section(self) -> str:
+        lines = [f"--- {self.name} ---", self.header_line()]
+        lines.extend(self.rows)
+        if len(self.rows) < self.row_count:
+            lines.append(f"[... kalan {self.row_count - len(self.rows)} satır yalnızca yukarıdaki özet istatistiklerde]")
+        return "\n".join(lines)
+
+def _iter_csv_rows(file_path: str):
+    with open(file_path, 'rb') as file:
+        sample = file.read(16 * 1024)
+    encoding = 'utf-8-sig'
+    try:
+        # Not final - the sample may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+    except UnicodeDecodeError:
+        encoding = 'cp1254'  # Turkish Excel exports
+    text_sample = sample.decode(encoding, errors='replace')
+    try:
+        dialect = csv.Sniffer().sniff(text_sample[:text_sample.rfind("\n") + 1] or text_sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as file:
+        for row in csv.reader(file, dialect):
+            yield [infer_cell_value(value) for value in row]
+
+def _xls_cell_value(cell, datemode: int):
+    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(cell.value)
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        try:
+            return xlrd.xldate.xldate_as_datetime(cell.value, datemode)
+        except (ValueError, xlrd.xldate.XLDateError):
+            return cell.value
+    return cell.value
+
+def _iter_spreadsheet_sheets(file_path: str, file_type: str):
+    """Yield (sheet name, row iterator) - rows are streamed instead of loading the whole workbook"""
+    if file_type == 'csv':
+        yield "CSV", _iter_csv_rows(file_path)
+    
+    elif file_type == 'xls':
+        if not XLRD_AVAILABLE:
+            raise ValueError(".xls dosyaları için xlrd kurulu değil")
+        # .xls is capped at 65536 rows, xlrd loads one sheet at a time
+        book = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            for sheet_name in book.sheet_names():
+                sheet = book.sheet_by_name(sheet_name)
+                yield sheet_name, ([_xls_cell_value(cell, book.datemode) for cell in sheet.row(row)] for row in range(sheet.nrows))
+                book.unload_sheet(sheet_name)
+        finally:
+            book.release_resources()
+    
+    else:
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                # Some writers store wrong dimensions, which would cut read-only iteration short
+                sheet.reset_dimensions()
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+def _extract_spreadsheet_sync(file_path: str, file_type: str) -> str:
+    """Stream a spreadsheet into per-sheet summaries followed by its rows (at most SPREADSHEET_MAX_ROWS)"""
+    sheets = []
+    row_budget = SPREADSHEET_MAX_ROWS
+    for sheet_name, rows in _iter_spreadsheet_sheets(file_path, file_type):
+        sheet = SpreadsheetSheet(sheet_name, row_budget)
+        for values in rows:
+            sheet.add_row(values)
+        row_budget -= len(sheet.rows)
+        if sheet.columns:
+            sheets.append(sheet)
+    if not sheets:
+        return ""
+    
+    summaries = "\n\n".join(sheet.summary() for sheet in sheets)
+    rows = "\n".join(sheet.rows_section() for sheet in sheets)
+    return f"{summaries}\n\n{SPREADSHEET_ROWS_HEADING}\n{rows}".strip()
+
+def _extract_text_sync(file_path: str, file_type: str) -> str:
+    """Extract text from various file types (blocking - runs in the extraction executor)"""
+    try:
+        if file_type == 'pdf':
+            with open(file_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                return "\n".join(page.extract_text() for page in pdf_reader.pages).strip()
+        
+        elif file_type in ['xlsx', 'xls', 'csv']:
+            return _extract_spreadsheet_sync(file_path, file_type)
+        
+        elif file_type == 'docx':
+            doc = Document(file_path)
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
+        
+        elif file_type == 'txt':
+            with open(file_path, 'r', encoding='utf-8') as file:
+                return file.read().strip()
+        
+        else:
+            return "Desteklenmeyen dosya türü."
+    
+    except MemoryError:
+        logging.error(f"File text extraction hit the memory limit: {file_path}")
+        return "Dosya okuma hatası: dosya işlenemeyecek kadar büyük."
+    except Exception as e:
+        logging.error(f"File text extraction error: {e}")
+        return f"Dosya okuma hatası: {str(e)}"
+
+def _extract_pdf_pages_sync(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) - one shard of a page-parallel PDF extraction"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[page_number].extract_text() for page_number in range(start, end)]
+
+def _extract_pdf_head_sync(file_path: str, end: int) -> tuple:
+    """Count a PDF's pages and extract the first ones in the same pass - returns (page_count, page texts)"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        return page_count, [pdf_reader.pages[page_number].extract_text() for page_number in range(min(end, page_count))]
+
+class ExtractionTimeoutError(BaseException):
+    """Raised inside an extraction worker when a job runs past EXTRACTION_TIMEOUT_SECONDS (a BaseException so PyPDF2's broad excepts can't swallow it)"""
+
+def _raise_extraction_timeout(signum, frame):
+    raise ExtractionTimeoutError("dosya işlenirken zaman aşımı oluştu.")
+
+def _init_extraction_worker(memory_limit_mb: int, worker_pids=None):
+    """Process pool initializer - report the worker's PID, then cap its address space at its baseline plus memory_limit_mb"""
+    if worker_pids is not None:
+        worker_pids.put(os.getpid())
+    if memory_limit_mb <= 0 or not RESOURCE_AVAILABLE:
+        return
+    baseline = 0
+    try:
+        with open("/proc/self/statm") as statm:
+            baseline = int(statm.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        pass
+    limit = baseline + memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _run_extraction_job(timeout_seconds: float, job, *args):
+    """Run one extraction job inside a pool worker with a SIGALRM per-job timeout"""
+    use_alarm = timeout_seconds > 0 and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_extraction_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        return job(*args)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def vision_image_size(width: int, height: int) -> tuple:
+    """Largest size of an image the vision model still uses - never upscales"""
+    scale = min(1.0, VISION_MAX_LONG_EDGE / max(width, height), VISION_MAX_SHORT_EDGE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def _prepare_vision_image_sync(file_path: str, target_path: str) -> tuple:
+    """Downscale an image and re-encode it as JPEG without metadata (runs in the extraction pool) - returns (width, height, bytes)"""
+    with Image.open(file_path) as image:
+        # JPEGs decode straight at a reduced scale instead of full resolution
+        image.draft("RGB", vision_image_size(*image.size))
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail(vision_image_size(*image.size))
+        
+        tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, "JPEG", quality=VISION_JPEG_QUALITY)
+        os.replace(tmp_path, target_path)
+        return image.width, image.height, os.path.getsize(target_path)
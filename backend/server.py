@@ -1,14 +1,16 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, Cookie, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request, Cookie, UploadFile, File, Form, Query
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Optional, NamedTuple
 import uuid
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
@@ -21,18 +23,29 @@ import json
 import asyncio
 import tempfile
 import shutil
+import zlib
+import hashlib
+import time
+import signal
+import multiprocessing
+import weakref
+import concurrent.futures
+from collections import OrderedDict, Counter, deque
+from functools import lru_cache
 from io import BytesIO
+from cachetools import TTLCache
 import jieba
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import vstack as sparse_vstack
 # from multipart import parse_options_header  # Not used
 
-# File processing imports
-import PyPDF2
-import openpyxl
-from docx import Document
+# File processing - the blocking extraction jobs live in their own module, which is all a pool worker imports
 import base64
-from PIL import Image
+from extraction_jobs import (
+    SPREADSHEET_ROWS_HEADING, ExtractionTimeoutError, _init_extraction_worker, _run_extraction_job,
+    _extract_text_sync, _extract_pdf_head_sync, _extract_pdf_pages_sync, _prepare_vision_image_sync
+)
 
 # OpenAI integration via emergentintegrations
 from emergentintegrations.llm.chat import LlmChat, UserMessage, FileContentWithMimeType
@@ -66,6 +79,9 @@ ANYTHINGLLM_API_URL = os.environ.get("ANYTHINGLLM_API_URL", "https://pilj1jbx.rc
 # Serper API configuration  
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
 SERPER_API_URL = "https://google.serper.dev/search"
+SERPER_CACHE_TTL = int(os.environ.get("SERPER_CACHE_TTL", "120"))
+SERPER_CACHE_MAX_ENTRIES = int(os.environ.get("SERPER_CACHE_MAX_ENTRIES", "1000"))
+SERPER_MAX_BATCH_SIZE = 100  # Serper accepts up to 100 queries in one array request
 
 # OpenAI configuration via EMERGENT_LLM_KEY and direct OpenAI API
 EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
@@ -81,60 +97,459 @@ GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 UPLOAD_DIR = Path("/tmp/bilgin_uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # Bytes read, hashed and written per step while storing an upload
+FILE_SIGNATURE_BYTES = 8192  # Leading bytes checked against the declared file type
+
+# Resumable uploads - files up to MAX_RESUMABLE_FILE_SIZE are sent as parts (any order, in parallel) and assembled on completion
+MAX_RESUMABLE_FILE_SIZE = int(os.environ.get("MAX_RESUMABLE_FILE_SIZE", str(200 * 1024 * 1024)))
+UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))  # Default part size
+UPLOAD_PART_SIZE_RANGE = (1024 * 1024, 32 * 1024 * 1024)  # Part sizes a client may ask for
+UPLOAD_SESSION_TTL_SECONDS = float(os.environ.get("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))  # Renewed by every part
+UPLOAD_COMPLETION_TIMEOUT_SECONDS = float(os.environ.get("UPLOAD_COMPLETION_TIMEOUT_SECONDS", "600"))  # A completion claimed longer ago is assumed crashed and can be taken over
+ALLOWED_FILE_TYPES = ['pdf', 'xlsx', 'xls', 'csv', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
+
+# Leading bytes of each binary upload type - txt/csv are only checked for binary content
+FILE_SIGNATURES = {
+    'pdf': (b"%PDF-",),
+    'xlsx': (b"PK\x03\x04",),
+    'docx': (b"PK\x03\x04",),
+    'xls': (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",),
+    'jpg': (b"\xff\xd8\xff",),
+    'jpeg': (b"\xff\xd8\xff",),
+    'png': (b"\x89PNG\r\n\x1a\n",),
+    'gif': (b"GIF87a", b"GIF89a"),
+    'bmp': (b"BM",),
+    'webp': (b"RIFF",),
+}
+
+# File extraction executor - PyPDF2/openpyxl/python-docx are CPU-bound and must not run on the event loop
+EXTRACTION_POOL_WORKERS = int(os.environ.get("EXTRACTION_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = thread instead of process pool
+EXTRACTION_TIMEOUT_SECONDS = float(os.environ.get("EXTRACTION_TIMEOUT_SECONDS", "60"))
+EXTRACTION_TIMEOUT_GRACE_SECONDS = 5.0  # Extra wait before a worker stuck in C code is killed
+EXTRACTION_MEMORY_LIMIT_MB = int(os.environ.get("EXTRACTION_MEMORY_LIMIT_MB", "1024"))  # Address space per worker above its baseline, 0 = unlimited
+EXTRACTION_MP_CONTEXT = os.environ.get("EXTRACTION_MP_CONTEXT", "spawn")  # spawn | forkserver | fork
+PDF_PAGES_PER_SHARD = max(1, int(os.environ.get("PDF_PAGES_PER_SHARD", "25")))  # Minimum pages per parallel extraction job
+PDF_EARLY_PAGES = int(os.environ.get("PDF_EARLY_PAGES", "20"))  # Uploads return once this many pages are extracted, 0 = wait for the whole PDF
+# Spreadsheet ingestion limits (SPREADSHEET_MAX_ROWS, ...) are read in extraction_jobs.py
+
+# Extracted text cache - zlib-compressed files keyed by file id + content hash, referenced from file_uploads
+EXTRACTION_CACHE_DIR = Path(os.environ.get("EXTRACTION_CACHE_DIR", str(UPLOAD_DIR / "extracted")))
+EXTRACTION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Vision preprocessing - uploaded images are reduced once per distinct content to what the vision model actually uses
+# (sizes and JPEG quality are in extraction_jobs.py)
+VISION_MODEL = os.environ.get("VISION_MODEL", "gpt-4o-mini")
+
+# Content-addressed upload store - each distinct upload is stored once under its SHA-256 and reference-counted in the
+# blobs collection; blobs left unreferenced for BLOB_GC_GRACE_SECONDS are deleted with their derived artifacts
+BLOB_DIR = Path(os.environ.get("BLOB_DIR", str(UPLOAD_DIR / "blobs")))
+(BLOB_DIR / "tmp").mkdir(parents=True, exist_ok=True)
+UPLOAD_PARTS_DIR = BLOB_DIR / "parts"  # One directory of part files per resumable upload session
+UPLOAD_PARTS_DIR.mkdir(exist_ok=True)
+BLOB_GC_INTERVAL_SECONDS = float(os.environ.get("BLOB_GC_INTERVAL_SECONDS", "3600"))
+BLOB_GC_GRACE_SECONDS = float(os.environ.get("BLOB_GC_GRACE_SECONDS", "600"))
+
+# Retrieval over uploaded files - large files only send the chunks relevant to the question
+FILE_CONTEXT_TOKEN_BUDGET = int(os.environ.get("FILE_CONTEXT_TOKEN_BUDGET", "3000"))
+FILE_CHUNK_TOKENS = int(os.environ.get("FILE_CHUNK_TOKENS", "250"))
+FILE_CHUNK_OVERLAP_TOKENS = int(os.environ.get("FILE_CHUNK_OVERLAP_TOKENS", "40"))
+FILE_RETRIEVAL_TOP_K = int(os.environ.get("FILE_RETRIEVAL_TOP_K", "12"))
+CONVERSATION_INDEX_MAX_CHUNKS = int(os.environ.get("CONVERSATION_INDEX_MAX_CHUNKS", "50000"))  # Across all in-memory conversation indexes
+CHARS_PER_TOKEN = 4  # Rough estimate for Turkish/English text, good enough for budgeting
+
+# Background pre-summarization - documents too long to send whole are summarized after upload (sections first, then
+# the whole document), so overview questions ("özetle", "analiz et") are answered from the stored summary
+FILE_SUMMARY_ENABLED = os.environ.get("FILE_SUMMARY_ENABLED", "true").lower() == "true"
+FILE_SUMMARY_MODEL = os.environ.get("FILE_SUMMARY_MODEL", "gpt-4o-mini")
+FILE_SUMMARY_SECTION_TOKENS = int(os.environ.get("FILE_SUMMARY_SECTION_TOKENS", "3000"))  # Text per first-level summary call
+FILE_SUMMARY_MAX_SECTIONS = int(os.environ.get("FILE_SUMMARY_MAX_SECTIONS", "40"))  # Longer documents get proportionally larger sections
+FILE_SUMMARY_CONCURRENCY = int(os.environ.get("FILE_SUMMARY_CONCURRENCY", "4"))  # Summary calls in flight across all uploads
+FILE_SUMMARY_MAX_TOKENS = 500  # Output tokens per summary call
+FILE_SUMMARY_TYPES = ['pdf', 'docx', 'txt']  # Spreadsheets already carry their statistical summary
+
+# Keyset pagination of the conversation and message lists (limit/before/after with an opaque cursor); calls without
+# them keep the original behaviour of returning the first LIST_MAX_ITEMS
+PAGE_SIZE_DEFAULT = int(os.environ.get("PAGE_SIZE_DEFAULT", "50"))  # When only a cursor is given
+PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", "200"))
+LIST_MAX_ITEMS = 1000
+PAGE_CURSOR_HEADERS = ["X-Cursor-Before", "X-Cursor-After"]  # Cursors for the neighbouring pages, when there are any
+
+# Conversation read model - message count and last message are kept on the conversation document itself
+CONVERSATION_PREVIEW_CHARS = 120
+CONVERSATION_COUNTED_IDS = 200  # Latest message ids kept per conversation, so a replayed update is only counted once
+CONVERSATION_BACKFILL_BATCH = 500  # Conversations migrated per aggregation at startup
+
+# Write-behind message persistence - messages are queued on the request path and written in ordered insert_many
+# batches; batches MongoDB can't take are appended to a local journal and replayed, in order, once it is back
+MESSAGE_QUEUE_BATCH_SIZE = int(os.environ.get("MESSAGE_QUEUE_BATCH_SIZE", "100"))  # Messages per insert_many
+MESSAGE_QUEUE_MAX_AGE = float(os.environ.get("MESSAGE_QUEUE_MAX_AGE", "0.05"))  # Seconds a message waits for its batch to fill
+MESSAGE_QUEUE_RETRY_SECONDS = float(os.environ.get("MESSAGE_QUEUE_RETRY_SECONDS", "5"))  # Between journal replays while MongoDB is down
+MESSAGE_JOURNAL_PATH = Path(os.environ.get("MESSAGE_JOURNAL_PATH", str(UPLOAD_DIR / "message_journal.jsonl")))  # Point at persistent storage in production
+MESSAGE_JOURNAL_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+# Upstream HTTP client configuration - one pooled client per provider host
+# Every value can be overridden per provider, e.g. NOVITA_HTTP_MAX_CONNECTIONS=50
+PROVIDER_HTTP_DEFAULTS = {
+    "serper": {"max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 30.0, "timeout": 10.0, "connect_timeout": 5.0},
+    "anythingllm": {"max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 60.0, "timeout": 20.0, "connect_timeout": 5.0},
+    "ollama_anythingllm": {"max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 60.0, "timeout": 30.0, "connect_timeout": 5.0},
+    "novita": {"max_connections": 50, "max_keepalive": 20, "keepalive_expiry": 60.0, "timeout": 60.0, "connect_timeout": 5.0},
+    "gemini": {"max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 60.0, "timeout": 30.0, "connect_timeout": 5.0},
+    "openai": {"max_connections": 20, "max_keepalive": 10, "keepalive_expiry": 60.0, "timeout": 30.0, "connect_timeout": 5.0},
+    "emergent_auth": {"max_connections": 10, "max_keepalive": 5, "keepalive_expiry": 30.0, "timeout": 10.0, "connect_timeout": 5.0},
+}
+PROVIDER_HTTP2_ENABLED = os.environ.get("PROVIDER_HTTP2_ENABLED", "true").lower() == "true"
+
+# Circuit breakers - per provider, overridable the same way, e.g. NOVITA_BREAKER_OPEN_SECONDS=60
+PROVIDER_BREAKER_DEFAULTS = {
+    "failure_rate": 0.5,        # Trip when at least this share of recent calls failed or were too slow
+    "min_requests": 5,          # ...and at least this many calls were seen in the window
+    "window_seconds": 60.0,
+    "slow_call_seconds": 15.0,  # Time to response headers above this counts as a failure
+    "open_seconds": 30.0,       # How long to fail fast before letting a half-open probe through
+}
+# Non-streaming LLM calls only send headers once the whole answer is generated, so their slow
+# threshold matches the HTTP timeout and only timeouts/errors count against them
+PROVIDER_BREAKER_OVERRIDES = {
+    "anythingllm": {"slow_call_seconds": 20.0},
+    "ollama_anythingllm": {"slow_call_seconds": 30.0},
+    "gemini": {"slow_call_seconds": 30.0},
+    "openai": {"slow_call_seconds": 30.0},
+}
+# Alternate provider used instantly while a provider's breaker is open
+PROVIDER_FAILOVER = {
+    "novita": "openai",               # Novita DeepSeek -> gpt-4o-mini via process_with_direct_openai
+    "ollama_anythingllm": "gemini",   # Ollama AnythingLLM -> process_with_gemini_free
+}
+
+try:
+    import h2  # noqa: F401 - httpx needs it for HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Streaming (SSE) protocol configuration
+# v1: every chunk carries the whole answer so far in full_content (legacy, ?stream_protocol=1)
+# v2: every chunk carries only the delta plus a sequence number, with periodic byte-length/crc32 checkpoints
+STREAM_PROTOCOL_VERSION = 2
+STREAM_CHECKSUM_INTERVAL = int(os.environ.get("STREAM_CHECKSUM_INTERVAL", "32"))
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Request coalescing - identical in-flight questions share one upstream call/stream
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# Speculative execution (hedging) per PRO route
+# "serial": wait for the RAG answer, then fall back; "race": start RAG and fallback together and
+# still prefer an acceptable RAG answer arriving up to grace_seconds after the fallback is ready
+ROUTE_HEDGING_POLICIES = {
+    'formula': {
+        "mode": os.environ.get("FORMULA_HEDGING_MODE", "race"),
+        "grace_seconds": float(os.environ.get("FORMULA_HEDGING_GRACE_SECONDS", "2.0"))
+    },
+}
+
+# Answer cache - TTL (seconds) chosen by the classify_question category, 0 disables caching for that category
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_MAX_CHARS = int(os.environ.get("ANSWER_CACHE_MAX_CHARS", str(20 * 1024 * 1024)))
+ANSWER_CACHE_DIR = os.environ.get("ANSWER_CACHE_DIR")  # Optional disk-backed second tier
+ANSWER_CACHE_TTLS = {
+    'current': int(os.environ.get("ANSWER_CACHE_TTL_CURRENT", "120")),
+    'factual': int(os.environ.get("ANSWER_CACHE_TTL_FACTUAL", str(6 * 3600))),
+    'general': int(os.environ.get("ANSWER_CACHE_TTL_GENERAL", str(6 * 3600))),
+    'math': int(os.environ.get("ANSWER_CACHE_TTL_MATH", str(24 * 3600))),
+    'casual': int(os.environ.get("ANSWER_CACHE_TTL_CASUAL", "0")),
+}
+
+provider_clients = {}
+
+def get_provider_settings(provider: str, defaults: dict = None, prefix: str = "HTTP") -> dict:
+    """Get settings for a provider with <PROVIDER>_<PREFIX>_<KEY> env overrides"""
+    settings = dict(PROVIDER_HTTP_DEFAULTS[provider] if defaults is None else defaults)
+    for key, default in settings.items():
+        env_value = os.environ.get(f"{provider.upper()}_{prefix}_{key.upper()}")
+        if env_value is not None:
+            settings[key] = type(default)(env_value)
+    return settings
+
+class ProviderCircuitOpenError(httpx.TransportError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+class CircuitBreaker:
+    """Per-provider circuit breaker driven by error rate and latency, with half-open probing"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, provider: str, failure_rate: float, min_requests: int, window_seconds: float, slow_call_seconds: float, open_seconds: float):
+        self.provider = provider
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.outcomes = deque()  # (monotonic timestamp, failed)
+        self.stats = {"successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "trips": 0}
+    
+    def _current_state(self) -> str:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+            logging.info(f"Circuit breaker {self.provider}: half-open, allowing a probe request")
+        return self.state
+    
+    def available(self) -> bool:
+        """Whether a request would currently be let through (doesn't consume the half-open probe)"""
+        state = self._current_state()
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.probe_in_flight)
+    
+    def before_request(self):
+        state = self._current_state()
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return
+        self.stats["rejected"] += 1
+        raise ProviderCircuitOpenError(f"Circuit breaker open for provider {self.provider}")
+    
+    def release_probe(self):
+        """Give the half-open probe slot back when the probe request was cancelled"""
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = False
+    
+    def record(self, latency: float, failed: bool):
+        slow = latency > self.slow_call_seconds
+        failed = failed or slow
+        self.stats["failures" if failed else "successes"] += 1
+        if slow:
+            self.stats["slow_calls"] += 1
+        
+        if self.state == self.HALF_OPEN:
+            self._trip() if failed else self._close()
+            return
+        if self.state == self.OPEN:
+            return  # Outcome of a request that started before the breaker tripped
+        
+        now = time.monotonic()
+        self.outcomes.append((now, failed))
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+        
+        failures = sum(1 for _, outcome_failed in self.outcomes if outcome_failed)
+        if len(self.outcomes) >= self.min_requests and failures / len(self.outcomes) >= self.failure_rate:
+            self._trip()
+    
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.outcomes.clear()
+        self.stats["trips"] += 1
+        logging.warning(f"Circuit breaker {self.provider}: OPEN for {self.open_seconds:.0f}s")
+    
+    def _close(self):
+        self.state = self.CLOSED
+        self.probe_in_flight = False
+        self.outcomes.clear()
+        logging.info(f"Circuit breaker {self.provider}: closed, provider healthy again")
+    
+    def snapshot(self) -> dict:
+        state = self._current_state()
+        failures = sum(1 for _, outcome_failed in self.outcomes if outcome_failed)
+        return {
+            "provider": self.provider,
+            "state": state,
+            "failover": PROVIDER_FAILOVER.get(self.provider),
+            "window_requests": len(self.outcomes),
+            "window_failure_rate": round(failures / len(self.outcomes), 4) if self.outcomes else 0.0,
+            "open_remaining_seconds": round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1) if state == self.OPEN else 0.0,
+            **self.stats
+        }
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """httpx transport that fails fast while a provider's breaker is open and records every outcome"""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.breaker.before_request()
+        started = time.monotonic()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record(time.monotonic() - started, failed=True)
+            raise
+        self.breaker.record(time.monotonic() - started, failed=response.status_code >= 500 or response.status_code == 429)
+        return response
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+provider_breakers = {
+    provider: CircuitBreaker(provider, **get_provider_settings(provider, {**PROVIDER_BREAKER_DEFAULTS, **PROVIDER_BREAKER_OVERRIDES.get(provider, {})}, "BREAKER"))
+    for provider in PROVIDER_HTTP_DEFAULTS
+}
+
+def is_provider_available(provider: str) -> bool:
+    """Check a provider's circuit breaker before routing a request to it"""
+    return provider_breakers[provider].available()
+
+def create_provider_client(provider: str) -> httpx.AsyncClient:
+    """Create a long-lived, connection-pooled HTTP client for an upstream provider"""
+    settings = get_provider_settings(provider)
+    transport = httpx.AsyncHTTPTransport(
+        http2=PROVIDER_HTTP2_ENABLED and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive"],
+            keepalive_expiry=settings["keepalive_expiry"]
+        )
+    )
+    return httpx.AsyncClient(
+        transport=CircuitBreakerTransport(transport, provider_breakers[provider]),
+        timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"])
+    )
+
+def get_provider_client(provider: str) -> httpx.AsyncClient:
+    """Get the shared HTTP client for a provider, creating it lazily if needed"""
+    http_client = provider_clients.get(provider)
+    if http_client is None or http_client.is_closed:
+        http_client = create_provider_client(provider)
+        provider_clients[provider] = http_client
+    return http_client
+
+async def init_provider_clients():
+    """Create one pooled client per upstream provider at startup"""
+    for provider in PROVIDER_HTTP_DEFAULTS:
+        get_provider_client(provider)
+    logging.info(f"Provider HTTP clients ready: {', '.join(provider_clients)} (HTTP/2: {PROVIDER_HTTP2_ENABLED and HTTP2_AVAILABLE})")
+
+async def close_provider_clients():
+    """Close all pooled provider clients on shutdown"""
+    clients = list(provider_clients.values())
+    provider_clients.clear()
+    await asyncio.gather(*(http_client.aclose() for http_client in clients), return_exceptions=True)
 
 # Web search functions using Serper API
-async def web_search(query: str, num_results: int = 3) -> List[dict]:
-    """Perform web search using Serper API"""
+# Serper search service: TTL cache keyed by (query, gl, hl, num), batched multi-query requests
+serper_cache = TTLCache(maxsize=SERPER_CACHE_MAX_ENTRIES, ttl=SERPER_CACHE_TTL)
+
+def build_serper_query(query: str, num: int = 10, gl: str = "tr", hl: str = "tr") -> dict:
+    """Build a Serper query object - Turkish language and Turkey location by default"""
+    return {"q": query, "gl": gl, "hl": hl, "num": min(num, 10)}  # Serper supports up to 10 results per call
+
+async def post_serper(payload, timeout: Optional[float] = None) -> Optional[object]:
+    """POST one query object or a batch array to Serper, returning the decoded response or None - timeout overrides
+    the serper client's default for this request"""
+    http_client = get_provider_client("serper")
+    response = await http_client.post(
+        SERPER_API_URL,
+        json=payload,
+        headers={
+            "X-API-KEY": SERPER_API_KEY,
+            "Content-Type": "application/json"
+        },
+        timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+    )
+    
+    if response.status_code == 200:
+        return response.json()
+    
+    logging.error(f"Serper API error: {response.status_code} - {response.text}")
+    return None
+
+async def serper_search_batch(queries: List[dict], timeout: Optional[float] = None) -> List[Optional[dict]]:
+    """Run several Serper queries: cached ones cost nothing, the rest go out as concurrent batch requests"""
     if not SERPER_API_KEY:
         logging.warning("Serper API key not configured")
+        return [None] * len(queries)
+    
+    keys = [(q["q"], q["gl"], q["hl"], q["num"]) for q in queries]
+    results = {key: serper_cache[key] for key in keys if key in serper_cache}
+    
+    # Identical queries in the same batch are only sent once
+    missing = list(dict.fromkeys(key for key in keys if key not in results))
+    if missing:
+        logging.info(f"Serper search: {len(keys) - len(missing)} cached, {len(missing)} to fetch")
+        payloads = [{"q": q, "gl": gl, "hl": hl, "num": num} for q, gl, hl, num in missing]
+        batches = [payloads[i:i + SERPER_MAX_BATCH_SIZE] for i in range(0, len(payloads), SERPER_MAX_BATCH_SIZE)]
+        
+        # A single query is sent as an object, several as one array request per batch
+        responses = await asyncio.gather(
+            *(post_serper(batch[0] if len(batch) == 1 else batch, timeout) for batch in batches),
+            return_exceptions=True
+        )
+        
+        fetched = []
+        for batch, response in zip(batches, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Web search error with Serper API: {response}")
+                fetched.extend([None] * len(batch))
+            elif len(batch) == 1:
+                fetched.append(response)
+            elif isinstance(response, list) and len(response) == len(batch):
+                fetched.extend(response)
+            else:
+                logging.error("Serper batch response did not match the request")
+                fetched.extend([None] * len(batch))
+        
+        for key, data in zip(missing, fetched):
+            results[key] = data
+            if data is not None:
+                serper_cache[key] = data
+    
+    return [results.get(key) for key in keys]
+
+async def serper_search(query: str, num: int = 10, gl: str = "tr", hl: str = "tr", timeout: Optional[float] = None) -> Optional[dict]:
+    """Run a single cached Serper query"""
+    return (await serper_search_batch([build_serper_query(query, num, gl, hl)], timeout))[0]
+
+def parse_serper_results(data: Optional[dict], num_results: int) -> List[dict]:
+    """Convert a raw Serper response into title/snippet/link results"""
+    if not data:
         return []
     
+    results = []
+    
+    # Process organic results
+    if "organic" in data:
+        for item in data["organic"][:num_results]:
+            results.append({
+                "title": item.get("title", ""),
+                "snippet": item.get("snippet", ""),
+                "link": item.get("link", "")
+            })
+    
+    # Include featured snippet if available
+    if "answerBox" in data and len(results) > 0:
+        answer_box = data["answerBox"]
+        if "answer" in answer_box:
+            results[0]["featured_answer"] = answer_box["answer"]
+    
+    return results
+
+async def web_search(query: str, num_results: int = 3) -> List[dict]:
+    """Perform web search using Serper API"""
     try:
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "q": query,
-                "num": min(num_results, 10),  # Serper supports up to 10 results per call
-                "hl": "tr",  # Turkish language preference
-                "gl": "tr"   # Turkey geographic location
-            }
-            
-            headers = {
-                "X-API-KEY": SERPER_API_KEY,
-                "Content-Type": "application/json"
-            }
-            
-            response = await client.post(
-                SERPER_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=8.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                results = []
-                
-                # Process organic results
-                if "organic" in data:
-                    for item in data["organic"][:num_results]:
-                        results.append({
-                            "title": item.get("title", ""),
-                            "snippet": item.get("snippet", ""),
-                            "link": item.get("link", "")
-                        })
-                
-                # Include featured snippet if available
-                if "answerBox" in data and len(results) > 0:
-                    answer_box = data["answerBox"]
-                    if "answer" in answer_box:
-                        results[0]["featured_answer"] = answer_box["answer"]
-                
-                logging.info(f"Serper API returned {len(results)} search results")
-                return results
-            else:
-                logging.error(f"Serper API error: {response.status_code} - {response.text}")
-                return []
-                
+        data = await serper_search(query, num=num_results, timeout=8.0)
+        results = parse_serper_results(data, num_results)
+        logging.info(f"Serper API returned {len(results)} search results")
+        return results
     except Exception as e:
         logging.error(f"Web search error with Serper API: {e}")
         return []
@@ -173,49 +588,49 @@ async def openai_fact_check(ai_response: str, original_query: str) -> str:
         return ai_response
     
     try:
-        async with httpx.AsyncClient() as client:
-            system_prompt = """Sen bir fact-checker asistanısın. Verilen cevabı doğrula ve eğer hatalı bilgi varsa düzelt. 
+        system_prompt = """Sen bir fact-checker asistanısın. Verilen cevabı doğrula ve eğer hatalı bilgi varsa düzelt. 
             Eğer cevap doğru ise olduğu gibi bırak. Eğer yanlış bilgi varsa doğru bilgiyi ver.
             Sadece kesin yanlış olan bilgileri düzelt, belirsiz durumlarda orijinal cevabı koru.
             Türkçe yanıt ver."""
-            
-            user_prompt = f"""Soru: {original_query}
+        
+        user_prompt = f"""Soru: {original_query}
 Verilen Cevap: {ai_response}
 
 Bu cevabı kontrol et ve eğer faktüel hata varsa düzelt. Eğer doğru ise aynen döndür."""
+        
+        payload = {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": 600,
+            "temperature": 0.1  # Lower temperature for fact-checking
+        }
+        
+        headers = {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        http_client = get_provider_client("openai")
+        response = await http_client.post(
+            OPENAI_API_URL,
+            json=payload,
+            headers=headers,
+            timeout=15.0
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            checked_content = data["choices"][0]["message"]["content"]
             
-            payload = {
-                "model": "gpt-4",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "max_tokens": 600,
-                "temperature": 0.1  # Lower temperature for fact-checking
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            response = await client.post(
-                OPENAI_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=15.0
-            )
+            logging.info("OpenAI fact-checking completed successfully")
+            return checked_content
+        else:
+            logging.error(f"OpenAI fact-checking error: {response.status_code} - {response.text}")
+            return ai_response  # Return original if fact-check fails
             
-            if response.status_code == 200:
-                data = response.json()
-                checked_content = data["choices"][0]["message"]["content"]
-                
-                logging.info("OpenAI fact-checking completed successfully")
-                return checked_content
-            else:
-                logging.error(f"OpenAI fact-checking error: {response.status_code} - {response.text}")
-                return ai_response  # Return original if fact-check fails
-                
     except Exception as e:
         logging.error(f"OpenAI fact-checking error: {e}")
         return ai_response  # Return original if fact-check fails
@@ -234,12 +649,16 @@ async def fact_check_with_serper(ai_response: str, original_query: str) -> str:
     
     corrections = {}
     
-    for claim in claims:
-        # Create search query for fact-checking
-        search_query = f'"{claim}" doğru mu bilgi kontrol'
-        
-        # Perform web search
-        search_results = await web_search(search_query, num_results=2)
+    # Search every claim in one batched round trip instead of one search per claim
+    search_queries = [build_serper_query(f'"{claim}" doğru mu bilgi kontrol', num=2) for claim in claims]
+    try:
+        search_responses = await serper_search_batch(search_queries, timeout=8.0)
+    except Exception as e:
+        logging.error(f"Fact-check search error with Serper API: {e}")
+        search_responses = [None] * len(claims)
+    
+    for claim, search_data in zip(claims, search_responses):
+        search_results = parse_serper_results(search_data, 2)
         
         if search_results:
             # Simple verification logic
@@ -290,60 +709,46 @@ async def extract_correction(claim: str, search_results: List[dict], original_qu
     
     return None
 
-def requires_web_search(question: str) -> bool:
-    """Determine if question requires web search instead of AnythingLLM"""
-    
-    # Güncel/live information patterns
-    web_search_patterns = [
-        # Sports scores and results - ENHANCED patterns
-        r'(?:maç|skor|sonuç|kazandı|kaybetti)\s+(?:ne|nedir|nasıl|kaç)',
-        r'(?:galatasaray|fenerbahçe|beşiktaş|trabzonspor|kasımpaşa)\s+(?:maçı|skoru|maç|sonuç)',
-        r'(?:galatasaray|fenerbahçe|beşiktaş|trabzonspor)\s+(?:kasımpaşa|galatasaray|fenerbahçe|beşiktaş)',
-        r'(?:barcelona|real madrid|manchester|liverpool)\s+(?:maç|skor)',
-        r'(?:şampiyonlar ligi|premier lig|süper lig)\s+(?:sonuç|tablo)',
-        r'maç\s+sonuç',  # Direct "maç sonuç" pattern
-        r'(?:son|güncel|bugünkü)\s+maç',  # "son maç" pattern
-        
-        # Current news and events  
-        r'(?:son|güncel|bugünkü|şu an)\s+(?:haber|durum|gelişme)',
-        r'(?:bugün|dün|geçen hafta)\s+(?:ne oldu|olan)',
-        r'(?:seçim|politika|hükümet)\s+(?:son|güncel)',
-        
-        # Financial data
-        r'(?:dolar|euro|bitcoin|borsa)\s+(?:kuru|fiyat|ne kadar)',
-        r'(?:altın|gümüş|petrol)\s+(?:fiyat|kur)',
-        
-        # Weather
-        r'(?:hava durumu|hava|yağmur|kar)\s+(?:nasıl|ne|bugün)',
-        r'(?:ankara|istanbul|izmir)\s+(?:hava|sıcaklık)',
-        
-        # Recent releases/publications
-        r'(?:yeni|son)\s+(?:çıkan|yayınlanan)\s+(?:kitap|film|müzik)',
-        r'(?:2024|2025)\s+(?:çıkan|yayınlanan)',
-        
-        # Books/works not likely in system
-        r'(?:hangi|kim)\s+(?:yazdı|yazarı|eseri)',  # Could be unknown works
-        r'(?:kitap|roman|şiir)\s+(?:kim|kimin|hangi)',
-        
-        # Live data
-        r'(?:şu an|anlık|canlı)\s+',
-        r'(?:en son|en yeni|fresh)',
-        
-        # Technology and recent events
-        r'(?:chatgpt|ai|yapay zeka)\s+(?:son|yeni|güncel)',
-        r'(?:iphone|android|tesla)\s+(?:yeni|son|model)'
-    ]
-    
-    question_lower = question.lower()
-    
-    # Debug logging
-    for i, pattern in enumerate(web_search_patterns):
-        if re.search(pattern, question_lower):
-            logging.info(f"Web search triggered by pattern {i}: '{pattern}' for question: '{question}'")
-            return True
-    
-    logging.info(f"No web search pattern matched for question: '{question}'")
-    return False
+# Güncel/live information patterns
+WEB_SEARCH_PATTERNS = [
+    # Sports scores and results - ENHANCED patterns
+    r'(?:maç|skor|sonuç|kazandı|kaybetti)\s+(?:ne|nedir|nasıl|kaç)',
+    r'(?:galatasaray|fenerbahçe|beşiktaş|trabzonspor|kasımpaşa)\s+(?:maçı|skoru|maç|sonuç)',
+    r'(?:galatasaray|fenerbahçe|beşiktaş|trabzonspor)\s+(?:kasımpaşa|galatasaray|fenerbahçe|beşiktaş)',
+    r'(?:barcelona|real madrid|manchester|liverpool)\s+(?:maç|skor)',
+    r'(?:şampiyonlar ligi|premier lig|süper lig)\s+(?:sonuç|tablo)',
+    r'maç\s+sonuç',  # Direct "maç sonuç" pattern
+    r'(?:son|güncel|bugünkü)\s+maç',  # "son maç" pattern
+    
+    # Current news and events  
+    r'(?:son|güncel|bugünkü|şu an)\s+(?:haber|durum|gelişme)',
+    r'(?:bugün|dün|geçen hafta)\s+(?:ne oldu|olan)',
+    r'(?:seçim|politika|hükümet)\s+(?:son|güncel)',
+    
+    # Financial data
+    r'(?:dolar|euro|bitcoin|borsa)\s+(?:kuru|fiyat|ne kadar)',
+    r'(?:altın|gümüş|petrol)\s+(?:fiyat|kur)',
+    
+    # Weather
+    r'(?:hava durumu|hava|yağmur|kar)\s+(?:nasıl|ne|bugün)',
+    r'(?:ankara|istanbul|izmir)\s+(?:hava|sıcaklık)',
+    
+    # Recent releases/publications
+    r'(?:yeni|son)\s+(?:çıkan|yayınlanan)\s+(?:kitap|film|müzik)',
+    r'(?:2024|2025)\s+(?:çıkan|yayınlanan)',
+    
+    # Books/works not likely in system
+    r'(?:hangi|kim)\s+(?:yazdı|yazarı|eseri)',  # Could be unknown works
+    r'(?:kitap|roman|şiir)\s+(?:kim|kimin|hangi)',
+    
+    # Live data
+    r'(?:şu an|anlık|canlı)\s+',
+    r'(?:en son|en yeni|fresh)',
+    
+    # Technology and recent events
+    r'(?:chatgpt|ai|yapay zeka)\s+(?:son|yeni|güncel)',
+    r'(?:iphone|android|tesla)\s+(?:yeni|son|model)'
+]
 
 async def clean_web_search_with_anythingllm(web_search_result: str, original_question: str) -> str:
     """Clean and improve web search results using AnythingLLM - REMOVE source attribution"""
@@ -367,45 +772,44 @@ Lütfen bu bilgiyi:
 
 Temiz cevap:"""
 
-        async with httpx.AsyncClient() as client:
-            api_payload = {
-                "message": cleaning_prompt,
-                "mode": "chat",
-                "sessionId": f"cleaning-{hash(original_question)}"
-            }
+        http_client = get_provider_client("anythingllm")
+        api_payload = {
+            "message": cleaning_prompt,
+            "mode": "chat",
+            "sessionId": f"cleaning-{hash(original_question)}"
+        }
+        
+        response = await http_client.post(
+            ANYTHINGLLM_API_URL,
+            headers={
+                "Authorization": f"Bearer {ANYTHINGLLM_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json=api_payload
+        )
+        
+        if response.status_code == 200:
+            ai_response = response.json()
+            cleaned_result = ai_response.get("textResponse", web_search_result)
             
-            response = await client.post(
-                ANYTHINGLLM_API_URL,
-                headers={
-                    "Authorization": f"Bearer {ANYTHINGLLM_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json=api_payload,
-                timeout=20.0
-            )
+            # Fix English error messages from AnythingLLM
+            if "sorry, i'm experiencing technical difficulties" in cleaned_result.lower():
+                cleaned_result = "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
+            elif "sorry" in cleaned_result.lower() and "technical" in cleaned_result.lower():
+                cleaned_result = "Teknik sorun nedeniyle temizleme yapılamadı. Orijinal web sonucu gösteriliyor."
+            
+            # Additional cleaning - remove any remaining source attributions
+            cleaned_result = re.sub(r'\*.*web.*kaynak.*\*', '', cleaned_result, flags=re.IGNORECASE)
+            cleaned_result = re.sub(r'web araştırması sonucunda:?', '', cleaned_result, flags=re.IGNORECASE)
+            cleaned_result = re.sub(r'güncel.*kaynak.*alınmıştır', '', cleaned_result, flags=re.IGNORECASE)
+            cleaned_result = cleaned_result.strip()
+            
+            logging.info("Web search result cleaned and source attribution removed")
+            return cleaned_result
+        else:
+            logging.error(f"AnythingLLM cleaning error: {response.status_code}")
+            return web_search_result
             
-            if response.status_code == 200:
-                ai_response = response.json()
-                cleaned_result = ai_response.get("textResponse", web_search_result)
-                
-                # Fix English error messages from AnythingLLM
-                if "sorry, i'm experiencing technical difficulties" in cleaned_result.lower():
-                    cleaned_result = "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
-                elif "sorry" in cleaned_result.lower() and "technical" in cleaned_result.lower():
-                    cleaned_result = "Teknik sorun nedeniyle temizleme yapılamadı. Orijinal web sonucu gösteriliyor."
-                
-                # Additional cleaning - remove any remaining source attributions
-                cleaned_result = re.sub(r'\*.*web.*kaynak.*\*', '', cleaned_result, flags=re.IGNORECASE)
-                cleaned_result = re.sub(r'web araştırması sonucunda:?', '', cleaned_result, flags=re.IGNORECASE)
-                cleaned_result = re.sub(r'güncel.*kaynak.*alınmıştır', '', cleaned_result, flags=re.IGNORECASE)
-                cleaned_result = cleaned_result.strip()
-                
-                logging.info("Web search result cleaned and source attribution removed")
-                return cleaned_result
-            else:
-                logging.error(f"AnythingLLM cleaning error: {response.status_code}")
-                return web_search_result
-                
     except Exception as e:
         logging.error(f"Web search cleaning error: {e}")
         return web_search_result
@@ -428,52 +832,51 @@ async def get_anythingllm_response(question: str, conversation_mode: str = 'norm
             if conversation_mode in mode_prompts:
                 final_message = f"{mode_prompts[conversation_mode]} {question}"
         
-        async with httpx.AsyncClient() as client:
-            api_payload = {
-                "message": final_message,
-                "mode": "chat",
-                "sessionId": f"hybrid-{hash(question)}"
-            }
+        http_client = get_provider_client("anythingllm")
+        api_payload = {
+            "message": final_message,
+            "mode": "chat",
+            "sessionId": f"hybrid-{hash(question)}"
+        }
+        
+        response = await http_client.post(
+            ANYTHINGLLM_API_URL,
+            headers={
+                "Authorization": f"Bearer {ANYTHINGLLM_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json=api_payload
+        )
+        
+        if response.status_code == 200:
+            ai_response = response.json()
+            raw_response = ai_response.get("textResponse", "AnythingLLM yanıt veremedi.")
             
-            response = await client.post(
-                ANYTHINGLLM_API_URL,
-                headers={
-                    "Authorization": f"Bearer {ANYTHINGLLM_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json=api_payload,
-                timeout=20.0
-            )
+            # Fix common English error messages - MORE COMPREHENSIVE
+            response_lower = raw_response.lower().strip()
+            
+            # Check for exact English error message match
+            if response_lower == "sorry, i'm experiencing technical difficulties.":
+                return "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
+            elif "sorry, i'm experiencing technical difficulties" in response_lower:
+                return "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
+            elif "sorry" in response_lower and "experiencing" in response_lower and "technical" in response_lower:
+                return "Teknik bir sorun nedeniyle yanıt veremedim. Lütfen tekrar deneyin."
+            elif "sorry" in response_lower and ("technical" in response_lower or "difficulties" in response_lower):
+                return "Üzgünüm, teknik sorun yaşıyorum. Lütfen tekrar deneyin."
+            elif "i cannot" in response_lower or "i can't" in response_lower:
+                return "Bu konuda yardımcı olamıyorum. Başka bir şey sorabilirsiniz."
+            elif response_lower.startswith("sorry"):
+                return "Üzgünüm, o konuda yardımcı olamıyorum."
+            
+            # Clean markdown formatting and format math expressions
+            cleaned_response = clean_response_formatting(raw_response)
+            formatted_response = format_math_response(cleaned_response)
+            return formatted_response
+        else:
+            logging.error(f"AnythingLLM error: {response.status_code}")
+            return "AnythingLLM'e şu anda erişilemedi. Lütfen tekrar deneyin."
             
-            if response.status_code == 200:
-                ai_response = response.json()
-                raw_response = ai_response.get("textResponse", "AnythingLLM yanıt veremedi.")
-                
-                # Fix common English error messages - MORE COMPREHENSIVE
-                response_lower = raw_response.lower().strip()
-                
-                # Check for exact English error message match
-                if response_lower == "sorry, i'm experiencing technical difficulties.":
-                    return "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
-                elif "sorry, i'm experiencing technical difficulties" in response_lower:
-                    return "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
-                elif "sorry" in response_lower and "experiencing" in response_lower and "technical" in response_lower:
-                    return "Teknik bir sorun nedeniyle yanıt veremedim. Lütfen tekrar deneyin."
-                elif "sorry" in response_lower and ("technical" in response_lower or "difficulties" in response_lower):
-                    return "Üzgünüm, teknik sorun yaşıyorum. Lütfen tekrar deneyin."
-                elif "i cannot" in response_lower or "i can't" in response_lower:
-                    return "Bu konuda yardımcı olamıyorum. Başka bir şey sorabilirsiniz."
-                elif response_lower.startswith("sorry"):
-                    return "Üzgünüm, o konuda yardımcı olamıyorum."
-                
-                # Clean markdown formatting and format math expressions
-                cleaned_response = clean_response_formatting(raw_response)
-                formatted_response = format_math_response(cleaned_response)
-                return formatted_response
-            else:
-                logging.error(f"AnythingLLM error: {response.status_code}")
-                return "AnythingLLM'e şu anda erişilemedi. Lütfen tekrar deneyin."
-                
     except Exception as e:
         logging.error(f"AnythingLLM request error: {e}")
         return "AnythingLLM ile bağlantı sorunu yaşandı. Lütfen tekrar deneyin."
@@ -531,90 +934,67 @@ def can_anythingllm_answer(anythingllm_response: str) -> bool:
     logging.info("AnythingLLM provided answer from RAG system - using it")
     return True
 
-def get_question_category(question: str) -> str:
-    """Quickly categorize question type for optimal routing"""
-    
-    question_lower = question.lower().strip()
-    
-    # Simple greetings and casual questions - AnythingLLM only
-    casual_patterns = [
-        r'^(merhaba|selam|naber|nasılsın|iyi misin)$',
-        r'^(hello|hi|hey)$',
-        r'(teşekkür|sağol|eyvallah)',
-        r'^(tamam|ok|peki|anladım)$',
-        r'(nasıl gidiyor|keyifler|ne yapıyorsun)',
-        r'^(iyi geceler|günaydın|tünaydın)$'
-    ]
-    
-    # Current/live information - ONLY real-time data that DeepSeek can't know
-    current_info_patterns = [
-        # Weather (today/now only)
-        r'(bugün|şu an|anlık)\s+(hava durumu|hava|sıcaklık)',
-        r'(hava durumu|hava)\s+(bugün|şimdi|şu an)',
-        
-        # Sports scores/results (today/recent only)  
-        r'(bugün|dün|bu hafta)\s+(maç|skor|sonuç)',
-        r'(maç|skor|sonuç)\s+(bugün|dün|şu an)',
-        r'(galatasaray|fenerbahçe|beşiktaş|trabzonspor)\s+(maç|skor)\s+(bugün|dün)',
-        r'(şampiyonlar ligi|premier lig|süper lig)\s+(bugün|dün|bu hafta)',
-        
-        # Financial/Currency (current prices only)
-        r'(bugün|şu an|anlık)\s+(dolar|euro|bitcoin|altın)\s+(kur|fiyat)',
-        r'(dolar|euro|bitcoin|altın|borsa)\s+(bugün|şu an|anlık)',
-        
-        # Breaking News (today only)
-        r'(bugün|şu an|son dakika)\s+(haber|gelişme|olay)',
-        r'(son dakika|breaking|acil)\s+(haber|bilgi)',
-        
-        # Traffic and Transportation - Google'dan aratılabilir
-        r'(trafik|yol durumu|ulaşım|metro|otobüs)',
-        r'(kapalı|açık).*(yol|köprü|tünel)',
-        
-        # Recent releases/publications - Google'dan aratılabilir
-        r'(yeni|son).*(çıkan|yayınlanan|piyasaya).*(kitap|film|müzik|oyun)',
-        r'(2024|2025).*(çıkan|yayınlanan|çıkacak)',
-        
-        # Store hours, opening times - Google'dan aratılabilir
-        r'(açık|kapalı|saat).*(market|mağaza|restoran|banka)',
-        r'(çalışma saatleri|açılış saati)',
-        
-        # Live events, concerts - Google'dan aratılabilir
-        r'(konser|etkinlik|festival|gösteri).*(bugün|yakında|tarih)',
-        
-        # Current prices, availability - Google'dan aratılabilir
-        r'(fiyat|ücret|maliyet).*(şu an|güncel|bugün)',
-        r'(satış|indirim|kampanya).*(aktif|geçerli)'
-    ]
-    
-    # Check for casual questions first
-    for pattern in casual_patterns:
-        if re.search(pattern, question_lower):
-            return 'casual'
-    
-    # Check for current information needs (Google'dan aratılabilecek bilgiler)
-    for pattern in current_info_patterns:
-        if re.search(pattern, question_lower):
-            return 'current'
-    
-    # Check if it's a factual knowledge question that might need verification
-    factual_patterns = [
-        r'(kim|hangi|ne zaman|nerede).*(yazdı|yaptı|oldu|kurdu)',
-        r'(kaç|ne kadar).*(yıl|metre|kilo|kişi)',
-        r'(başkenti|nüfusu|yüzölçümü)',
-        r'(doğum|ölüm).*(tarih|yıl)',
-        r'(eseri|kitabı|şiiri|filmi)'
-    ]
-    
-    for pattern in factual_patterns:
-        if re.search(pattern, question_lower):
-            return 'factual'
-    
-    # Math or calculation questions - AnythingLLM preferred
-    if re.search(r'(\d+\s*[\+\-\*\/x×÷]\s*\d+|matematik|hesap|kaç\s+eder)', question_lower):
-        return 'math'
-    
-    # Default to general knowledge
-    return 'general'
+# Simple greetings and casual questions - AnythingLLM only
+CATEGORY_CASUAL_PATTERNS = [
+    r'^(merhaba|selam|naber|nasılsın|iyi misin)$',
+    r'^(hello|hi|hey)$',
+    r'(teşekkür|sağol|eyvallah)',
+    r'^(tamam|ok|peki|anladım)$',
+    r'(nasıl gidiyor|keyifler|ne yapıyorsun)',
+    r'^(iyi geceler|günaydın|tünaydın)$'
+]
+
+# Current/live information - ONLY real-time data that DeepSeek can't know
+CATEGORY_CURRENT_PATTERNS = [
+    # Weather (today/now only)
+    r'(bugün|şu an|anlık)\s+(hava durumu|hava|sıcaklık)',
+    r'(hava durumu|hava)\s+(bugün|şimdi|şu an)',
+    
+    # Sports scores/results (today/recent only)  
+    r'(bugün|dün|bu hafta)\s+(maç|skor|sonuç)',
+    r'(maç|skor|sonuç)\s+(bugün|dün|şu an)',
+    r'(galatasaray|fenerbahçe|beşiktaş|trabzonspor)\s+(maç|skor)\s+(bugün|dün)',
+    r'(şampiyonlar ligi|premier lig|süper lig)\s+(bugün|dün|bu hafta)',
+    
+    # Financial/Currency (current prices only)
+    r'(bugün|şu an|anlık)\s+(dolar|euro|bitcoin|altın)\s+(kur|fiyat)',
+    r'(dolar|euro|bitcoin|altın|borsa)\s+(bugün|şu an|anlık)',
+    
+    # Breaking News (today only)
+    r'(bugün|şu an|son dakika)\s+(haber|gelişme|olay)',
+    r'(son dakika|breaking|acil)\s+(haber|bilgi)',
+    
+    # Traffic and Transportation - Google'dan aratılabilir
+    r'(trafik|yol durumu|ulaşım|metro|otobüs)',
+    r'(kapalı|açık).*(yol|köprü|tünel)',
+    
+    # Recent releases/publications - Google'dan aratılabilir
+    r'(yeni|son).*(çıkan|yayınlanan|piyasaya).*(kitap|film|müzik|oyun)',
+    r'(2024|2025).*(çıkan|yayınlanan|çıkacak)',
+    
+    # Store hours, opening times - Google'dan aratılabilir
+    r'(açık|kapalı|saat).*(market|mağaza|restoran|banka)',
+    r'(çalışma saatleri|açılış saati)',
+    
+    # Live events, concerts - Google'dan aratılabilir
+    r'(konser|etkinlik|festival|gösteri).*(bugün|yakında|tarih)',
+    
+    # Current prices, availability - Google'dan aratılabilir
+    r'(fiyat|ücret|maliyet).*(şu an|güncel|bugün)',
+    r'(satış|indirim|kampanya).*(aktif|geçerli)'
+]
+
+# Factual knowledge questions that might need verification
+CATEGORY_FACTUAL_PATTERNS = [
+    r'(kim|hangi|ne zaman|nerede).*(yazdı|yaptı|oldu|kurdu)',
+    r'(kaç|ne kadar).*(yıl|metre|kilo|kişi)',
+    r'(başkenti|nüfusu|yüzölçümü)',
+    r'(doğum|ölüm).*(tarih|yıl)',
+    r'(eseri|kitabı|şiiri|filmi)'
+]
+
+# Math or calculation questions
+CATEGORY_MATH_PATTERN = r'(\d+\s*[\+\-\*\/x×÷]\s*\d+|matematik|hesap|kaç\s+eder)'
 
 def are_responses_similar(response1: str, response2: str) -> bool:
     """Check if two responses contain similar information to avoid duplication"""
@@ -653,6 +1033,10 @@ def are_responses_similar(response1: str, response2: str) -> bool:
 
 async def process_with_novita_deepseek(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
     """Process question with Novita API DeepSeek v3.1"""
+    if not is_provider_available("novita"):
+        logging.warning("Novita circuit open - failing over to OpenAI gpt-4o-mini")
+        return await process_with_direct_openai(question, file_content, file_name)
+    
     try:
         # Prepare personality prompt if conversation mode is active
         if conversation_mode and conversation_mode != 'normal':
@@ -697,51 +1081,56 @@ async def process_with_novita_deepseek(question: str, conversation_mode: str = '
             "stream": True
         }
         
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", 
-                                   "https://api.novita.ai/v3/openai/chat/completions",
-                                   headers=headers, 
-                                   json=payload, 
-                                   timeout=30.0) as response:
-                
-                logging.info(f"Novita API streaming response status: {response.status_code}")
+        http_client = get_provider_client("novita")
+        async with http_client.stream("POST", 
+                                      "https://api.novita.ai/v3/openai/chat/completions",
+                                      headers=headers, 
+                                      json=payload,
+                                      timeout=30.0) as response:
+            
+            logging.info(f"Novita API streaming response status: {response.status_code}")
+            
+            if response.status_code == 200:
+                content_parts = []
                 
-                if response.status_code == 200:
-                    full_content = ""
-                    
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]  # Remove "data: " prefix
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data_str = line[6:]  # Remove "data: " prefix
+                        
+                        if data_str.strip() == "[DONE]":
+                            break
+                            
+                        try:
+                            chunk_data = json.loads(data_str)
+                            choices = chunk_data.get('choices', [])
                             
-                            if data_str.strip() == "[DONE]":
-                                break
+                            # Safely check if choices array has content
+                            if choices and len(choices) > 0:
+                                delta = choices[0].get('delta', {})
+                                chunk_content = delta.get('content', '')
                                 
-                            try:
-                                chunk_data = json.loads(data_str)
-                                choices = chunk_data.get('choices', [])
+                                if chunk_content:
+                                    content_parts.append(chunk_content)
                                 
-                                # Safely check if choices array has content
-                                if choices and len(choices) > 0:
-                                    delta = choices[0].get('delta', {})
-                                    chunk_content = delta.get('content', '')
-                                    
-                                    if chunk_content:
-                                        full_content += chunk_content
-                                    
-                            except json.JSONDecodeError:
-                                continue
-                    
-                    if not full_content:
-                        logging.warning("Empty content from Novita streaming API")
-                        return "Yanıt oluşturulamadı. Lütfen tekrar deneyin."
-                    
-                    logging.info(f"Novita DeepSeek streaming response completed: {len(full_content)} characters")
-                    return full_content
-                else:
-                    error_text = await response.atext()
-                    logging.error(f"Novita API error: {response.status_code} - {error_text}")
-                    return "Novita API'sinde bir hata oluştu. Lütfen tekrar deneyin."
+                        except json.JSONDecodeError:
+                            continue
+                
+                full_content = "".join(content_parts)
+                if not full_content:
+                    logging.warning("Empty content from Novita streaming API")
+                    return "Yanıt oluşturulamadı. Lütfen tekrar deneyin."
                 
+                logging.info(f"Novita DeepSeek streaming response completed: {len(full_content)} characters")
+                return full_content
+            else:
+                error_text = await response.atext()
+                logging.error(f"Novita API error: {response.status_code} - {error_text}")
+                return "Novita API'sinde bir hata oluştu. Lütfen tekrar deneyin."
+            
+    except httpx.TransportError as e:
+        # Breaker tripped by a concurrent request, or Novita unreachable - nothing was returned yet
+        logging.warning(f"Novita unavailable ({e!r}) - failing over to OpenAI gpt-4o-mini")
+        return await process_with_direct_openai(question, file_content, file_name)
     except Exception as e:
         logging.error(f"Novita API request error: {e}")
         return "Novita API'sine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
@@ -790,83 +1179,155 @@ async def process_with_openai_gpt5_nano(question: str, conversation_mode: str =
         logging.error(f"ChatGPT-4o-mini request error via Emergent integrations: {e}")
         return "ChatGPT API'sine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
 
-def is_formula_based_question(question: str) -> bool:
-    """Check if question requires formula calculations or specialized technical knowledge from RAG"""
-    formula_keywords = [
-        # Matematik & İstatistik
-        'matematik', 'istatistik', 'olasılık', 'permütasyon', 'kombinasyon',
-        'integral', 'türev', 'diferansiyel', 'eşitlik', 'denklem', 'formül', 'hesapla', 'çöz',
-        'sin', 'cos', 'tan', 'logaritma', 'üssel', 'kök', 'karekök', 'faktöriyel',
-        'matris', 'determinant', 'vektör', 'trigonometri', 'limit', 'seri',
-        'standart sapma', 'varyans', 'korelasyon', 'regresyon', 'hipotez testi',
-        'normal dağılım', 'p-değeri', 'güven aralığı', 'örneklem', 'populasyon',
-        
-        # Finans & Muhasebe  
-        'finans', 'muhasebe', 'mali', 'bütçe', 'bilanço', 'gelir tablosu',
-        'nakit akışı', 'roi', 'npv', 'irr', 'faiz', 'kredi', 'yatırım',
-        'amortisman', 'vergi', 'gider', 'gelir', 'kar', 'zarar', 'aktif', 'pasif',
-        'oran analizi', 'likidite', 'karlılık', 'finansal analiz',
-        
-        # Mühendislik 
-        'mühendislik', 'mekanik', 'elektrik', 'endüstri', 'inşaat', 'makine',
-        'mukavemet', 'gerilme', 'burulma', 'moment', 'kiriş', 'yapı analizi',
-        'devre', 'impedans', 'frekans', 'filtre', 'transistör', 'direnç', 'kondensatör',
-        'termodinamik', 'ısı transferi', 'akışkanlar', 'bernoulli', 'reynolds',
-        
-        # Fizik & Kimya
-        'fizik', 'kimya', 'newton', 'euler', 'maxwell', 'schrödinger', 'ohm', 'coulomb',
-        'kinetik', 'potansiyel', 'momentum', 'enerji korunumu', 'hız', 'ivme',
-        'mol', 'molalite', 'molarite', 'ph', 'asit', 'baz', 'reaksiyon', 'denge',
-        
-        # Technical indicators
-        'basınç', 'hacim', 'yoğunluk', 'sıcaklık', 'entropi', 'entalpi',
-        'mutlak', 'relatif', 'katsayı', 'oran', 'ölçü', 'birim',
-        
-        # Calculation terms
-        'hesapla', 'bul', 'çöz', 'formül', 'denklem', 'işlem', 'sonuç'
-    ]
-    
-    question_lower = question.lower()
-    
-    # Also check for mathematical expressions
-    math_patterns = [
-        r'\d+\s*[+\-*/^]\s*\d+',  # Basic math operations
-        r'[xyz]\s*[=+\-]',  # Variable equations
-        r'[∑∫∏√π]',  # Math symbols
-        r'\b\d+%\b',  # Percentages in calculations
-        r'\bp_\{.*\}',  # Probability notation
-    ]
-    
-    has_keywords = any(keyword in question_lower for keyword in formula_keywords)
-    has_math_pattern = any(re.search(pattern, question_lower) for pattern in math_patterns)
-    
-    return has_keywords or has_math_pattern
-
-def is_general_knowledge_question(question: str) -> bool:
-    """Check if question is about general knowledge, culture, history, etc."""
-    general_keywords = [
-        # Genel kültür
-        'tarih', 'coğrafya', 'sanat', 'müzik', 'edebiyat', 'sinema', 'spor',
-        'ünlü kişi', 'ünlü', 'meşhur', 'kim', 'nerede', 'hangi yıl', 'ne zaman',
-        'başkent', 'ülke', 'şehir', 'dil', 'kültür', 'din', 'bayram', 'festival',
-        # Yaşam tarzı
-        'yemek', 'tarif', 'seyahat', 'gezi', 'tatil', 'hobi', 'eğlence',
-        'sağlık', 'beslenme', 'egzersiz', 'moda', 'stil', 'ev dekorasyonu',
-        # İnsan bilimi
-        'psikoloji', 'sosyoloji', 'felsefe', 'ahlak', 'etik', 'yaşam', 'mutluluk',
-        'başarı', 'kariyer', 'ilişki', 'aile', 'çocuk', 'eğitim'
-    ]
-    
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in general_keywords)
+FORMULA_KEYWORDS = [
+    # Matematik & İstatistik
+    'matematik', 'istatistik', 'olasılık', 'permütasyon', 'kombinasyon',
+    'integral', 'türev', 'diferansiyel', 'eşitlik', 'denklem', 'formül', 'hesapla', 'çöz',
+    'sin', 'cos', 'tan', 'logaritma', 'üssel', 'kök', 'karekök', 'faktöriyel',
+    'matris', 'determinant', 'vektör', 'trigonometri', 'limit', 'seri',
+    'standart sapma', 'varyans', 'korelasyon', 'regresyon', 'hipotez testi',
+    'normal dağılım', 'p-değeri', 'güven aralığı', 'örneklem', 'populasyon',
+    
+    # Finans & Muhasebe  
+    'finans', 'muhasebe', 'mali', 'bütçe', 'bilanço', 'gelir tablosu',
+    'nakit akışı', 'roi', 'npv', 'irr', 'faiz', 'kredi', 'yatırım',
+    'amortisman', 'vergi', 'gider', 'gelir', 'kar', 'zarar', 'aktif', 'pasif',
+    'oran analizi', 'likidite', 'karlılık', 'finansal analiz',
+    
+    # Mühendislik 
+    'mühendislik', 'mekanik', 'elektrik', 'endüstri', 'inşaat', 'makine',
+    'mukavemet', 'gerilme', 'burulma', 'moment', 'kiriş', 'yapı analizi',
+    'devre', 'impedans', 'frekans', 'filtre', 'transistör', 'direnç', 'kondensatör',
+    'termodinamik', 'ısı transferi', 'akışkanlar', 'bernoulli', 'reynolds',
+    
+    # Fizik & Kimya
+    'fizik', 'kimya', 'newton', 'euler', 'maxwell', 'schrödinger', 'ohm', 'coulomb',
+    'kinetik', 'potansiyel', 'momentum', 'enerji korunumu', 'hız', 'ivme',
+    'mol', 'molalite', 'molarite', 'ph', 'asit', 'baz', 'reaksiyon', 'denge',
+    
+    # Technical indicators
+    'basınç', 'hacim', 'yoğunluk', 'sıcaklık', 'entropi', 'entalpi',
+    'mutlak', 'relatif', 'katsayı', 'oran', 'ölçü', 'birim',
+    
+    # Calculation terms
+    'hesapla', 'bul', 'çöz', 'formül', 'denklem', 'işlem', 'sonuç'
+]
+
+# Also check for mathematical expressions
+FORMULA_MATH_PATTERNS = [
+    r'\d+\s*[+\-*/^]\s*\d+',  # Basic math operations
+    r'[xyz]\s*[=+\-]',  # Variable equations
+    r'[∑∫∏√π]',  # Math symbols
+    r'\b\d+%\b',  # Percentages in calculations
+    r'\bp_\{.*\}',  # Probability notation
+]
+
+GENERAL_KNOWLEDGE_KEYWORDS = [
+    # Genel kültür
+    'tarih', 'coğrafya', 'sanat', 'müzik', 'edebiyat', 'sinema', 'spor',
+    'ünlü kişi', 'ünlü', 'meşhur', 'kim', 'nerede', 'hangi yıl', 'ne zaman',
+    'başkent', 'ülke', 'şehir', 'dil', 'kültür', 'din', 'bayram', 'festival',
+    # Yaşam tarzı
+    'yemek', 'tarif', 'seyahat', 'gezi', 'tatil', 'hobi', 'eğlence',
+    'sağlık', 'beslenme', 'egzersiz', 'moda', 'stil', 'ev dekorasyonu',
+    # İnsan bilimi
+    'psikoloji', 'sosyoloji', 'felsefe', 'ahlak', 'etik', 'yaşam', 'mutluluk',
+    'başarı', 'kariyer', 'ilişki', 'aile', 'çocuk', 'eğitim'
+]
+
+def encode_json(data: dict) -> str:
+    """Serialize JSON for SSE events, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+class SSEStreamEncoder:
+    """Encode streaming answer events for the /messages/stream SSE protocol"""
+    
+    def __init__(self, protocol: int = STREAM_PROTOCOL_VERSION):
+        self.protocol = protocol if protocol in (1, 2) else STREAM_PROTOCOL_VERSION
+        self.seq = 0
+        self.parts = []
+        self.full_text = ""  # v1 only - re-joining parts for every chunk would be quadratic
+        self.byte_length = 0
+        self.crc32 = 0
+    
+    @property
+    def text(self) -> str:
+        if self.protocol == 1:
+            return self.full_text
+        return "".join(self.parts)
+    
+    def _format(self, data: dict) -> str:
+        return f"data: {encode_json(data)}\n\n"
+    
+    def event(self, event_type: str, content: str) -> str:
+        """Encode a thinking/error event"""
+        data = {'type': event_type, 'content': content}
+        if self.protocol >= 2:
+            data['v'] = self.protocol
+        return self._format(data)
+    
+    def chunk(self, content: str) -> str:
+        """Accumulate a delta and encode it as a chunk event"""
+        self.parts.append(content)
+        self.seq += 1
+        
+        if self.protocol == 1:
+            self.full_text += content
+            return self._format({'type': 'chunk', 'content': content, 'full_content': self.full_text})
+        
+        # Checkpoints cover the UTF-8 bytes of everything streamed so far
+        encoded = content.encode('utf-8')
+        self.byte_length += len(encoded)
+        self.crc32 = zlib.crc32(encoded, self.crc32)
+        data = {'type': 'chunk', 'v': self.protocol, 'seq': self.seq, 'content': content}
+        if self.seq % STREAM_CHECKSUM_INTERVAL == 0:
+            data['bytes'] = self.byte_length
+            data['crc32'] = self.crc32
+        return self._format(data)
+    
+    def complete(self, content: str = None) -> str:
+        """Encode the completion event with the final answer and stream checkpoint"""
+        final_content = self.text if content is None else content
+        if self.protocol == 1:
+            return self._format({'type': 'complete', 'content': final_content})
+        return self._format({
+            'type': 'complete',
+            'v': self.protocol,
+            'seq': self.seq,
+            'bytes': self.byte_length,
+            'crc32': self.crc32,
+            'content': final_content
+        })
 
-async def generate_novita_streaming_response(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None):
-    """Generate real-time streaming response from Novita API"""
+async def encode_stream_events(events, protocol: int = STREAM_PROTOCOL_VERSION):
+    """Encode provider stream events ('chunk' / 'error' / 'complete') as SSE for the requested protocol"""
+    encoder = SSEStreamEncoder(protocol)
+    
+    # Send initial thinking message before the upstream connection is made
+    yield encoder.event('thinking', 'BİLGİN düşünüyor...')
+    
+    async for event_type, content in events:
+        if event_type == 'chunk':
+            yield encoder.chunk(content)
+        elif event_type == 'complete':
+            yield encoder.complete(content)
+        else:
+            yield encoder.event(event_type, content)
+
+async def stream_novita_events(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None):
+    """Stream answer events from Novita API as they arrive"""
     
+    if not is_provider_available("novita"):
+        logging.warning("Novita circuit open - failing over to OpenAI gpt-4o-mini (stream)")
+        answer = await process_with_direct_openai(question, file_content, file_name)
+        yield ('chunk', answer)
+        yield ('complete', answer)
+        return
+    
+    streamed = False
     try:
-        # Send initial thinking message
-        yield f"data: {json.dumps({'type': 'thinking', 'content': 'BİLGİN düşünüyor...'})}\n\n"
-        
         # Prepare system message
         if conversation_mode and conversation_mode != 'normal':
             mode_personalities = {
@@ -909,76 +1370,295 @@ async def generate_novita_streaming_response(question: str, conversation_mode: s
             "stream": True
         }
         
-        full_content = ""
-        
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", 
-                                   "https://api.novita.ai/v3/openai/chat/completions",
-                                   headers=headers, 
-                                   json=payload, 
-                                   timeout=60.0) as response:
-                
-                if response.status_code == 200:
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]
+        http_client = get_provider_client("novita")
+        async with http_client.stream("POST", 
+                                      "https://api.novita.ai/v3/openai/chat/completions",
+                                      headers=headers, 
+                                      json=payload) as response:
+            
+            if response.status_code == 200:
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data_str = line[6:]
+                        
+                        if data_str.strip() == "[DONE]":
+                            break
                             
-                            if data_str.strip() == "[DONE]":
-                                break
+                        try:
+                            chunk_data = json.loads(data_str)
+                            choices = chunk_data.get('choices', [])
+                            
+                            # Safely check if choices array has content
+                            if choices and len(choices) > 0:
+                                delta = choices[0].get('delta', {})
+                                chunk_content = delta.get('content', '')
                                 
-                            try:
-                                chunk_data = json.loads(data_str)
-                                choices = chunk_data.get('choices', [])
+                                if chunk_content:
+                                    # Stream each chunk as it arrives
+                                    streamed = True
+                                    yield ('chunk', chunk_content)
                                 
-                                # Safely check if choices array has content
-                                if choices and len(choices) > 0:
-                                    delta = choices[0].get('delta', {})
-                                    chunk_content = delta.get('content', '')
-                                    
-                                    if chunk_content:
-                                        full_content += chunk_content
-                                        # Stream each chunk as it arrives
-                                        yield f"data: {json.dumps({'type': 'chunk', 'content': chunk_content, 'full_content': full_content})}\n\n"
-                                    
-                            except json.JSONDecodeError:
-                                continue
-                else:
-                    error_text = await response.atext()
-                    yield f"data: {json.dumps({'type': 'error', 'content': 'API hatası oluştu'})}\n\n"
-                    return
-        
+                        except json.JSONDecodeError:
+                            continue
+            else:
+                error_text = await response.atext()
+                yield ('error', 'API hatası oluştu')
+                return
+
         # Send completion signal
-        yield f"data: {json.dumps({'type': 'complete', 'content': full_content})}\n\n"
-        
+        yield ('complete', None)
+        
+    except httpx.TransportError as e:
+        if streamed:
+            logging.error(f"Streaming error: {e}")
+            yield ('error', 'Bağlantı hatası oluştu')
+            return
+        logging.warning(f"Novita unavailable ({e!r}) - failing over to OpenAI gpt-4o-mini (stream)")
+        answer = await process_with_direct_openai(question, file_content, file_name)
+        yield ('chunk', answer)
+        yield ('complete', answer)
     except Exception as e:
         logging.error(f"Streaming error: {e}")
-        yield f"data: {json.dumps({'type': 'error', 'content': 'Bağlantı hatası oluştu'})}\n\n"
+        yield ('error', 'Bağlantı hatası oluştu')
 
-async def generate_streaming_response(content: str):
-    """Generate streaming response for FREE version (non-real-time streaming)"""
-    try:
-        # Send initial thinking message
-        yield f"data: {json.dumps({'type': 'thinking', 'content': 'BİLGİN düşünüyor...'})}\n\n"
-        
-        # Simulate streaming by splitting content into chunks
-        import asyncio
-        words = content.split(' ')
-        current_text = ""
-        
-        for i, word in enumerate(words):
-            current_text += word + " "
+TURKISH_CASEFOLD_TABLE = str.maketrans({'İ': 'i', 'I': 'ı'})
+
+def turkish_lower(text: str) -> str:
+    """Lowercase with Turkish dotted/dotless i rules (str.lower() turns İ into i + combining dot)"""
+    return text.translate(TURKISH_CASEFOLD_TABLE).lower()
+
+def casefold_readings(text: str) -> tuple:
+    """turkish_lower(text), plus the Latin reading when text has an uppercase I - "IRR", "ROI", "BITCOIN" are i, not ı"""
+    turkish = turkish_lower(text)
+    if 'I' not in text:
+        return (turkish,)
+    return (turkish, text.replace('İ', 'i').lower())
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for coalescing/caching keys"""
+    return " ".join(turkish_lower(question).split())
+
+class StreamFanout:
+    """Replay one upstream event stream to any number of subscribers"""
+    
+    def __init__(self, source):
+        self.events = []
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+    
+    async def _pump(self, source):
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            logging.error(f"Shared stream error: {e}")
+            self.events.append(('error', 'Bağlantı hatası oluştu'))
+        finally:
+            self.done = True
+            self._notify()
+    
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def subscribe(self):
+        """Yield every event from the start, then live events until the upstream ends"""
+        index = 0
+        try:
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            # Nobody is listening any more - stop paying for the upstream stream
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+
+class SingleFlight:
+    """Coalesce concurrent identical upstream requests into one in-flight call or stream"""
+    
+    def __init__(self):
+        self.calls = {}
+        self.streams = {}
+        self.stats = {"calls": 0, "coalesced_calls": 0, "streams": 0, "coalesced_streams": 0}
+    
+    async def do(self, key: tuple, call_factory):
+        """Await the shared result for key, starting call_factory() only if nothing is in flight"""
+        task = self.calls.get(key)
+        if task is None:
+            self.stats["calls"] += 1
+            task = asyncio.ensure_future(call_factory())
+            self.calls[key] = task
             
-            # Stream in chunks of 3-5 words
-            if (i + 1) % 4 == 0 or i == len(words) - 1:
-                yield f"data: {json.dumps({'type': 'chunk', 'content': word + ' ', 'full_content': current_text.strip()})}\n\n"
-                await asyncio.sleep(0.05)  # Small delay for streaming effect
-        
-        # Send completion signal
-        yield f"data: {json.dumps({'type': 'complete', 'content': current_text.strip()})}\n\n"
+            def _forget(done_task):
+                if self.calls.get(key) is done_task:
+                    del self.calls[key]
+                # Mark exceptions as retrieved even if every waiter went away
+                if not done_task.cancelled():
+                    done_task.exception()
+            
+            task.add_done_callback(_forget)
+        else:
+            self.stats["coalesced_calls"] += 1
+            logging.info(f"Single-flight: joined in-flight request for {key}")
+        
+        # Shield so one disconnecting client doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
+    
+    def stream(self, key: tuple, source_factory):
+        """Subscribe to the shared event stream for key, starting source_factory() only if needed"""
+        fanout = self.streams.get(key)
+        if fanout is None:
+            self.stats["streams"] += 1
+            fanout = StreamFanout(source_factory())
+            self.streams[key] = fanout
+            
+            def _forget(_):
+                if self.streams.get(key) is fanout:
+                    del self.streams[key]
+            
+            fanout.task.add_done_callback(_forget)
+        else:
+            self.stats["coalesced_streams"] += 1
+            logging.info(f"Single-flight: joined in-flight stream for {key}")
         
-    except Exception as e:
-        logging.error(f"Free streaming error: {e}")
-        yield f"data: {json.dumps({'type': 'error', 'content': 'Bağlantı hatası oluştu'})}\n\n"
+        fanout.subscribers += 1
+        return fanout.subscribe()
+
+single_flight = SingleFlight()
+
+def build_flight_key(question: str, version: str, conversation_mode: str, route: str) -> tuple:
+    """Key identical requests by normalized question, version, conversation mode and route"""
+    return (normalize_question(question), version, conversation_mode or 'normal', route)
+
+class AnswerCache:
+    """Memory-bounded LRU answer cache with per-entry TTL and an optional disk tier"""
+    
+    def __init__(self, max_entries: int, max_chars: int, disk_dir: str = None):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.entries = OrderedDict()  # key -> (expires_at, answer)
+        self.total_chars = 0
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+    
+    def _disk_path(self, key: tuple) -> Path:
+        digest = hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return self.disk_dir / f"{digest}.json"
+    
+    def _read_disk(self, key: tuple):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry["expires_at"], entry["answer"]
+    
+    def _write_disk(self, key: tuple, expires_at: float, answer: str):
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"expires_at": expires_at, "answer": answer}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    
+    def _store_memory(self, key: tuple, expires_at: float, answer: str):
+        if key in self.entries:
+            self.total_chars -= len(self.entries.pop(key)[1])
+        self.entries[key] = (expires_at, answer)
+        self.total_chars += len(answer)
+        while self.entries and (len(self.entries) > self.max_entries or self.total_chars > self.max_chars):
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total_chars -= len(evicted)
+            self.stats["evictions"] += 1
+    
+    async def get(self, key: tuple) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.total_chars -= len(self.entries.pop(key)[1])
+            self.stats["expired"] += 1
+        
+        if self.disk_dir:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self._store_memory(key, *entry)
+                self.stats["disk_hits"] += 1
+                return entry[1]
+        
+        self.stats["misses"] += 1
+        return None
+    
+    async def set(self, key: tuple, answer: str, ttl: int):
+        expires_at = time.time() + ttl
+        self._store_memory(key, expires_at, answer)
+        self.stats["stores"] += 1
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, expires_at, answer)
+            except OSError as e:
+                logging.warning(f"Answer cache disk write failed: {e}")
+    
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "total_chars": self.total_chars,
+            "hit_rate": round(hit_rate, 4),
+            "disk_enabled": self.disk_dir is not None
+        }
+
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_CHARS, ANSWER_CACHE_DIR)
+
+def build_answer_cache_key(question: str, version: str, conversation_mode: str, route: str) -> tuple:
+    """Key cached answers by normalized question, conversation mode, version and the route that answered"""
+    return (normalize_question(question), conversation_mode or 'normal', version, route)
+
+def get_answer_cache_ttl(question: str, file_content: str = None) -> int:
+    """Pick the cache TTL for a question from its category - never cache answers about files"""
+    if not ANSWER_CACHE_ENABLED or file_content:
+        return 0
+    return ANSWER_CACHE_TTLS.get(classify_question(question).category, 0)
+
+def is_cacheable_answer(answer: str) -> bool:
+    """Don't cache the Turkish error/fallback strings returned when a provider fails"""
+    if not answer or not answer.strip():
+        return False
+    answer_lower = answer.lower()
+    failure_markers = ["tekrar deneyin", "hata oluştu", "erişilemedi", "bağlantı sorunu", "yanıt alınamadı"]
+    return not any(marker in answer_lower for marker in failure_markers)
+
+async def cache_stream_events(events, cache_key: tuple, cache_ttl: int):
+    """Pass stream events through and store the finished answer in the answer cache"""
+    content_parts = []
+    failed = False
+    async for event_type, content in events:
+        if event_type == 'chunk':
+            content_parts.append(content)
+        elif event_type == 'error':
+            failed = True
+        elif event_type == 'complete' and not failed:
+            answer = content if content is not None else "".join(content_parts)
+            if is_cacheable_answer(answer):
+                await answer_cache.set(cache_key, answer, cache_ttl)
+        yield (event_type, content)
 
 async def smart_hybrid_response(question: str, version: str = 'pro', conversation_mode: str = 'normal', uploaded_files: list = None) -> str:
     """Main hybrid response function that routes to appropriate AI system"""
@@ -992,26 +1672,83 @@ async def smart_hybrid_response(question: str, version: str = 'pro', conversatio
         logging.info("PRO version selected - using simple system")
         return await simple_pro_system(question, conversation_mode)
 
-async def simple_pro_system(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
-    """PRO system with Novita DeepSeek v3.1: Novita for general, AnythingLLM for formulas, Serper for current"""
+async def race_with_fallback(primary, fallback, accept, grace_seconds: float, route: str = '') -> str:
+    """Run primary and fallback concurrently, preferring an accepted primary answer, and cancel the loser"""
+    primary_task = asyncio.ensure_future(primary)
+    fallback_task = asyncio.ensure_future(fallback)
     
-    logging.info(f"PRO version - Novita DeepSeek routing system for: {question}")
+    def accepted_primary() -> Optional[str]:
+        if primary_task.cancelled() or primary_task.exception() is not None:
+            return None
+        answer = primary_task.result()
+        return answer if accept(answer) else None
     
-    # Step 1: Check if conversation mode is active - use Ollama for all conversation modes
+    try:
+        done, _ = await asyncio.wait({primary_task, fallback_task}, return_when=asyncio.FIRST_COMPLETED)
+        
+        if primary_task in done:
+            answer = accepted_primary()
+            if answer is not None:
+                logging.info(f"Hedging ({route}): primary answered first - cancelling fallback")
+                return answer
+            logging.info(f"Hedging ({route}): primary rejected - using fallback")
+            return await fallback_task
+        
+        # Fallback is ready - give the preferred primary a short grace window
+        done, _ = await asyncio.wait({primary_task}, timeout=grace_seconds)
+        if primary_task in done:
+            answer = accepted_primary()
+            if answer is not None:
+                logging.info(f"Hedging ({route}): primary answered within grace window")
+                return answer
+        logging.info(f"Hedging ({route}): using fallback answer")
+        return fallback_task.result()
+    finally:
+        for task in (primary_task, fallback_task):
+            if not task.done():
+                task.cancel()
+
+def resolve_pro_route(question: str, conversation_mode: str = 'normal') -> str:
+    """Decide which PRO pipeline answers a question: conversation_mode, current, formula or general"""
     if conversation_mode and conversation_mode != 'normal':
+        return 'conversation_mode'
+    features = classify_question(question)
+    if features.category == 'current':
+        return 'current'
+    if features.is_formula:
+        return 'formula'
+    return 'general'
+
+async def simple_pro_system(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
+    """PRO system with Novita DeepSeek v3.1: Novita for general, AnythingLLM for formulas, Serper for current"""
+    
+    logging.info(f"PRO version - Novita DeepSeek routing system for: {question}")
+    route = resolve_pro_route(question, conversation_mode)
+    
+    # Step 1: Check if conversation mode is active - use Ollama for all conversation modes
+    if route == 'conversation_mode':
         logging.info(f"PRO: Conversation mode {conversation_mode} detected - using Ollama AnythingLLM")
         return await process_with_ollama_free(question, conversation_mode, file_content, file_name)
     
     # Step 2: Check if question is about current/güncel topics - use Serper API
-    category = get_question_category(question)
-    if category == 'current':
+    if route == 'current':
         logging.info("PRO: Current topic detected - using Serper web search")
         web_search_response = await handle_web_search_question(question)
         return await clean_web_search_with_anythingllm(web_search_response, question)
     
     # Step 3: Check if question requires formulas/RAG knowledge - use AnythingLLM
-    if is_formula_based_question(question):
+    if route == 'formula':
         logging.info("PRO: Formula/RAG question detected - using AnythingLLM bilgin workspace")
+        hedging = ROUTE_HEDGING_POLICIES.get(route, {})
+        if hedging.get("mode") == "race":
+            # Start Novita speculatively so a RAG miss doesn't cost both latencies
+            return await race_with_fallback(
+                get_anythingllm_response(question, conversation_mode),
+                process_with_novita_deepseek(question, conversation_mode, file_content, file_name),
+                can_anythingllm_answer,
+                hedging.get("grace_seconds", 0.0),
+                route
+            )
         try:
             anythingllm_response = await get_anythingllm_response(question, conversation_mode)
             if can_anythingllm_answer(anythingllm_response):
@@ -1028,6 +1765,80 @@ async def simple_pro_system(question: str, conversation_mode: str = 'normal', fi
         logging.info("PRO: General question - using Novita DeepSeek v3.1")
         return await process_with_novita_deepseek(question, conversation_mode, file_content, file_name)
 
+async def generate_ai_answer(question: str, version: str = 'pro', conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
+    """Route a question to the FREE or PRO pipeline, coalescing identical in-flight questions"""
+    if version == "free":
+        logging.info("FREE version selected - using Ollama AnythingLLM")
+        route = 'ollama_free'
+        call_factory = lambda: process_with_ollama_free(question, conversation_mode, file_content, file_name)
+    else:
+        # PRO version - use simple system: Current topics → Web Search, Formulas → AnythingLLM, Others → Novita
+        logging.info("PRO version selected - using simple system")
+        route = resolve_pro_route(question, conversation_mode)
+        call_factory = lambda: simple_pro_system(question, conversation_mode, file_content, file_name)
+    
+    # Answers grounded in a specific uploaded file are never shared between requests
+    if file_content:
+        return await call_factory()
+    
+    cache_key = build_answer_cache_key(question, version, conversation_mode, route)
+    cache_ttl = get_answer_cache_ttl(question)
+    if cache_ttl:
+        cached_answer = await answer_cache.get(cache_key)
+        if cached_answer is not None:
+            logging.info(f"Answer cache hit for: {question}")
+            return cached_answer
+    
+    async def call_and_cache():
+        answer = await call_factory()
+        if cache_ttl and is_cacheable_answer(answer):
+            await answer_cache.set(cache_key, answer, cache_ttl)
+        return answer
+    
+    if not SINGLE_FLIGHT_ENABLED:
+        return await call_and_cache()
+    
+    key = build_flight_key(question, version, conversation_mode, route)
+    return await single_flight.do(key, call_and_cache)
+
+async def stream_ai_answer_events(question: str, version: str = 'pro', conversation_mode: str = 'normal', file_content: str = None, file_name: str = None):
+    """Stream answer events for a question, replaying cached answers and fanning out identical in-flight streams"""
+    if version == "pro":
+        # For PRO version, use Novita streaming
+        route = 'novita_stream'
+        source_factory = lambda: stream_novita_events(question, conversation_mode, file_content, file_name)
+    else:
+        # For FREE version, stream directly from Ollama AnythingLLM
+        route = 'ollama_stream'
+        source_factory = lambda: stream_ollama_events(question, conversation_mode, file_content, file_name)
+    
+    cache_key = build_answer_cache_key(question, version, conversation_mode, route)
+    cache_ttl = get_answer_cache_ttl(question, file_content)
+    if cache_ttl:
+        cached_answer = await answer_cache.get(cache_key)
+        if cached_answer is not None:
+            logging.info(f"Answer cache hit (stream) for: {question}")
+            yield ('chunk', cached_answer)
+            yield ('complete', cached_answer)
+            return
+    
+    if cache_ttl:
+        # Cache once in the shared upstream stream rather than once per subscriber
+        provider_factory = source_factory
+        source_factory = lambda: cache_stream_events(provider_factory(), cache_key, cache_ttl)
+    
+    if file_content or not SINGLE_FLIGHT_ENABLED:
+        events = source_factory()
+    else:
+        key = build_flight_key(question, version, conversation_mode, route)
+        events = single_flight.stream(key, source_factory)
+    
+    try:
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+
 def optimize_search_query(question: str) -> str:
     """Optimize question for better web search results"""
     
@@ -1087,50 +1898,1156 @@ def format_web_search_response(question: str, search_results: List[dict]) -> str
     
     return response
 
+class ExtractionFailedError(Exception):
+    """An extraction job timed out or lost its worker - the message is the Turkish error shown to the user"""
+
+extraction_executor = None
+killed_extraction_executors = weakref.WeakSet()  # Pools whose workers were killed over a hard timeout
+extraction_worker_pids = weakref.WeakKeyDictionary()  # Pool -> queue its workers report their PID on at startup
+# Jobs wait for a free worker here rather than in the executor queue, so the hard timeout only counts running time
+extraction_slots = asyncio.Semaphore(max(1, EXTRACTION_POOL_WORKERS))
+extraction_stats = {
+    "jobs": 0, "hard_timeouts": 0, "crashes": 0, "pool_restarts": 0, "retries": 0, "cache_hits": 0, "cache_misses": 0,
+    "pdf_shards": 0, "partial_reads": 0, "shared_hits": 0
+}
+
+def get_extraction_executor() -> concurrent.futures.ProcessPoolExecutor:
+    """Get the shared extraction process pool, creating it on first use"""
+    global extraction_executor
+    if extraction_executor is None:
+        mp_context = multiprocessing.get_context(EXTRACTION_MP_CONTEXT)
+        worker_pids = mp_context.SimpleQueue()
+        extraction_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=EXTRACTION_POOL_WORKERS,
+            mp_context=mp_context,
+            initializer=_init_extraction_worker,
+            initargs=(EXTRACTION_MEMORY_LIMIT_MB, worker_pids)
+        )
+        extraction_worker_pids[extraction_executor] = worker_pids
+    return extraction_executor
+
+def init_extraction_executor():
+    """Start the extraction workers ahead of the first upload"""
+    if EXTRACTION_POOL_WORKERS <= 0:
+        return
+    executor = get_extraction_executor()
+    for _ in range(EXTRACTION_POOL_WORKERS):
+        executor.submit(os.getpid)
+    logging.info(f"Extraction pool started: {EXTRACTION_POOL_WORKERS} workers ({EXTRACTION_MP_CONTEXT}), timeout {EXTRACTION_TIMEOUT_SECONDS:.0f}s, memory limit {EXTRACTION_MEMORY_LIMIT_MB}MB")
+
+def shutdown_extraction_executor(executor: concurrent.futures.ProcessPoolExecutor = None, kill_workers: bool = False):
+    """Shut down the extraction pool (only if it is still the given executor), optionally killing busy workers"""
+    global extraction_executor
+    if executor is None:
+        executor = extraction_executor
+    if executor is None or executor is not extraction_executor:
+        return
+    extraction_executor = None
+    if kill_workers:
+        # A worker stuck in C code ignores SIGALRM - terminate it so the pool slot isn't lost
+        worker_pids = extraction_worker_pids.pop(executor, None)
+        while worker_pids is not None and not worker_pids.empty():
+            try:
+                os.kill(worker_pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        extraction_stats["pool_restarts"] += 1
+    # After a kill the jobs still in the pool fail with BrokenProcessPool (and are retried) rather than being cancelled
+    executor.shutdown(wait=False, cancel_futures=not kill_workers)
+
+async def run_extraction_job(job, *args):
+    """Run a blocking extraction function in the extraction pool, raising ExtractionFailedError on timeouts and crashes"""
+    async with extraction_slots:
+        retried = False
+        while True:
+            executor = None
+            started = time.monotonic()
+            try:
+                if EXTRACTION_POOL_WORKERS <= 0:
+                    call = asyncio.to_thread(job, *args)
+                else:
+                    executor = get_extraction_executor()
+                    call = asyncio.get_running_loop().run_in_executor(
+                        executor, _run_extraction_job, EXTRACTION_TIMEOUT_SECONDS, job, *args
+                    )
+                # Workers enforce the timeout themselves, the grace period only catches jobs stuck in C code
+                hard_timeout = EXTRACTION_TIMEOUT_SECONDS + EXTRACTION_TIMEOUT_GRACE_SECONDS if EXTRACTION_TIMEOUT_SECONDS > 0 else None
+                return await asyncio.wait_for(call, timeout=hard_timeout)
+            except ExtractionTimeoutError:
+                logging.error(f"Extraction job {job.__name__} timed out after {time.monotonic() - started:.1f}s: {args[0]}")
+                raise ExtractionFailedError("Dosya okuma hatası: dosya işlenirken zaman aşımı oluştu.")
+            except asyncio.TimeoutError:
+                extraction_stats["hard_timeouts"] += 1
+                logging.error(f"Extraction job {job.__name__} timed out after {time.monotonic() - started:.1f}s: {args[0]}")
+                if executor is not None:
+                    killed_extraction_executors.add(executor)
+                    shutdown_extraction_executor(executor, kill_workers=True)
+                raise ExtractionFailedError("Dosya okuma hatası: dosya işlenirken zaman aşımı oluştu.")
+            except concurrent.futures.process.BrokenProcessPool as e:
+                # A process pool can't lose one worker without breaking, so killing a stuck job's worker also fails the
+                # jobs running next to it - those get one more try on the new pool
+                if executor in killed_extraction_executors and not retried:
+                    retried = True
+                    extraction_stats["retries"] += 1
+                    logging.warning(f"Retrying extraction job {job.__name__} after the pool was restarted for another job: {args[0]}")
+                    continue
+                extraction_stats["crashes"] += 1
+                logging.error(f"Extraction worker died (memory limit?): {e}")
+                shutdown_extraction_executor(executor, kill_workers=True)
+                raise ExtractionFailedError("Dosya okuma hatası: dosya işlenemedi.")
+
+def plan_pdf_shards(start: int, page_count: int) -> List[tuple]:
+    """Split pages [start, page_count) into (start, end) shards - every shard re-reads the PDF's page tree, so keep them few"""
+    workers = max(1, EXTRACTION_POOL_WORKERS)
+    shard_count = 1 if workers == 1 else 2 * workers
+    size = max(PDF_PAGES_PER_SHARD, -(-(page_count - start) // shard_count))
+    return [(shard_start, min(shard_start + size, page_count)) for shard_start in range(start, page_count, size)]
+
+async def iter_pdf_page_shards(file_path: str, progress=None):
+    """Extract a PDF in page shards spread over the extraction pool, yielding each shard's page texts in page order"""
+    # The first job also counts the pages, so short PDFs take a single job
+    page_count, head_pages = await run_extraction_job(_extract_pdf_head_sync, file_path, PDF_EARLY_PAGES or PDF_PAGES_PER_SHARD)
+    if progress is not None:
+        progress.page_count = page_count
+    yield head_pages
+    
+    # The remaining shards are queued at once and start in page order
+    shards = [
+        asyncio.ensure_future(run_extraction_job(_extract_pdf_pages_sync, file_path, start, end))
+        for start, end in plan_pdf_shards(len(head_pages), page_count)
+    ]
+    extraction_stats["pdf_shards"] += len(shards) + 1
+    try:
+        for shard in shards:
+            yield await shard
+    finally:
+        for shard in shards:
+            shard.cancel()
+        # Retrieve the outcome of shards that failed after an earlier one, so asyncio doesn't log them
+        await asyncio.gather(*shards, return_exceptions=True)
+
+async def extract_pdf_text(file_path: str, progress=None) -> str:
+    """Page-parallel PDF extraction - progress.pages fills in page order and progress.early_ready is set after PDF_EARLY_PAGES pages"""
+    pages = progress.pages if progress is not None else []
+    try:
+        async for shard_pages in iter_pdf_page_shards(file_path, progress):
+            pages.extend(shard_pages)
+            if progress is not None and len(pages) >= PDF_EARLY_PAGES:
+                progress.early_ready.set()
+    except ExtractionFailedError as e:
+        return str(e)
+    except MemoryError:
+        logging.error(f"PDF extraction hit the memory limit: {file_path}")
+        return "Dosya okuma hatası: dosya işlenemeyecek kadar büyük."
+    except Exception as e:
+        logging.error(f"PDF extraction error: {e}")
+        return f"Dosya okuma hatası: {str(e)}"
+    # Joined once at the end - no per-page string concatenation
+    return "\n".join(pages).strip()
+
 async def extract_text_from_file(file_path: str, file_type: str) -> str:
-    """Extract text from various file types"""
+    """Extract text from various file types without blocking the event loop"""
+    if file_type in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
+        # For images, we don't extract text here - we'll use Vision API
+        return f"[GÖRSEL DOSYASI: {file_path}]"
+    
+    extraction_stats["jobs"] += 1
+    started = time.monotonic()
+    if file_type == 'pdf':
+        text = await extract_pdf_text(file_path)
+    else:
+        try:
+            text = await run_extraction_job(_extract_text_sync, file_path, file_type)
+        except ExtractionFailedError as e:
+            return str(e)
+    
+    logging.info(f"Extracted {file_type} file in {time.monotonic() - started:.2f}s: {file_path}")
+    return text
+
+def is_extraction_error(text: str) -> bool:
+    """Extraction failures come back as Turkish error strings - never cache those"""
+    return not text or text.startswith("Dosya okuma hatası") or text == "Desteklenmeyen dosya türü."
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file's content, read in 1MB blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def blob_path(content_hash: str) -> Path:
+    return BLOB_DIR / content_hash[:2] / content_hash
+
+def is_blob_path(file_path: str) -> bool:
+    return Path(file_path).parent.parent == BLOB_DIR
+
+class UploadRejectedError(Exception):
+    """An upload failed validation while it was being stored - carries the HTTP status to answer with"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+def matches_file_signature(head: bytes, file_type: str) -> bool:
+    """Check an upload's first bytes against the type its extension claims"""
+    if file_type in ['txt', 'csv']:
+        return b"\x00" not in head
+    if file_type == 'pdf':
+        # The spec lets %PDF- appear anywhere in the first 1024 bytes
+        return b"%PDF-" in head[:1024]
+    if file_type == 'webp':
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    return head.startswith(FILE_SIGNATURES.get(file_type, ()))
+
+def _write_upload_chunks(target, digest, chunks: list):
+    for chunk in chunks:
+        digest.update(chunk)
+        target.write(chunk)
+
+def _discard_upload_tmp(target, tmp_path: Path):
+    target.close()
+    tmp_path.unlink(missing_ok=True)
+
+def _reject_file_signature(head: bytes, file_type: str):
+    if not matches_file_signature(head, file_type):
+        upload_stats["rejected_type"] += 1
+        raise UploadRejectedError(400, f"File content does not match the .{file_type} file type")
+
+upload_stats = {"uploads": 0, "sessions": 0, "parts": 0, "sessions_expired": 0, "bytes": 0, "write_seconds": 0.0, "loop_seconds": 0.0, "max_loop_block_ms": 0.0, "rejected_size": 0, "rejected_type": 0}
+
+async def write_chunks_to_file(chunks, target_path: Path, max_size: int, file_type: Optional[str] = None) -> tuple:
+    """Write an async stream of byte chunks to target_path, hashing in the same pass - the size limit and (given a
+    file_type) the file signature are enforced as the bytes arrive. Returns (sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    pending = []
+    pending_size = 0
+    loop_seconds = 0.0
+    max_loop_block = 0.0
+    started = time.perf_counter()
+    target = await asyncio.to_thread(open, target_path, "wb")
     try:
-        if file_type == 'pdf':
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
-        
-        elif file_type in ['xlsx', 'xls']:
-            workbook = openpyxl.load_workbook(file_path)
-            text = ""
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"\n--- {sheet_name} ---\n"
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
-                    if row_text.strip():
-                        text += row_text + "\n"
-            return text.strip()
-        
-        elif file_type == 'docx':
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
-        
-        elif file_type == 'txt':
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
-        
-        elif file_type in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
-            # For images, we don't extract text here - we'll use Vision API
-            return f"[GÖRSEL DOSYASI: {file_path}]"
-        
+        async for chunk in chunks:
+            # Only this part runs on the event loop - hashing and disk writes happen in a worker thread,
+            # batched to UPLOAD_CHUNK_SIZE so small network reads don't each cost a thread hop
+            resumed = time.perf_counter()
+            size += len(chunk)
+            if size > max_size:
+                upload_stats["rejected_size"] += 1
+                raise UploadRejectedError(413, f"File too large. Maximum size is {max_size / (1024*1024):.1f}MB")
+            if file_type is not None and len(head) < FILE_SIGNATURE_BYTES:
+                head += chunk[:FILE_SIGNATURE_BYTES - len(head)]
+                if len(head) == FILE_SIGNATURE_BYTES:
+                    _reject_file_signature(head, file_type)
+            pending.append(chunk)
+            pending_size += len(chunk)
+            blocked = time.perf_counter() - resumed
+            loop_seconds += blocked
+            max_loop_block = max(max_loop_block, blocked)
+            if pending_size >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(_write_upload_chunks, target, digest, pending)
+                pending = []
+                pending_size = 0
+        if file_type is not None and len(head) < FILE_SIGNATURE_BYTES:
+            # Same answer as the resumable path - an empty file would otherwise fail the signature check
+            if size == 0:
+                raise UploadRejectedError(400, "File is empty")
+            _reject_file_signature(head, file_type)
+        await asyncio.to_thread(_write_upload_chunks, target, digest, pending)
+        await asyncio.to_thread(target.close)
+    except BaseException:
+        await asyncio.to_thread(_discard_upload_tmp, target, target_path)
+        raise
+    
+    upload_stats["bytes"] += size
+    upload_stats["write_seconds"] += time.perf_counter() - started
+    upload_stats["loop_seconds"] += loop_seconds
+    upload_stats["max_loop_block_ms"] = max(upload_stats["max_loop_block_ms"], max_loop_block * 1000)
+    return digest.hexdigest(), size
+
+async def iter_upload_chunks(upload: UploadFile):
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+async def write_upload_to_tmp(source: UploadFile, file_type: str, max_size: int = MAX_FILE_SIZE) -> tuple:
+    """Copy an upload into the blob store's temp dir chunk by chunk - returns (tmp path, sha256, size)"""
+    tmp_path = BLOB_DIR / "tmp" / uuid.uuid4().hex
+    content_hash, size = await write_chunks_to_file(iter_upload_chunks(source), tmp_path, max_size, file_type)
+    upload_stats["uploads"] += 1
+    return tmp_path, content_hash, size
+
+def get_upload_stats() -> dict:
+    write_seconds = upload_stats["write_seconds"]
+    throughput = upload_stats["bytes"] / (1024 * 1024) / write_seconds if write_seconds else 0.0
+    return {**upload_stats, "throughput_mb_s": round(throughput, 1)}
+
+def _commit_blob(tmp_path: Path, content_hash: str) -> bool:
+    """Move a fully written upload into place - returns True if identical content was already stored"""
+    path = blob_path(content_hash)
+    if path.exists():
+        tmp_path.unlink()
+        return True
+    path.parent.mkdir(exist_ok=True)
+    os.replace(tmp_path, path)
+    return False
+
+blob_stats = {"stored": 0, "deduplicated": 0, "bytes_saved": 0, "released": 0, "gc_runs": 0, "gc_collected": 0, "gc_files_removed": 0}
+blob_gc_task = None
+
+async def commit_upload_blob(tmp_path: Path, content_hash: str, size: int) -> str:
+    """Move a fully written temp file into the blob store and take a reference on it - returns the blob path"""
+    referenced = False
+    try:
+        # Reference first, then put the file in place - the GC never removes a referenced blob's file
+        await db.blobs.update_one(
+            {"hash": content_hash},
+            {
+                "$inc": {"ref_count": 1},
+                "$set": {"unreferenced_since": None},
+                "$setOnInsert": {"size": size, "created_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+        referenced = True
+        deduplicated = await asyncio.to_thread(_commit_blob, tmp_path, content_hash)
+    except Exception:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        if referenced:
+            await release_blob(content_hash)
+        raise
+    
+    if deduplicated:
+        blob_stats["deduplicated"] += 1
+        blob_stats["bytes_saved"] += size
+    else:
+        blob_stats["stored"] += 1
+    return str(blob_path(content_hash))
+
+async def store_upload_blob(source: UploadFile, file_type: str) -> tuple:
+    """Store an upload by content and take a reference on it - returns (blob path, content hash, size)"""
+    tmp_path, content_hash, size = await write_upload_to_tmp(source, file_type)
+    return await commit_upload_blob(tmp_path, content_hash, size), content_hash, size
+
+async def release_blob(content_hash: str, count: int = 1):
+    """Drop references to a blob - it is collected once it has stayed unreferenced for BLOB_GC_GRACE_SECONDS"""
+    blob_stats["released"] += count
+    await db.blobs.update_one({"hash": content_hash}, {"$inc": {"ref_count": -count}})
+    await db.blobs.update_one(
+        {"hash": content_hash, "ref_count": {"$lte": 0}, "unreferenced_since": None},
+        {"$set": {"unreferenced_since": datetime.now(timezone.utc).isoformat()}}
+    )
+
+async def release_upload_storage(file_records: List[dict]):
+    """Give up the storage behind deleted file_uploads records"""
+    blob_references = Counter()
+    legacy_paths = []
+    for file_record in file_records:
+        if is_blob_path(file_record["file_path"]):
+            blob_references[file_record["content_hash"]] += 1
         else:
-            return "Desteklenmeyen dosya türü."
-            
+            # Legacy uuid-named upload with its own extraction cache file
+            legacy_paths += [path for path in (file_record["file_path"], file_record.get("extracted_text_path")) if path]
+    if legacy_paths:
+        await asyncio.to_thread(_remove_legacy_upload_files, legacy_paths)
+    for content_hash, count in blob_references.items():
+        await release_blob(content_hash, count)
+
+def _remove_legacy_upload_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _take_blob_for_deletion(content_hash: str) -> Optional[Path]:
+    """Move a blob aside before its record is deleted, so a concurrent re-upload puts a fresh copy in place"""
+    trash_path = BLOB_DIR / "tmp" / f"gc-{content_hash}-{uuid.uuid4().hex}"
+    try:
+        os.replace(blob_path(content_hash), trash_path)
+    except FileNotFoundError:
+        return None
+    return trash_path
+
+def _restore_blob(trash_path: Path, content_hash: str):
+    path = blob_path(content_hash)
+    path.parent.mkdir(exist_ok=True)
+    os.replace(trash_path, path)
+
+def _remove_blob_files(trash_path: Optional[Path], content_hash: str) -> int:
+    removed = 0
+    for path in ([trash_path] if trash_path else []) + list(EXTRACTION_CACHE_DIR.glob(f"{content_hash}-*")):
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _remove_stale_upload_files(referenced_paths: set) -> int:
+    """Delete abandoned temp files and legacy uploads no file_uploads record points to, once past the grace period"""
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    removed = 0
+    candidates = [path for path in (BLOB_DIR / "tmp").iterdir() if not path.name.startswith("gc-")]
+    candidates += [path for path in UPLOAD_DIR.iterdir() if path.is_file() and str(path) not in referenced_paths]
+    for path in candidates:
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+async def collect_unreferenced_blobs() -> int:
+    """Delete blobs (and their derived artifacts) that have been unreferenced for longer than BLOB_GC_GRACE_SECONDS"""
+    blob_stats["gc_runs"] += 1
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=BLOB_GC_GRACE_SECONDS)).isoformat()
+    collected = 0
+    removed_files = 0
+    async for blob in db.blobs.find({"ref_count": {"$lte": 0}, "unreferenced_since": {"$ne": None, "$lt": cutoff}}):
+        content_hash = blob["hash"]
+        trash_path = await asyncio.to_thread(_take_blob_for_deletion, content_hash)
+        # The ref_count guard makes this a no-op if the content was uploaded again in the meantime
+        result = await db.blobs.delete_one({"hash": content_hash, "ref_count": {"$lte": 0}})
+        if not result.deleted_count:
+            if trash_path is not None:
+                await asyncio.to_thread(_restore_blob, trash_path, content_hash)
+            continue
+        removed_files += await asyncio.to_thread(_remove_blob_files, trash_path, content_hash)
+        collected += 1
+    
+    legacy_paths = {record["file_path"] async for record in db.file_uploads.find({}, {"file_path": 1, "_id": 0})}
+    removed_files += await asyncio.to_thread(_remove_stale_upload_files, legacy_paths)
+    
+    blob_stats["gc_collected"] += collected
+    blob_stats["gc_files_removed"] += removed_files
+    if collected or removed_files:
+        logging.info(f"Blob GC: collected {collected} blobs, removed {removed_files} files")
+    return collected
+
+async def run_blob_gc():
+    """Background task - garbage-collect the upload store every BLOB_GC_INTERVAL_SECONDS"""
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            await collect_unreferenced_blobs()
+            await collect_expired_upload_sessions()
+        except Exception as e:
+            logging.error(f"Blob GC error: {e}")
+
+def upload_part_path(upload_id: str, part_number: int) -> Path:
+    return UPLOAD_PARTS_DIR / upload_id / str(part_number)
+
+def upload_parts_snapshot_dir(upload_id: str) -> Path:
+    """Where a completion moves the parts it assembles - parts still arriving can't replace them there"""
+    return UPLOAD_PARTS_DIR / f"{upload_id}.completing"
+
+def upload_part_size(session: dict, part_number: int) -> int:
+    if part_number < session["part_count"] - 1:
+        return session["part_size"]
+    return session["file_size"] - session["part_size"] * (session["part_count"] - 1)
+
+def _snapshot_upload_parts(upload_id: str) -> Path:
+    """Move the parts directory aside in one rename - a reclaimed completion finds it already there"""
+    snapshot_dir = upload_parts_snapshot_dir(upload_id)
+    if not snapshot_dir.exists():
+        os.rename(UPLOAD_PARTS_DIR / upload_id, snapshot_dir)
+    return snapshot_dir
+
+def _restore_upload_parts(upload_id: str):
+    """Put the parts back after a failed completion, so the client can resend some and retry"""
+    snapshot_dir = upload_parts_snapshot_dir(upload_id)
+    if snapshot_dir.exists():
+        os.rename(snapshot_dir, UPLOAD_PARTS_DIR / upload_id)
+
+def _assemble_upload_parts(upload_id: str, part_count: int) -> tuple:
+    """Concatenate a resumable upload's parts into a blob temp file, hashing in the same pass - returns (tmp path, sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = BLOB_DIR / "tmp" / uuid.uuid4().hex
+    try:
+        snapshot_dir = _snapshot_upload_parts(upload_id)
+        with open(tmp_path, "wb") as target:
+            for part_number in range(part_count):
+                with open(snapshot_dir / str(part_number), "rb") as part:
+                    for block in iter(lambda: part.read(UPLOAD_CHUNK_SIZE), b""):
+                        digest.update(block)
+                        target.write(block)
+                        size += len(block)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+def _remove_upload_parts(upload_id: str):
+    shutil.rmtree(UPLOAD_PARTS_DIR / upload_id, ignore_errors=True)
+    shutil.rmtree(upload_parts_snapshot_dir(upload_id), ignore_errors=True)
+
+def _remove_orphaned_part_dirs(session_ids: set) -> int:
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    removed = 0
+    for path in UPLOAD_PARTS_DIR.iterdir():
+        if path.name.split(".")[0] not in session_ids and path.stat().st_mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+def stale_completion_filter() -> dict:
+    """Matches a "completing" claim whose holder is presumed dead - older than UPLOAD_COMPLETION_TIMEOUT_SECONDS"""
+    stale_before = (datetime.now(timezone.utc) - timedelta(seconds=UPLOAD_COMPLETION_TIMEOUT_SECONDS)).isoformat()
+    return {"status": "completing", "completing_since": {"$not": {"$gte": stale_before}}}
+
+async def collect_expired_upload_sessions() -> int:
+    """Delete resumable upload sessions past their expiry, with their parts - including ones whose completion crashed"""
+    now = datetime.now(timezone.utc).isoformat()
+    expired = 0
+    async for session in db.upload_sessions.find({"expires_at": {"$lt": now}}, {"id": 1, "_id": 0}):
+        result = await db.upload_sessions.delete_one({
+            "id": session["id"], "expires_at": {"$lt": now},
+            "$or": [{"status": {"$ne": "completing"}}, stale_completion_filter()]
+        })
+        if result.deleted_count:
+            await asyncio.to_thread(_remove_upload_parts, session["id"])
+            expired += 1
+    
+    # Part directories left behind by sessions that are gone (e.g. their conversation was deleted)
+    session_ids = {session["id"] async for session in db.upload_sessions.find({}, {"id": 1, "_id": 0})}
+    orphaned = await asyncio.to_thread(_remove_orphaned_part_dirs, session_ids)
+    
+    upload_stats["sessions_expired"] += expired + orphaned
+    if expired or orphaned:
+        logging.info(f"Upload GC: removed {expired} expired sessions, {orphaned} orphaned part directories")
+    return expired
+
+async def init_blob_store():
+    """Start the upload store's garbage collector"""
+    global blob_gc_task
+    blob_gc_task = asyncio.create_task(run_blob_gc())
+
+def _write_extraction_cache(cache_path: Path, text: str):
+    # Unique temp name - identical uploads may be extracted concurrently
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(zlib.compress(text.encode("utf-8"), 6))
+    os.replace(tmp_path, cache_path)
+
+def _read_extraction_cache(cache_path: str) -> Optional[str]:
+    try:
+        return zlib.decompress(Path(cache_path).read_bytes()).decode("utf-8")
+    except (OSError, zlib.error, UnicodeDecodeError):
+        return None
+
+def derived_artifact_path(content_hash: str, kind: str) -> Path:
+    """Cache location for something derived from an upload's content (extracted text, ...) - shared by identical uploads"""
+    return EXTRACTION_CACHE_DIR / f"{content_hash}-{kind}"
+
+def extraction_cache_path(content_hash: str, file_type: str) -> Path:
+    # Keyed by type too - the same bytes uploaded as .txt and .csv extract differently
+    return derived_artifact_path(content_hash, f"{file_type}.txt.z")
+
+async def read_shared_extraction(content_hash: str, file_type: str) -> Optional[tuple]:
+    """Text already extracted from identical content - returns (text, record fields) or None"""
+    cache_path = extraction_cache_path(content_hash, file_type)
+    text = await asyncio.to_thread(_read_extraction_cache, str(cache_path))
+    if text is None:
+        return None
+    extraction_stats["shared_hits"] += 1
+    return text, {"content_hash": content_hash, "extracted_text_path": str(cache_path), "extracted_chars": len(text)}
+
+async def cache_extracted_text(file_type: str, content_hash: str, text: str) -> dict:
+    """Persist extracted text - returns the fields for the file_uploads record"""
+    fields = {"content_hash": content_hash}
+    if file_type not in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'] and not is_extraction_error(text):
+        cache_path = extraction_cache_path(content_hash, file_type)
+        await asyncio.to_thread(_write_extraction_cache, cache_path, text)
+        fields["extracted_text_path"] = str(cache_path)
+        fields["extracted_chars"] = len(text)
+    return fields
+
+async def extract_and_cache_file_text(file_path: str, file_type: str, content_hash: str = None) -> tuple:
+    """Extract a file once per distinct content and persist the text - returns (text, fields for the file_uploads record)"""
+    if content_hash is None:
+        content_hash = await asyncio.to_thread(hash_file, file_path)
+    
+    if file_type not in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
+        shared = await read_shared_extraction(content_hash, file_type)
+        if shared is not None:
+            return shared
+    
+    async def extract_and_cache():
+        text = await extract_text_from_file(file_path, file_type)
+        return text, await cache_extracted_text(file_type, content_hash, text)
+    
+    # Identical files uploaded at the same time are extracted once
+    return await single_flight.do(("extract_content", content_hash, file_type), extract_and_cache)
+
+pdf_uploads_in_progress = {}  # file_id -> PdfUploadExtraction still extracting its remaining pages
+
+class PdfUploadExtraction:
+    """Extraction of an uploaded PDF whose first pages are usable before the rest of the document is done"""
+    
+    def __init__(self, file_id: str, file_name: str, file_path: str, content_hash: str):
+        self.file_id = file_id
+        self.file_name = file_name
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.pages = []
+        self.page_count = None
+        self.early_ready = asyncio.Event()
+        self.finisher = None
+        self.task = asyncio.create_task(self._extract())
+        pdf_uploads_in_progress[file_id] = self
+    
+    async def _extract(self) -> tuple:
+        try:
+            extraction_stats["jobs"] += 1
+            text = await extract_pdf_text(self.file_path, self)
+            return text, await cache_extracted_text('pdf', self.content_hash, text)
+        finally:
+            self.early_ready.set()
+    
+    def progress_note(self) -> str:
+        return f"[Not: {self.file_name} belgesinin ilk {len(self.pages)}/{self.page_count} sayfası işlendi, kalan sayfalar hâlâ işleniyor.]"
+    
+    def partial_text(self) -> str:
+        return "\n".join(self.pages).strip() + "\n\n" + self.progress_note()
+    
+    async def finish(self, conversation_id: str, file_record: dict):
+        """Wait for the remaining pages, then point the file_uploads record at the full text and re-index it"""
+        try:
+            text, fields = await self.task
+            if "extracted_text_path" in fields:
+                result = await db.file_uploads.update_one({"id": self.file_id}, {"$set": fields})
+                # Skip re-indexing if the file or its conversation was deleted in the meantime
+                if result.matched_count:
+                    await add_file_to_conversation_index(conversation_id, {**file_record, **fields}, text)
+            logging.info(f"Background PDF extraction finished: {self.file_name} ({self.page_count} pages)")
+        except Exception as e:
+            logging.error(f"Background PDF extraction failed for {self.file_name}: {e}")
+        finally:
+            pdf_uploads_in_progress.pop(self.file_id, None)
+    
+    def cancel(self):
+        self.task.cancel()
+        pdf_uploads_in_progress.pop(self.file_id, None)
+
+async def start_upload_extraction(file_id: str, file_name: str, file_path: str, file_type: str, content_hash: str) -> tuple:
+    """Extract an upload - PDFs return after their first PDF_EARLY_PAGES pages, as (text, fields, PdfUploadExtraction still running or None)"""
+    if file_type in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
+        # Questions about the image send the reduced copy prepared here
+        await prepare_vision_image(file_path, content_hash)
+    if file_type != 'pdf' or PDF_EARLY_PAGES <= 0:
+        text, fields = await extract_and_cache_file_text(file_path, file_type, content_hash)
+        return text, fields, None
+    
+    shared = await read_shared_extraction(content_hash, file_type)
+    if shared is not None:
+        return *shared, None
+    extraction = PdfUploadExtraction(file_id, file_name, file_path, content_hash)
+    await extraction.early_ready.wait()
+    if extraction.task.done():
+        # Short PDFs finish before reaching PDF_EARLY_PAGES
+        pdf_uploads_in_progress.pop(file_id, None)
+        text, fields = extraction.task.result()
+        return text, fields, None
+    return extraction.partial_text(), {"content_hash": content_hash}, extraction
+
+async def get_file_text(file_record: dict) -> str:
+    """Get an uploaded file's text from the extraction cache, filling it lazily (legacy uploads, lost cache files)"""
+    in_progress = pdf_uploads_in_progress.get(file_record["id"])
+    if in_progress is not None:
+        if in_progress.task.done() and not in_progress.task.cancelled() and in_progress.task.exception() is None:
+            return in_progress.task.result()[0]
+        # Answer from the pages extracted so far instead of waiting for the whole PDF
+        extraction_stats["partial_reads"] += 1
+        return in_progress.partial_text()
+    
+    cache_path = file_record.get("extracted_text_path")
+    if not cache_path:
+        # The record may predate a lazy fill or a finished background PDF extraction
+        fresh_record = await db.file_uploads.find_one({"id": file_record["id"]})
+        cache_path = (fresh_record or {}).get("extracted_text_path")
+    if cache_path:
+        text = await asyncio.to_thread(_read_extraction_cache, cache_path)
+        if text is not None:
+            extraction_stats["cache_hits"] += 1
+            return text
+    
+    extraction_stats["cache_misses"] += 1
+    logging.info(f"Extraction cache miss, extracting {file_record['file_name']}")
+    
+    async def extract_and_store():
+        text, fields = await extract_and_cache_file_text(
+            file_record["file_path"], file_record["file_type"], file_record.get("content_hash")
+        )
+        if "extracted_text_path" in fields:
+            await db.file_uploads.update_one({"id": file_record["id"]}, {"$set": fields})
+        return text
+    
+    # Concurrent messages about the same legacy upload share one extraction
+    return await single_flight.do(("extract", file_record["id"]), extract_and_store)
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def chunk_text(text: str, chunk_tokens: int = FILE_CHUNK_TOKENS, overlap_tokens: int = FILE_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split text into ~chunk_tokens chunks on line boundaries, repeating ~overlap_tokens of the previous chunk"""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    
+    # Lines are the natural unit (spreadsheet rows, paragraphs) - hard-split the rare very long one
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        for start in range(0, len(line), max_chars):
+            pieces.append(line[start:start + max_chars])
+    
+    chunks = []
+    current = []
+    current_chars = 0
+    for piece in pieces:
+        if current and current_chars + len(piece) > max_chars:
+            chunks.append("\n".join(current))
+            overlap = []
+            overlap_length = 0
+            for previous in reversed(current):
+                if overlap_length + len(previous) + 1 > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_length += len(previous) + 1
+            current, current_chars = overlap, overlap_length
+        current.append(piece)
+        current_chars += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+class FileChunkIndex:
+    """One uploaded file's chunks and their hashed term counts - IDF weighting happens per conversation"""
+    
+    def __init__(self, text: str):
+        # Spreadsheet summaries (column statistics, sampled rows) come before the rows and are always sent
+        summary, heading, rows = text.partition(f"\n{SPREADSHEET_ROWS_HEADING}\n")
+        if heading:
+            self.chunks = chunk_text(summary)
+            self.pinned_chunks = len(self.chunks)
+            self.chunks += chunk_text(heading + rows)
+        else:
+            self.chunks = chunk_text(text)
+            self.pinned_chunks = 0
+        self.chunk_tokens = [estimate_tokens(chunk) for chunk in self.chunks]
+        self.text_tokens = estimate_tokens(text)
+        # Hashing needs no fitted vocabulary, so files can be added to a conversation without re-tokenizing the others
+        self.term_counts = retrieval_vectorizer.transform(self.chunks)
+
+class ConversationIndex:
+    """TF-IDF retrieval across every uploaded document in a conversation"""
+    
+    def __init__(self):
+        self.files = OrderedDict()  # file_id -> (file_record, FileChunkIndex), in upload order
+        self._weighted = None  # (tfidf matrix, transformer, [(file_id, chunk_id)], pinned rows) - rebuilt after files change
+        self._generation = 0  # bumped whenever files change, so a fit finished in a thread isn't cached for stale files
+    
+    @property
+    def chunk_count(self) -> int:
+        return sum(len(file_index.chunks) for _, file_index in self.files.values())
+    
+    def add_file(self, file_record: dict, file_index: FileChunkIndex):
+        self.files[file_record["id"]] = (file_record, file_index)
+        self._weighted = None
+        self._generation += 1
+    
+    def remove_file(self, file_id: str):
+        if self.files.pop(file_id, None) is not None:
+            self._weighted = None
+            self._generation += 1
+    
+    @staticmethod
+    def _fit_weighted(files: OrderedDict) -> tuple:
+        chunk_refs = [
+            (file_id, chunk_id)
+            for file_id, (_, file_index) in files.items()
+            for chunk_id in range(len(file_index.chunks))
+        ]
+        term_counts = sparse_vstack([file_index.term_counts for _, file_index in files.values()]).tocsr()
+        pinned_rows = [row for row, (file_id, chunk_id) in enumerate(chunk_refs) if chunk_id < files[file_id][1].pinned_chunks]
+        transformer = TfidfTransformer(sublinear_tf=True)
+        return transformer.fit_transform(term_counts), transformer, chunk_refs, pinned_rows
+    
+    def _get_weighted(self):
+        if self._weighted is None:
+            self._weighted = self._fit_weighted(self.files)
+        return self._weighted
+    
+    @staticmethod
+    def _rank(files: OrderedDict, weighted: tuple, question: str, token_budget: int, top_k: int) -> List[tuple]:
+        matrix, transformer, chunk_refs, pinned_rows = weighted
+        scores = cosine_similarity(matrix, transformer.transform(retrieval_vectorizer.transform([question]))).ravel()
+        ranked = [row for row in scores.argsort()[::-1][:top_k] if scores[row] > 0]
+        
+        if not ranked:
+            # No lexical match (e.g. "özetle") - spread the budget evenly across the documents
+            step = max(1, len(chunk_refs) // max(1, top_k))
+            ranked = list(range(0, len(chunk_refs), step))[:top_k]
+        pinned = set(pinned_rows)
+        ranked = pinned_rows + [row for row in ranked if row not in pinned]
+        
+        selected = []
+        used_tokens = 0
+        for row in ranked:
+            file_id, chunk_id = chunk_refs[row]
+            chunk_tokens = files[file_id][1].chunk_tokens[chunk_id]
+            # Pinned summaries get at most half the budget, the rest is for chunks matching the question
+            limit = token_budget // 2 if row in pinned else token_budget
+            if used_tokens + chunk_tokens <= limit:
+                selected.append(int(row))
+                used_tokens += chunk_tokens
+        return [chunk_refs[row] for row in sorted(selected)]
+    
+    def select(self, question: str, token_budget: int, top_k: int) -> List[tuple]:
+        """Best-matching (file_id, chunk_id) pairs across all files that fit in token_budget, in document order"""
+        if not self.chunk_count:
+            return []
+        return self._rank(self.files, self._get_weighted(), question, token_budget, top_k)
+    
+    async def select_off_loop(self, question: str, token_budget: int, top_k: int) -> List[tuple]:
+        """select() with the TF-IDF fit and scoring in a worker thread, on a snapshot of the files so uploads and
+        deletes can land meanwhile"""
+        if not self.chunk_count:
+            return []
+        files, generation, weighted = OrderedDict(self.files), self._generation, self._weighted
+        if weighted is None:
+            weighted = await asyncio.to_thread(self._fit_weighted, files)
+            if generation == self._generation:
+                self._weighted = weighted
+        chunk_refs = await asyncio.to_thread(self._rank, files, weighted, question, token_budget, top_k)
+        # Drop chunks of files deleted (or re-indexed) while ranking - render() reads the current files
+        return [
+            (file_id, chunk_id) for file_id, chunk_id in chunk_refs
+            if file_id in self.files and self.files[file_id][1] is files[file_id][1]
+        ]
+    
+    def render(self, chunk_refs: List[tuple]) -> str:
+        """Join selected chunks, labelled with their file name when the conversation has several files"""
+        parts = []
+        current_file_id = None
+        for file_id, chunk_id in chunk_refs:
+            file_record, file_index = self.files[file_id]
+            chunk = file_index.chunks[chunk_id]
+            if len(self.files) > 1 and file_id != current_file_id:
+                chunk = f"--- {file_record['file_name']} ---\n{chunk}"
+            current_file_id = file_id
+            parts.append(chunk)
+        return "\n\n[...]\n\n".join(parts)
+
+retrieval_vectorizer = HashingVectorizer(preprocessor=turkish_lower, n_features=2 ** 18, alternate_sign=False, norm=None)
+conversation_indexes = OrderedDict()  # conversation_id -> ConversationIndex, least recently used first
+retrieval_stats = {"index_loads": 0, "hits": 0, "files_added": 0, "evictions": 0}
+
+def is_document_upload(file_record: dict) -> bool:
+    return file_record["file_type"] not in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
+
+async def build_file_chunk_index(file_record: dict, text: str = None) -> tuple:
+    """Chunk and hash one upload off the event loop - returns (FileChunkIndex or None on extraction errors, text)"""
+    if text is None:
+        text = await get_file_text(file_record)
+    if is_extraction_error(text):
+        return None, text
+    return await asyncio.to_thread(FileChunkIndex, text), text
+
+def evict_conversation_indexes():
+    """Keep the in-memory indexes under CONVERSATION_INDEX_MAX_CHUNKS, dropping least recently used conversations"""
+    while len(conversation_indexes) > 1 and sum(index.chunk_count for index in conversation_indexes.values()) > CONVERSATION_INDEX_MAX_CHUNKS:
+        conversation_indexes.popitem(last=False)
+        retrieval_stats["evictions"] += 1
+
+async def get_conversation_index(conversation_id: str) -> ConversationIndex:
+    """Get a conversation's document index, loading it lazily from its uploads on first use"""
+    index = conversation_indexes.get(conversation_id)
+    if index is not None:
+        conversation_indexes.move_to_end(conversation_id)
+        retrieval_stats["hits"] += 1
+        return index
+    
+    async def load_index():
+        retrieval_stats["index_loads"] += 1
+        index = ConversationIndex()
+        async for file_record in db.file_uploads.find({"conversation_id": conversation_id}).sort("uploaded_at", 1):
+            if index.chunk_count >= CONVERSATION_INDEX_MAX_CHUNKS:
+                # Later uploads are still indexed on demand when a question is about them
+                logging.warning(f"Conversation index for {conversation_id} hit CONVERSATION_INDEX_MAX_CHUNKS - skipping its remaining uploads")
+                break
+            if is_document_upload(file_record) and os.path.exists(file_record["file_path"]):
+                file_index, _ = await build_file_chunk_index(file_record)
+                if file_index is not None:
+                    index.add_file(file_record, file_index)
+        return index
+    
+    index = await single_flight.do(("conversation_index", conversation_id), load_index)
+    conversation_indexes[conversation_id] = index
+    evict_conversation_indexes()
+    return index
+
+async def add_file_to_conversation_index(conversation_id: str, file_record: dict, text: str = None):
+    """Index a new upload incrementally - conversations whose index isn't loaded pick it up when they load"""
+    index = conversation_indexes.get(conversation_id)
+    if index is None or not is_document_upload(file_record):
+        return
+    file_index, _ = await build_file_chunk_index(file_record, text)
+    if file_index is not None:
+        index.add_file(file_record, file_index)
+        retrieval_stats["files_added"] += 1
+        evict_conversation_indexes()
+
+def drop_from_conversation_index(conversation_id: str, file_id: str = None):
+    """Forget a deleted file, or the whole conversation's index when file_id is None"""
+    if file_id is None:
+        conversation_indexes.pop(conversation_id, None)
+        return
+    index = conversation_indexes.get(conversation_id)
+    if index is not None:
+        index.remove_file(file_id)
+
+async def get_conversation_file_context(conversation_id: str, recent_file: dict, question: str) -> tuple:
+    """Best passages for question across all documents in the conversation - returns (file_content, file_name)"""
+    index = await get_conversation_index(conversation_id)
+    if recent_file["id"] not in index.files:
+        # Uploaded while the index was loading, or extraction failed (pass the error text on as before)
+        file_index, text = await build_file_chunk_index(recent_file)
+        if file_index is None:
+            return text, recent_file["file_name"]
+        index.add_file(recent_file, file_index)
+    
+    # Everything fits in the budget - send the documents whole
+    if sum(file_index.text_tokens for _, file_index in index.files.values()) <= FILE_CONTEXT_TOKEN_BUDGET:
+        if len(index.files) == 1:
+            return await get_file_text(recent_file), recent_file["file_name"]
+        texts = [f"--- {file_record['file_name']} ---\n{await get_file_text(file_record)}" for file_record, _ in index.files.values()]
+        return "\n\n".join(texts), ", ".join(file_record["file_name"] for file_record, _ in index.files.values())
+    
+    # Overview questions are answered from the summaries built after upload, once they are ready
+    if is_summary_question(question):
+        summary_context = await get_summary_context(index)
+        if summary_context is not None:
+            logging.info(f"Answering from stored summaries: {summary_context[1]}")
+            return summary_context
+    
+    started = time.monotonic()
+    chunk_refs = await index.select_off_loop(question, FILE_CONTEXT_TOKEN_BUDGET, FILE_RETRIEVAL_TOP_K)
+    context = index.render(chunk_refs)
+    # Chunk selection can drop the partial-extraction note, so restate it for PDFs still being extracted
+    for file_id in index.files:
+        if file_id in pdf_uploads_in_progress:
+            context += "\n\n" + pdf_uploads_in_progress[file_id].progress_note()
+    file_names = list(dict.fromkeys(index.files[file_id][0]["file_name"] for file_id, _ in chunk_refs))
+    logging.info(f"Conversation retrieval: {len(chunk_refs)}/{index.chunk_count} chunks from {len(file_names)}/{len(index.files)} files, ~{estimate_tokens(context)} tokens in {(time.monotonic() - started) * 1000:.0f}ms")
+    return context, ", ".join(file_names) or recent_file["file_name"]
+
+SUMMARY_QUESTION_KEYWORDS = ['özet', 'analiz', 'genel bakış', 'ana fikir', 'ana nokta', 'ne anlatıyor', 'neler anlatıyor', 'kısalt', 'summar']
+SUMMARY_PENDING_NOTE = "⏳ Belge özeti arka planda hazırlanıyor, hazır olduğunda bu mesajda belirtilecek."
+SUMMARY_READY_NOTE = "✅ Belge hazır: özeti çıkarıldı, özet ve analiz soruları hemen yanıtlanabilir."
+
+summary_stats = {"jobs": 0, "ready": 0, "failed": 0, "shared_hits": 0, "llm_calls": 0, "answered_from_summary": 0}
+summary_slots = asyncio.Semaphore(max(1, FILE_SUMMARY_CONCURRENCY))
+file_summaries_in_progress = {}  # file_id -> background summary task
+
+def is_summary_question(question: str) -> bool:
+    return any(keyword in reading for reading in casefold_readings(question) for keyword in SUMMARY_QUESTION_KEYWORDS)
+
+def wants_document_summary(file_type: str, text: str, extraction_running: bool = False) -> bool:
+    """Only documents too long to send whole get a pre-computed summary"""
+    if not (FILE_SUMMARY_ENABLED and OPENAI_API_KEY) or file_type not in FILE_SUMMARY_TYPES or is_extraction_error(text):
+        return False
+    return extraction_running or estimate_tokens(text) > FILE_CONTEXT_TOKEN_BUDGET
+
+def summary_cache_path(content_hash: str) -> Path:
+    return derived_artifact_path(content_hash, "summary.json.z")
+
+async def read_document_summary(content_hash: Optional[str]) -> Optional[dict]:
+    """Stored summary of identical content - {"document": str, "sections": [str]} or None"""
+    if not content_hash:
+        return None
+    text = await asyncio.to_thread(_read_extraction_cache, str(summary_cache_path(content_hash)))
+    return json.loads(text) if text is not None else None
+
+async def summarize_with_llm(instruction: str, text: str) -> Optional[str]:
+    """One summary call - None if it fails"""
+    payload = {
+        "model": FILE_SUMMARY_MODEL,
+        "messages": [
+            {"role": "system", "content": "Sen belgeleri doğru ve öz biçimde özetleyen bir asistansın. Her zaman Türkçe yaz, belgede olmayan bilgi ekleme."},
+            {"role": "user", "content": f"{instruction}\n\n{text}"}
+        ],
+        "max_tokens": FILE_SUMMARY_MAX_TOKENS,
+        "temperature": 0.2
+    }
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    async with summary_slots:
+        summary_stats["llm_calls"] += 1
+        try:
+            http_client = get_provider_client("openai")
+            response = await http_client.post(OPENAI_API_URL, json=payload, headers=headers)
+        except httpx.HTTPError as e:
+            logging.error(f"File summary request error: {e}")
+            return None
+    if response.status_code != 200:
+        logging.error(f"File summary error: {response.status_code} - {response.text}")
+        return None
+    try:
+        return response.json()["choices"][0]["message"]["content"].strip() or None
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        logging.error(f"File summary unexpected response ({e!r}): {response.text[:500]}")
+        return None
+
+async def build_document_summary(file_name: str, text: str) -> Optional[dict]:
+    """Hierarchical summary - every section is summarized, then the section summaries are merged level by level
+    into one document summary. Returns {"document": str, "sections": [str]} or None if a call failed"""
+    section_tokens = max(FILE_SUMMARY_SECTION_TOKENS, -(-estimate_tokens(text) // FILE_SUMMARY_MAX_SECTIONS))
+    sections = chunk_text(text, section_tokens, 0)
+    section_summaries = await asyncio.gather(*(
+        summarize_with_llm(f"'{file_name}' belgesinin {number}. bölümünü en fazla 6 maddede özetle. Önemli olguları, sayıları, isimleri ve tarihleri koru.", section)
+        for number, section in enumerate(sections, start=1)
+    ))
+    if None in section_summaries:
+        return None
+    
+    level = section_summaries
+    while len(level) > 1 and estimate_tokens("\n\n".join(level)) > FILE_SUMMARY_SECTION_TOKENS:
+        groups = chunk_text("\n\n".join(level), FILE_SUMMARY_SECTION_TOKENS, 0)
+        if len(groups) >= len(level):
+            break
+        level = await asyncio.gather(*(
+            summarize_with_llm("Aşağıdaki bölüm özetlerini tek bir özette birleştir. Önemli olguları, sayıları ve isimleri koru.", group)
+            for group in groups
+        ))
+        if None in level:
+            return None
+    
+    document = await summarize_with_llm(
+        f"Aşağıdaki bölüm özetlerinden '{file_name}' belgesinin genel özetini çıkar: ana konu, temel bulgular ve sonuçlar. "
+        "Kısa bir giriş paragrafı ve ardından maddeler kullan.",
+        "\n\n".join(level)
+    )
+    if document is None:
+        return None
+    return {"document": document, "sections": list(section_summaries)}
+
+async def finish_summary_notice(notice_id: Optional[str], ready: bool):
+    """Replace the pending note in the upload confirmation message"""
+    if not notice_id:
+        return
+    notice = await db.messages.find_one({"id": notice_id}, {"content": 1, "_id": 0})
+    if notice and SUMMARY_PENDING_NOTE in notice["content"]:
+        content = notice["content"].replace(f"\n\n{SUMMARY_PENDING_NOTE}", f"\n\n{SUMMARY_READY_NOTE}" if ready else "")
+        await db.messages.update_one({"id": notice_id}, {"$set": {"content": content}})
+
+async def summarize_uploaded_file(file_record: dict, text: Optional[str], pdf_extraction=None):
+    """Background job started by an upload - builds the document summary (shared by identical uploads) and reports it ready"""
+    file_id = file_record["id"]
+    content_hash = file_record["content_hash"]
+    summary = None
+    try:
+        if pdf_extraction is not None:
+            # Long PDFs are summarized once all their pages are extracted
+            text = (await pdf_extraction.task)[0]
+        summary_stats["jobs"] += 1
+        started = time.monotonic()
+        
+        async def build():
+            document_summary = await build_document_summary(file_record["file_name"], text)
+            if document_summary is not None:
+                await asyncio.to_thread(_write_extraction_cache, summary_cache_path(content_hash), json.dumps(document_summary, ensure_ascii=False))
+            return document_summary
+        
+        if wants_document_summary(file_record["file_type"], text):
+            # A restarted job may find the summary already stored
+            summary = await read_document_summary(content_hash) or await single_flight.do(("summarize_content", content_hash), build)
+            status = "ready" if summary is not None else "failed"
+        else:
+            status = None
+        if summary is not None:
+            logging.info(f"Summarized {file_record['file_name']} ({len(summary['sections'])} sections) in {time.monotonic() - started:.1f}s")
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        logging.error(f"File text extraction error: {e}")
-        return f"Dosya okuma hatası: {str(e)}"
+        logging.error(f"File summary error ({file_record['file_name']}): {e}")
+        status = "failed"
+    finally:
+        file_summaries_in_progress.pop(file_id, None)
+    
+    if status is not None:
+        summary_stats["ready" if status == "ready" else "failed"] += 1
+    await db.file_uploads.update_one(
+        {"id": file_id},
+        {"$set": {"summary_status": status, "summary": summary["document"] if summary else None}}
+    )
+    await finish_summary_notice(file_record.get("summary_notice_id"), status == "ready")
+
+def start_file_summary(file_record: dict, text: Optional[str], pdf_extraction=None):
+    file_summaries_in_progress[file_record["id"]] = asyncio.create_task(summarize_uploaded_file(file_record, text, pdf_extraction))
+
+def cancel_file_summaries(file_ids: List[str]):
+    for file_id in file_ids:
+        task = file_summaries_in_progress.pop(file_id, None)
+        if task is not None:
+            task.cancel()
+
+async def init_file_summaries():
+    """Restart summaries interrupted by a shutdown"""
+    async for file_record in db.file_uploads.find({"summary_status": "pending"}, {"_id": 0}):
+        if file_record["id"] not in file_summaries_in_progress:
+            start_file_summary(file_record, await get_file_text(file_record))
+
+def pick_evenly(items: List[str], token_budget: int) -> List[str]:
+    """As many items as fit in token_budget, spread evenly across the list"""
+    if not items:
+        return []
+    average_tokens = max(1, sum(estimate_tokens(item) for item in items) // len(items))
+    count = min(len(items), token_budget // average_tokens)
+    if count <= 0:
+        return []
+    step = len(items) / count
+    return [items[int(position * step)] for position in range(count)]
+
+async def get_summary_context(index: ConversationIndex) -> Optional[tuple]:
+    """Context for overview questions from the stored summaries - short documents are sent whole; None unless every
+    long document has a summary"""
+    short_parts = []
+    long_documents = []
+    for file_record, file_index in index.files.values():
+        if file_index.text_tokens <= FILE_CONTEXT_TOKEN_BUDGET // len(index.files):
+            short_parts.append(f"--- {file_record['file_name']} ---\n{await get_file_text(file_record)}")
+        elif file_record["file_type"] in ['xlsx', 'xls', 'csv']:
+            sheet_summaries = (await get_file_text(file_record)).partition(f"\n{SPREADSHEET_ROWS_HEADING}\n")[0]
+            long_documents.append((file_record, sheet_summaries, []))
+        else:
+            summary = await read_document_summary(file_record.get("content_hash"))
+            if summary is None:
+                return None
+            long_documents.append((file_record, summary["document"], summary["sections"]))
+    if not long_documents:
+        return None
+    
+    # Section summaries share whatever budget the document summaries leave
+    used_tokens = sum(estimate_tokens(part) for part in short_parts) + sum(estimate_tokens(document) for _, document, _ in long_documents)
+    section_budget = max(0, FILE_CONTEXT_TOKEN_BUDGET - used_tokens) // len(long_documents)
+    parts = short_parts
+    for file_record, document, sections in long_documents:
+        part = f"--- {file_record['file_name']} (belge özeti) ---\n{document}"
+        picked = pick_evenly(sections, section_budget)
+        if picked:
+            part += "\n\nBölüm özetleri:\n" + "\n\n".join(picked)
+        parts.append(part)
+    summary_stats["answered_from_summary"] += 1
+    return "\n\n".join(parts), ", ".join(file_record["file_name"] for file_record, _ in index.files.values())
 
 def get_file_type(filename: str) -> str:
     """Get file type from filename"""
@@ -1145,44 +3062,29 @@ def encode_image_to_base64(image_path: str) -> str:
 async def search_web_for_free_version(question: str) -> str:
     """Search web using Serper API for FREE version current information"""
     try:
-        headers = {
-            "X-API-KEY": SERPER_API_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "q": question,
-            "gl": "tr",  # Turkey
-            "hl": "tr",  # Turkish
-            "num": 5
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(SERPER_API_URL, headers=headers, json=payload, timeout=10.0)
+        data = await serper_search(question, num=5)
+        
+        if data is not None:
+            # Extract results
+            results = []
+            if 'organic' in data:
+                for item in data['organic'][:3]:  # Top 3 results
+                    title = item.get('title', '')
+                    snippet = item.get('snippet', '')
+                    if title and snippet:
+                        results.append(f"• {title}: {snippet}")
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract results
-                results = []
-                if 'organic' in data:
-                    for item in data['organic'][:3]:  # Top 3 results
-                        title = item.get('title', '')
-                        snippet = item.get('snippet', '')
-                        if title and snippet:
-                            results.append(f"• {title}: {snippet}")
-                
-                if results:
-                    web_content = "\n".join(results)
-                    logging.info("Serper API search successful for FREE version")
-                    return web_content
-                else:
-                    return "Web araması sonuç bulamadı."
-                    
+            if results:
+                web_content = "\n".join(results)
+                logging.info("Serper API search successful for FREE version")
+                return web_content
             else:
-                logging.error(f"Serper API error: {response.status_code}")
-                return "Web araması sırasında hata oluştu."
+                return "Web araması sonuç bulamadı."
                 
+        else:
+            logging.error("Serper API search failed for FREE version")
+            return "Web araması sırasında hata oluştu."
+            
     except Exception as e:
         logging.error(f"Serper web search error: {e}")
         return "Web araması sırasında hata oluştu."
@@ -1233,26 +3135,25 @@ Lütfen bu bilgileri temizleyip düzenli bir Türkçe cevap ver. Kaynakları bel
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('candidates') and data['candidates'][0].get('content'):
-                    content = data['candidates'][0]['content']['parts'][0]['text']
-                    logging.info("Gemini web result cleaning successful")
-                    return content
-                else:
-                    return web_results  # Fallback to original web results
+        http_client = get_provider_client("gemini")
+        response = await http_client.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('candidates') and data['candidates'][0].get('content'):
+                content = data['candidates'][0]['content']['parts'][0]['text']
+                logging.info("Gemini web result cleaning successful")
+                return content
             else:
-                logging.error(f"Gemini cleaning error: {response.status_code}")
                 return web_results  # Fallback to original web results
-                
+        else:
+            logging.error(f"Gemini cleaning error: {response.status_code}")
+            return web_results  # Fallback to original web results
+            
     except Exception as e:
         logging.error(f"Gemini cleaning error: {e}")
         return web_results  # Fallback to original web results
@@ -1327,8 +3228,45 @@ def format_math_response(text: str) -> str:
     
     return '\n'.join(formatted_lines)
 
+def build_ollama_free_payload(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> dict:
+    """Build the Ollama AnythingLLM workspace payload shared by chat and stream-chat"""
+    # Add conversation mode personalities
+    mode_personalities = {
+        'friend': "Sanki karşında bir arkadaşın varmış gibi davranır, sohbeti takip eder, dostça fikirler ve samimi yorumlar yapar. Arkadaşça, sıcak ve samimi bir dille konuş.",
+        'realistic': "Yalan söylemez, yanlış fikri açıkça belirtir, seni en doğru sonuca ulaştırmaya çalışır. Gerçekçi, objektif ve doğrudan yaklaşım sergile.",
+        'coach': "Sorular sorarak düşündürür, hedef belirlemene yardımcı olur, adım adım ilerleme planı çıkarır. Motivasyonel koç gibi davran ve sürekli sorular sor.",
+        'lawyer': "Karşıt görüş üretir, bir avukat gibi mantıklı ve savunmacı şekilde karşı argümanı savunur. Her konuda alternatif bakış açısı sun ve karşı argüman geliştir.",
+        'teacher': "Her konuda öğretici yaklaşır, konuyu adım adım açıklar ve pekiştirme soruları sorarak anlamanı kontrol eder. Pedagogik ve eğitici bir dil kullan.",
+        'minimalist': "Tek cümlelik, net ve doğrudan cevap verir; uzatmaz, sadece soruna odaklanır. Çok kısa ve öz yanıtlar ver, gereksiz ayrıntıya girme."
+    }
+    
+    # Prepare the message with personality if conversation mode is active
+    if conversation_mode and conversation_mode != 'normal':
+        personality = mode_personalities.get(conversation_mode, "Sen yardımcı bir asistansın.")
+        if file_content:
+            user_message = f"Sistem mesajı: {personality}\n\nDosya adı: {file_name}\nDosya içeriği: {file_content}\n\nKullanıcı sorusu: {question}"
+        else:
+            user_message = f"Sistem mesajı: {personality}\n\nKullanıcı sorusu: {question}"
+    else:
+        # Normal mode
+        if file_content:
+            user_message = f"Dosya adı: {file_name}\nDosya içeriği: {file_content}\n\nKullanıcı sorusu: {question}"
+        else:
+            user_message = question
+    
+    return {
+        "message": user_message,
+        "mode": "chat",  # Use chat mode for general knowledge with custom embeddings
+        "sessionId": f"free-session-{hash(question)}",
+        "reset": False
+    }
+
 async def process_with_ollama_free(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
     """Process question with Ollama AnythingLLM for FREE/PRO version - returns exact response without modification"""
+    if not is_provider_available("ollama_anythingllm"):
+        logging.warning("Ollama AnythingLLM circuit open - failing over to Gemini")
+        return await process_with_gemini_free(question, conversation_mode, file_content, file_name)
+    
     try:
         # Use Ollama AnythingLLM API
         headers = {
@@ -1336,70 +3274,121 @@ async def process_with_ollama_free(question: str, conversation_mode: str = 'norm
             "Authorization": f"Bearer {OLLAMA_ANYTHINGLLM_API_KEY}"
         }
         
-        # Add conversation mode personalities
-        mode_personalities = {
-            'friend': "Sanki karşında bir arkadaşın varmış gibi davranır, sohbeti takip eder, dostça fikirler ve samimi yorumlar yapar. Arkadaşça, sıcak ve samimi bir dille konuş.",
-            'realistic': "Yalan söylemez, yanlış fikri açıkça belirtir, seni en doğru sonuca ulaştırmaya çalışır. Gerçekçi, objektif ve doğrudan yaklaşım sergile.",
-            'coach': "Sorular sorarak düşündürür, hedef belirlemene yardımcı olur, adım adım ilerleme planı çıkarır. Motivasyonel koç gibi davran ve sürekli sorular sor.",
-            'lawyer': "Karşıt görüş üretir, bir avukat gibi mantıklı ve savunmacı şekilde karşı argümanı savunur. Her konuda alternatif bakış açısı sun ve karşı argüman geliştir.",
-            'teacher': "Her konuda öğretici yaklaşır, konuyu adım adım açıklar ve pekiştirme soruları sorarak anlamanı kontrol eder. Pedagogik ve eğitici bir dil kullan.",
-            'minimalist': "Tek cümlelik, net ve doğrudan cevap verir; uzatmaz, sadece soruna odaklanır. Çok kısa ve öz yanıtlar ver, gereksiz ayrıntıya girme."
-        }
+        payload = build_ollama_free_payload(question, conversation_mode, file_content, file_name)
         
-        # Prepare the message with personality if conversation mode is active
-        if conversation_mode and conversation_mode != 'normal':
-            personality = mode_personalities.get(conversation_mode, "Sen yardımcı bir asistansın.")
-            if file_content:
-                user_message = f"Sistem mesajı: {personality}\n\nDosya adı: {file_name}\nDosya içeriği: {file_content}\n\nKullanıcı sorusu: {question}"
+        http_client = get_provider_client("ollama_anythingllm")
+        response = await http_client.post(
+            f"{OLLAMA_ANYTHINGLLM_BASE_URL}/workspace/testtt/chat",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            # Return the exact response without any modification
+            if data.get('textResponse'):
+                content = data['textResponse']
+                # Clean markdown formatting from response
+                content = clean_response_formatting(content)
+                logging.info("Ollama AnythingLLM FREE response received successfully")
+                return content
             else:
-                user_message = f"Sistem mesajı: {personality}\n\nKullanıcı sorusu: {question}"
+                logging.error(f"Ollama AnythingLLM unexpected response format: {data}")
+                return "Yanıt alınamadı. Lütfen tekrar deneyin."
         else:
-            # Normal mode
-            if file_content:
-                user_message = f"Dosya adı: {file_name}\nDosya içeriği: {file_content}\n\nKullanıcı sorusu: {question}"
-            else:
-                user_message = question
-        
-        payload = {
-            "message": user_message,
-            "mode": "chat",  # Use chat mode for general knowledge with custom embeddings
-            "sessionId": f"free-session-{hash(question)}",
-            "reset": False
+            logging.error(f"Ollama AnythingLLM API error: {response.status_code} - {response.text}")
+            return "AnythingLLM sisteminde bir hata oluştu. Lütfen tekrar deneyin."
+            
+    except httpx.TransportError as e:
+        logging.warning(f"Ollama AnythingLLM unavailable ({e!r}) - failing over to Gemini")
+        return await process_with_gemini_free(question, conversation_mode, file_content, file_name)
+    except Exception as e:
+        logging.error(f"Ollama AnythingLLM request error: {e}")
+        return "AnythingLLM sistemine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
+
+async def stream_ollama_events(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None):
+    """Stream answer events from Ollama AnythingLLM stream-chat for FREE version"""
+    
+    if not is_provider_available("ollama_anythingllm"):
+        logging.warning("Ollama AnythingLLM circuit open - failing over to Gemini (stream)")
+        answer = await process_with_gemini_free(question, conversation_mode, file_content, file_name)
+        yield ('chunk', answer)
+        yield ('complete', answer)
+        return
+    
+    content_parts = []
+    try:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {OLLAMA_ANYTHINGLLM_API_KEY}",
+            "Accept": "text/event-stream"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{OLLAMA_ANYTHINGLLM_BASE_URL}/workspace/testtt/chat",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
+        payload = build_ollama_free_payload(question, conversation_mode, file_content, file_name)
+        
+        http_client = get_provider_client("ollama_anythingllm")
+        async with http_client.stream("POST",
+                                      f"{OLLAMA_ANYTHINGLLM_BASE_URL}/workspace/testtt/stream-chat",
+                                      headers=headers,
+                                      json=payload) as response:
             
             if response.status_code == 200:
-                data = response.json()
-                # Return the exact response without any modification
-                if data.get('textResponse'):
-                    content = data['textResponse']
-                    # Clean markdown formatting from response
-                    content = clean_response_formatting(content)
-                    logging.info("Ollama AnythingLLM FREE response received successfully")
-                    return content
-                else:
-                    logging.error(f"Ollama AnythingLLM unexpected response format: {data}")
-                    return "Yanıt alınamadı. Lütfen tekrar deneyin."
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    
+                    try:
+                        chunk_data = json.loads(line[6:])
+                    except json.JSONDecodeError:
+                        continue
+                    
+                    if chunk_data.get('error') or chunk_data.get('type') == 'abort':
+                        logging.error(f"Ollama AnythingLLM stream error: {chunk_data.get('error')}")
+                        yield ('error', 'AnythingLLM sisteminde bir hata oluştu. Lütfen tekrar deneyin.')
+                        return
+                    
+                    chunk_content = chunk_data.get('textResponse') or ''
+                    if chunk_content:
+                        # Forward each chunk as soon as the workspace emits it
+                        content_parts.append(chunk_content)
+                        yield ('chunk', chunk_content)
+                    
+                    if chunk_data.get('close'):
+                        break
             else:
-                logging.error(f"Ollama AnythingLLM API error: {response.status_code} - {response.text}")
-                return "AnythingLLM sisteminde bir hata oluştu. Lütfen tekrar deneyin."
-                
+                error_text = await response.atext()
+                logging.error(f"Ollama AnythingLLM stream API error: {response.status_code} - {error_text}")
+                yield ('error', 'AnythingLLM sisteminde bir hata oluştu. Lütfen tekrar deneyin.')
+                return
+        
+        full_content = "".join(content_parts)
+        if not full_content:
+            logging.warning("Empty content from Ollama AnythingLLM stream")
+            yield ('error', 'Yanıt alınamadı. Lütfen tekrar deneyin.')
+            return
+        
+        # Send completion signal with markdown cleaned the same way as the non-streaming path
+        logging.info(f"Ollama AnythingLLM FREE stream completed: {len(full_content)} characters")
+        yield ('complete', clean_response_formatting(full_content))
+        
+    except httpx.TransportError as e:
+        if content_parts:
+            logging.error(f"Ollama streaming error: {e}")
+            yield ('error', 'Bağlantı hatası oluştu')
+            return
+        logging.warning(f"Ollama AnythingLLM unavailable ({e!r}) - failing over to Gemini (stream)")
+        answer = await process_with_gemini_free(question, conversation_mode, file_content, file_name)
+        yield ('chunk', answer)
+        yield ('complete', answer)
     except Exception as e:
-        logging.error(f"Ollama AnythingLLM request error: {e}")
-        return "AnythingLLM sistemine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
+        logging.error(f"Ollama streaming error: {e}")
+        yield ('error', 'Bağlantı hatası oluştu')
 
 async def process_with_gemini_free(question: str, conversation_mode: str = 'normal', file_content: str = None, file_name: str = None) -> str:
     """Process question with free Gemini API for FREE version - includes web search for current topics"""
     try:
         # Check if this is a current information question that needs web search
-        category = get_question_category(question)
+        category = classify_question(question).category
         
         if category == 'current':
             logging.info("FREE version: Current information question detected - using Serper + Gemini")
@@ -1457,31 +3446,62 @@ async def process_with_gemini_free(question: str, conversation_mode: str = 'norm
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('candidates') and data['candidates'][0].get('content'):
-                    content = data['candidates'][0]['content']['parts'][0]['text']
-                    logging.info("Gemini FREE API response received successfully")
-                    return content
-                else:
-                    logging.error(f"Gemini API unexpected response format: {data}")
-                    return "Gemini API'sinde beklenmeyen yanıt formatı. Lütfen tekrar deneyin."
+        http_client = get_provider_client("gemini")
+        response = await http_client.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('candidates') and data['candidates'][0].get('content'):
+                content = data['candidates'][0]['content']['parts'][0]['text']
+                logging.info("Gemini FREE API response received successfully")
+                return content
             else:
-                logging.error(f"Gemini API error: {response.status_code} - {response.text}")
-                return "Gemini API'sinde bir hata oluştu. Lütfen tekrar deneyin."
-                
+                logging.error(f"Gemini API unexpected response format: {data}")
+                return "Gemini API'sinde beklenmeyen yanıt formatı. Lütfen tekrar deneyin."
+        else:
+            logging.error(f"Gemini API error: {response.status_code} - {response.text}")
+            return "Gemini API'sinde bir hata oluştu. Lütfen tekrar deneyin."
+            
     except Exception as e:
         logging.error(f"Gemini FREE system error: {e}")
         return "Gemini FREE sisteminde bir hata oluştu. Lütfen tekrar deneyin."
 
+vision_stats = {"prepared": 0, "cache_hits": 0, "failures": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+def vision_image_path(content_hash: str) -> Path:
+    return derived_artifact_path(content_hash, "vision.jpg")
+
+async def prepare_vision_image(file_path: str, content_hash: Optional[str] = None) -> Optional[Path]:
+    """Reduced copy of an uploaded image for the vision model, made once per distinct content - None if the image can't be read"""
+    if content_hash is None:
+        content_hash = await asyncio.to_thread(hash_file, file_path)
+    target_path = vision_image_path(content_hash)
+    if await asyncio.to_thread(target_path.exists):
+        vision_stats["cache_hits"] += 1
+        return target_path
+    
+    async def prepare():
+        started = time.monotonic()
+        try:
+            width, height, size = await run_extraction_job(_prepare_vision_image_sync, file_path, str(target_path))
+        except Exception as e:
+            vision_stats["failures"] += 1
+            logging.warning(f"Vision preprocessing failed for {file_path}: {e}")
+            return None
+        vision_stats["prepared"] += 1
+        vision_stats["bytes_in"] += await asyncio.to_thread(os.path.getsize, file_path)
+        vision_stats["bytes_out"] += size
+        vision_stats["seconds"] += time.monotonic() - started
+        logging.info(f"Prepared {width}x{height} vision image ({size / 1024:.0f} KB) in {time.monotonic() - started:.2f}s: {file_path}")
+        return target_path
+    
+    # Identical images uploaded at the same time are processed once
+    return await single_flight.do(("prepare_vision_image", content_hash), prepare)
+
 def get_image_mime_type(file_path: str) -> str:
     """Detect image mime type from file extension"""
     extension = file_path.lower().split('.')[-1]
@@ -1495,8 +3515,50 @@ def get_image_mime_type(file_path: str) -> str:
     }
     return mime_mapping.get(extension, 'image/jpeg')
 
-async def process_image_with_chatgpt_vision(question: str, image_path: str, image_name: str) -> str:
-    """Process image questions using Emergent integrations text-only (temporarily disabled Vision)"""
+async def ask_openai_vision(question: str, image_name: str, vision_path: Path) -> Optional[str]:
+    """Ask the vision model about a prepared image - None if the request fails"""
+    image_base64 = await asyncio.to_thread(encode_image_to_base64, str(vision_path))
+    payload = {
+        "model": VISION_MODEL,
+        "messages": [
+            {"role": "system", "content": "Sen bir görsel analiz asistanısın. Görseli dikkatle incele, içindeki metinleri, tabloları ve detayları dikkate alarak kullanıcının sorusunu Türkçe yanıtla."},
+            {"role": "user", "content": [
+                {"type": "text", "text": f"Görsel: {image_name}\n\nSoru: {question}"},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}}
+            ]}
+        ],
+        "max_tokens": 1000
+    }
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
+    try:
+        http_client = get_provider_client("openai")
+        response = await http_client.post(OPENAI_API_URL, json=payload, headers=headers)
+    except httpx.HTTPError as e:
+        logging.error(f"OpenAI vision request error: {e}")
+        return None
+    if response.status_code != 200:
+        logging.error(f"OpenAI vision error: {response.status_code} - {response.text}")
+        return None
+    try:
+        return clean_response_formatting(response.json()["choices"][0]["message"]["content"])
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        logging.error(f"OpenAI vision unexpected response ({e!r}): {response.text[:500]}")
+        return None
+
+async def process_image_with_chatgpt_vision(question: str, image_path: str, image_name: str, content_hash: Optional[str] = None) -> str:
+    """Answer image questions with OpenAI vision from the reduced image - text-only Emergent fallback when vision is unavailable"""
+    if OPENAI_API_KEY:
+        vision_path = await prepare_vision_image(image_path, content_hash)
+        if vision_path is not None:
+            answer = await ask_openai_vision(question, image_name, vision_path)
+            if answer:
+                logging.info(f"Vision response generated successfully: {len(answer)} characters")
+                return answer
+    
     try:
         logging.info(f"Processing image question (text-only mode): {question}")
         
@@ -1534,93 +3596,64 @@ async def process_image_with_chatgpt_vision(question: str, image_path: str, imag
         logging.error(f"Image processing error: {e}")
         return f"Resim işleme sırasında bir hata oluştu. Lütfen resminizi tanımlayın, size yardımcı olabilirim."
 
-def is_file_processing_question(question: str) -> bool:
-    """Check if question requires file processing capabilities"""
-    file_processing_keywords = [
-        'pdf', 'excel', 'word', 'dosya', 'döküman', 'belge',
-        'özet', 'özetle', 'çevir', 'translate', 'düzelt', 'analiz',
-        'inceleme', 'rapor', 'tablo', 'grafik', 'veri',
-        'metin düzelt', 'grammar', 'yazım', 'imla'
-    ]
-    
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in file_processing_keywords)
+CASUAL_SHORT_WORDS = ['merhaba', 'selam', 'naber', 'nasıl', 'hi', 'hello']
 
-def is_casual_chat(question: str) -> bool:
-    """Check if this is casual conversational text"""
-    casual_patterns = [
-        # Greetings
-        r'^(merhaba|selam|hello|hi|hey|günaydın|iyi akşam|tünaydın)$',
-        r'^(merhaba|selam|hello|hi|hey)\s*(nasılsın|naber|ne var ne yok).*',
-        
-        # Social conversation
-        r'nasılsın', r'naber', r'ne yapıyorsun', r'keyifler nasıl',
-        r'ne var ne yok', r'hayat nasıl', r'işler nasıl',
-        
-        # Casual responses
-        r'^(teşekkür|sağol|eyvallah|thanks|thank you)$',
-        r'^(tamam|ok|peki|anladım|iyi|güzel)$',
-        
-        # Conversation starters
-        r'sohbet etmek', r'konuşmak istiyorum', r'muhabbet',
-        r'canım sıkılıyor', r'vakit geçirmek', r'chat yapalım',
-        
-        # Personal sharing
-        r'bugün.*oldu', r'dün.*gittim', r'şimdi.*yapıyorum',
-        r'hissediyorum', r'mutluyum', r'üzgünüm', r'yorgunum',
-        
-        # Simple questions that invite conversation
-        r'^(nasıl|ne|neden).*\?$'
-    ]
-    
-    question_lower = question.lower().strip()
-    
-    # Very short conversational expressions
-    if len(question_lower) <= 15 and any(word in question_lower for word in ['merhaba', 'selam', 'naber', 'nasıl', 'hi', 'hello']):
-        return True
-    
-    for pattern in casual_patterns:
-        if re.search(pattern, question_lower):
-            return True
-    
-    return False
+CASUAL_CHAT_PATTERNS = [
+    # Greetings
+    r'^(merhaba|selam|hello|hi|hey|günaydın|iyi akşam|tünaydın)$',
+    r'^(merhaba|selam|hello|hi|hey)\s*(nasılsın|naber|ne var ne yok).*',
+    
+    # Social conversation
+    r'nasılsın', r'naber', r'ne yapıyorsun', r'keyifler nasıl',
+    r'ne var ne yok', r'hayat nasıl', r'işler nasıl',
+    
+    # Casual responses
+    r'^(teşekkür|sağol|eyvallah|thanks|thank you)$',
+    r'^(tamam|ok|peki|anladım|iyi|güzel)$',
+    
+    # Conversation starters
+    r'sohbet etmek', r'konuşmak istiyorum', r'muhabbet',
+    r'canım sıkılıyor', r'vakit geçirmek', r'chat yapalım',
+    
+    # Personal sharing
+    r'bugün.*oldu', r'dün.*gittim', r'şimdi.*yapıyorum',
+    r'hissediyorum', r'mutluyum', r'üzgünüm', r'yorgunum',
+    
+    # Simple questions that invite conversation
+    r'^(nasıl|ne|neden).*\?$'
+]
 
-def is_technical_or_creative_question(question: str) -> bool:
-    """Check if question requires technical writing or creative capabilities"""
-    technical_creative_keywords = [
-        # Writing and content creation
-        'yaz', 'yazı yaz', 'metin yaz', 'makale yaz', 'blog yaz',
-        'hikaye yaz', 'şiir yaz', 'mektup yaz', 'email yaz',
-        'rapor yaz', 'özgeçmiş yaz', 'sunum hazırla',
-        
-        # Document processing and summarization  
-        'özetle', 'özet çıkar', 'kısalt', 'ana nokta', 'önemli kısmı',
-        'özet ver', 'özetini al', 'özetle',
-        
-        # Text correction and improvement
-        'düzelt', 'yazım hatası', 'imla hatası', 'grammar', 
-        'dil bilgisi', 'yazım kontrolü', 'metni düzelt',
-        'daha iyi yaz', 'geliştirebilir misin', 'iyileştir',
-        
-        # Translation
-        'çevir', 'translate', 'tercüme', 'çevirisi', 'ingilizcesi',
-        'türkçesi', 'fransızcası', 'almancası', 'İngilizce çevir',
-        
-        # Creative tasks
-        'tasarla', 'fikir ver', 'öneri', 'senaryo yaz', 'plan yap',
-        'strateji geliş', 'yaratıcı', 'kreatif', 'konsept',
-        
-        # Technical analysis
-        'analiz et', 'değerlendir', 'incele', 'yorumla',
-        'karşılaştır', 'araştır', 'detaylı', 'derinlemesine',
-        
-        # Professional tasks
-        'iş planı', 'proje planı', 'sunum', 'toplantı notları',
-        'agenda', 'şablon', 'format', 'profesyonel'
-    ]
-    
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in technical_creative_keywords)
+TECHNICAL_CREATIVE_KEYWORDS = [
+    # Writing and content creation
+    'yaz', 'yazı yaz', 'metin yaz', 'makale yaz', 'blog yaz',
+    'hikaye yaz', 'şiir yaz', 'mektup yaz', 'email yaz',
+    'rapor yaz', 'özgeçmiş yaz', 'sunum hazırla',
+    
+    # Document processing and summarization  
+    'özetle', 'özet çıkar', 'kısalt', 'ana nokta', 'önemli kısmı',
+    'özet ver', 'özetini al', 'özetle',
+    
+    # Text correction and improvement
+    'düzelt', 'yazım hatası', 'imla hatası', 'grammar', 
+    'dil bilgisi', 'yazım kontrolü', 'metni düzelt',
+    'daha iyi yaz', 'geliştirebilir misin', 'iyileştir',
+    
+    # Translation
+    'çevir', 'translate', 'tercüme', 'çevirisi', 'ingilizcesi',
+    'türkçesi', 'fransızcası', 'almancası', 'İngilizce çevir',
+    
+    # Creative tasks
+    'tasarla', 'fikir ver', 'öneri', 'senaryo yaz', 'plan yap',
+    'strateji geliş', 'yaratıcı', 'kreatif', 'konsept',
+    
+    # Technical analysis
+    'analiz et', 'değerlendir', 'incele', 'yorumla',
+    'karşılaştır', 'araştır', 'detaylı', 'derinlemesine',
+    
+    # Professional tasks
+    'iş planı', 'proje planı', 'sunum', 'toplantı notları',
+    'agenda', 'şablon', 'format', 'profesyonel'
+]
 
 async def process_conversation_mode_with_openai(question: str, conversation_mode: str, file_content: str = None, file_name: str = None) -> str:
     """Process conversation modes with OpenAI GPT-5-nano for better personality"""
@@ -1678,29 +3711,28 @@ async def process_conversation_mode_with_openai(question: str, conversation_mode
             "temperature": 0.3  # Moderate temperature for personality
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
+        http_client = get_provider_client("openai")
+        response = await http_client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            
+            # GPT-5-nano sometimes returns empty content, check and handle
+            if not content or content.strip() == "":
+                logging.warning("GPT-5-nano returned empty content in conversation mode")
+                content = "Üzgünüm, yanıt üretilirken bir sorun oluştu. Lütfen sorunuzu farklı şekilde tekrar deneyin."
+            
+            logging.info(f"OpenAI conversation mode '{conversation_mode}' response received successfully")
+            return content
+        else:
+            logging.error(f"OpenAI conversation mode API error: {response.status_code} - {response.text}")
+            return f"OpenAI API'sinde bir hata oluştu. {personality['name']} modunda yanıt veremedim."
             
-            if response.status_code == 200:
-                data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                
-                # GPT-5-nano sometimes returns empty content, check and handle
-                if not content or content.strip() == "":
-                    logging.warning("GPT-5-nano returned empty content in conversation mode")
-                    content = "Üzgünüm, yanıt üretilirken bir sorun oluştu. Lütfen sorunuzu farklı şekilde tekrar deneyin."
-                
-                logging.info(f"OpenAI conversation mode '{conversation_mode}' response received successfully")
-                return content
-            else:
-                logging.error(f"OpenAI conversation mode API error: {response.status_code} - {response.text}")
-                return f"OpenAI API'sinde bir hata oluştu. {personality['name']} modunda yanıt veremedim."
-                
     except Exception as e:
         logging.error(f"OpenAI conversation mode request error: {e}")
         return f"OpenAI API'sine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
@@ -1732,68 +3764,159 @@ async def process_with_direct_openai(question: str, file_content: str = None, fi
             "temperature": 0.3
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
+        http_client = get_provider_client("openai")
+        response = await http_client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+            
+            # GPT-5-nano sometimes returns empty content, check and handle
+            if not content or content.strip() == "":
+                logging.warning("GPT-5-nano returned empty content in direct API")
+                content = "Üzgünüm, yanıt üretilirken bir sorun oluştu. Lütfen sorunuzu farklı şekilde tekrar deneyin."
+            
+            logging.info("Direct OpenAI API response received successfully")
+            return content
+        else:
+            logging.error(f"Direct OpenAI API error: {response.status_code} - {response.text}")
+            return "OpenAI API'sinde bir hata oluştu. Lütfen tekrar deneyin."
             
-            if response.status_code == 200:
-                data = response.json()
-                content = data["choices"][0]["message"]["content"]
-                
-                # GPT-5-nano sometimes returns empty content, check and handle
-                if not content or content.strip() == "":
-                    logging.warning("GPT-5-nano returned empty content in direct API")
-                    content = "Üzgünüm, yanıt üretilirken bir sorun oluştu. Lütfen sorunuzu farklı şekilde tekrar deneyin."
-                
-                logging.info("Direct OpenAI API response received successfully")
-                return content
-            else:
-                logging.error(f"Direct OpenAI API error: {response.status_code} - {response.text}")
-                return "OpenAI API'sinde bir hata oluştu. Lütfen tekrar deneyin."
-                
     except Exception as e:
         logging.error(f"Direct OpenAI API request error: {e}")
         return "OpenAI API'sine bağlanırken bir hata oluştu. Lütfen tekrar deneyin."
 
-def is_question_about_uploaded_file(question: str) -> bool:
-    """Check if the question is specifically about an uploaded file"""
-    file_reference_keywords = [
-        'pdf', 'dosya', 'döküman', 'belge', 'excel', 'word',
-        'yüklediğim', 'bu dosya', 'bu pdf', 'bu belge',
-        'dosyada', 'pdf\'de', 'belgede', 'tabloda',
-        'içerik', 'metin', 'veri', 'bilgi',
-        'özet', 'özetle', 'çevir', 'analiz', 'inceleme',
-        'bu', 'şu', 'o' # simple referrals when context has files
-    ]
-    
-    question_lower = question.lower()
-    
-    # Direct file references
-    direct_references = [
-        'pdf', 'dosya', 'döküman', 'belge', 'excel', 'word',
-        'yüklediğim', 'bu dosya', 'bu pdf', 'bu belge'
-    ]
-    
-    # Check for direct file references first
-    for keyword in direct_references:
-        if keyword in question_lower:
-            return True
-    
-    # Check for file processing actions with context words
-    processing_actions = ['özet', 'özetle', 'çevir', 'analiz', 'inceleme', 'düzelt']
-    context_words = ['bu', 'şu', 'o', 'içerik', 'metin', 'veri']
-    
-    has_processing_action = any(action in question_lower for action in processing_actions)
-    has_context_word = any(context in question_lower for context in context_words)
-    
-    if has_processing_action and has_context_word:
-        return True
-    
-    return False
+# Direct file references
+FILE_DIRECT_REFERENCES = [
+    'pdf', 'dosya', 'döküman', 'belge', 'excel', 'word',
+    'yüklediğim', 'bu dosya', 'bu pdf', 'bu belge'
+]
+
+FILE_PROCESSING_ACTIONS = ['özet', 'özetle', 'çevir', 'analiz', 'inceleme', 'düzelt']
+FILE_CONTEXT_WORDS = ['bu', 'şu', 'o', 'içerik', 'metin', 'veri']
+
+# Compiled routing classifier - the routing rules above, evaluated in one pass
+ROUTING_CACHE_SIZE = int(os.environ.get("ROUTING_CACHE_SIZE", "4096"))
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting which keyword groups occur in a text, in a single pass"""
+    
+    def __init__(self, keyword_groups: dict):
+        self.group_names = list(keyword_groups)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [0]  # Bitmask of groups whose keywords end at each state
+        for bit, group_name in enumerate(self.group_names):
+            for keyword in keyword_groups[group_name]:
+                self._add_keyword(turkish_lower(keyword), 1 << bit)
+        self._build_failure_links()
+    
+    def _add_keyword(self, keyword: str, group_mask: int):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(0)
+                self.goto[state][char] = next_state
+            state = next_state
+        self.output[state] |= group_mask
+    
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+    
+    def search(self, text: str) -> frozenset:
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        found = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found |= output[state]
+        return frozenset(name for bit, name in enumerate(self.group_names) if found >> bit & 1)
+
+class RoutingFeatures(NamedTuple):
+    """Every routing flag for a question"""
+    category: str
+    is_formula: bool
+    requires_web_search: bool
+    is_casual_chat: bool
+    is_technical_or_creative: bool
+    is_general_knowledge: bool
+    is_about_uploaded_file: bool
+
+routing_keywords = KeywordAutomaton({
+    'formula': FORMULA_KEYWORDS,
+    'general_knowledge': GENERAL_KNOWLEDGE_KEYWORDS,
+    'technical_creative': TECHNICAL_CREATIVE_KEYWORDS,
+    'casual_short': CASUAL_SHORT_WORDS,
+    'file_direct': FILE_DIRECT_REFERENCES,
+    'file_action': FILE_PROCESSING_ACTIONS,
+    'file_context': FILE_CONTEXT_WORDS
+})
+
+# One alternation per flag group - any(re.search(p) for p in group) == combined.search()
+routing_patterns = {
+    group_name: re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    for group_name, patterns in {
+        'category_casual': CATEGORY_CASUAL_PATTERNS,
+        'category_current': CATEGORY_CURRENT_PATTERNS,
+        'category_factual': CATEGORY_FACTUAL_PATTERNS,
+        'category_math': [CATEGORY_MATH_PATTERN],
+        'formula_math': FORMULA_MATH_PATTERNS,
+        'web_search': WEB_SEARCH_PATTERNS,
+        'casual_chat': CASUAL_CHAT_PATTERNS
+    }.items()
+}
+
+@lru_cache(maxsize=ROUTING_CACHE_SIZE)
+def classify_question(question: str) -> RoutingFeatures:
+    """Compute all routing flags at once: normalize once, one keyword pass, one regex per flag group - a rule matches if
+    it matches either casefold reading of the question"""
+    texts = [reading.strip() for reading in casefold_readings(question)]
+    text = texts[0]
+    keywords = frozenset().union(*(routing_keywords.search(reading) for reading in texts))
+    
+    def matches(group_name: str) -> bool:
+        return any(routing_patterns[group_name].search(reading) is not None for reading in texts)
+    
+    # Casual first, then current, factual and math, general otherwise
+    if matches('category_casual'):
+        category = 'casual'
+    elif matches('category_current'):
+        category = 'current'
+    elif matches('category_factual'):
+        category = 'factual'
+    elif matches('category_math'):
+        category = 'math'
+    else:
+        category = 'general'
+    
+    return RoutingFeatures(
+        category=category,
+        is_formula='formula' in keywords or matches('formula_math'),
+        requires_web_search=matches('web_search'),
+        is_casual_chat=(len(text) <= 15 and 'casual_short' in keywords) or matches('casual_chat'),
+        is_technical_or_creative='technical_creative' in keywords,
+        is_general_knowledge='general_knowledge' in keywords,
+        is_about_uploaded_file='file_direct' in keywords or ('file_action' in keywords and 'file_context' in keywords)
+    )
 
 async def process_with_openai(question: str, file_content: str = None, file_name: str = None) -> str:
     """Process question with OpenAI GPT-4o mini"""
@@ -1936,6 +4059,11 @@ class Conversation(BaseModel):
     title: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Read model, updated together with every message insert (see conversation_message_update())
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    last_role: Optional[str] = None
+    has_files: bool = False
 
 class ConversationCreate(BaseModel):
     title: str
@@ -1959,8 +4087,19 @@ class FileUpload(BaseModel):
     file_name: str
     file_type: str
     file_path: str
+    content_hash: Optional[str] = None
+    extracted_text_path: Optional[str] = None
+    extracted_chars: Optional[int] = None
+    summary_status: Optional[str] = None  # pending | ready | failed, None when the document is sent whole
+    summary: Optional[str] = None
+    summary_notice_id: Optional[str] = None  # Upload confirmation message that reports when the summary is ready
     uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UploadSessionCreate(BaseModel):
+    file_name: str
+    file_size: int
+    part_size: Optional[int] = None
+
 class MessageResponse(BaseModel):
     id: str
     conversation_id: str
@@ -1995,6 +4134,26 @@ def parse_from_mongo(item):
                     pass
     return item
 
+def message_preview(content: str) -> str:
+    """A message on one line, cut to CONVERSATION_PREVIEW_CHARS for the conversation list"""
+    preview = " ".join(content.split())
+    if len(preview) <= CONVERSATION_PREVIEW_CHARS:
+        return preview
+    return preview[:CONVERSATION_PREVIEW_CHARS - 1].rstrip() + "…"
+
+def conversation_message_update(message: dict, **fields) -> dict:
+    """Update that records a newly inserted message in its conversation's read model, plus any extra fields to $set -
+    the message id is remembered so conversation_update_once() can skip a message that was already counted"""
+    return {
+        "$inc": {"message_count": 1},
+        "$set": {"last_message_preview": message_preview(message["content"]), "last_role": message["role"], **fields},
+        "$push": {"counted_message_ids": {"$each": [message["id"]], "$slice": -CONVERSATION_COUNTED_IDS}}
+    }
+
+def conversation_update_once(message: dict, update: dict) -> UpdateOne:
+    """A conversation_message_update() that is a no-op if this message was counted already (a replayed write)"""
+    return UpdateOne({"id": message["conversation_id"], "counted_message_ids": {"$ne": message["id"]}}, update)
+
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
@@ -2098,6 +4257,157 @@ def generate_conversation_title(message_content: str) -> str:
     # Fallback: Genel sohbet mesajı
     return "Sohbet"
 
+# MongoDB indexes - every index a query in this module relies on, created idempotently at startup
+MONGO_INDEXES_AUTO_CREATE = os.environ.get("MONGO_INDEXES_AUTO_CREATE", "true").lower() == "true"  # false = performance indexes are managed by hand, only reported
+
+class IndexSpec(NamedTuple):
+    keys: list  # [(field, direction)] in index order
+    unique: bool = False
+    partial: Optional[dict] = None  # partialFilterExpression - only documents matching it are indexed
+    required: bool = False  # Correctness depends on it - always created, and startup fails without it
+    
+    @property
+    def name(self) -> str:
+        # Same name MongoDB generates, so indexes created by hand are recognized
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+MONGO_INDEXES = {
+    "users": [
+        IndexSpec([("id", 1)], unique=True),  # session user lookup, profile updates
+        IndexSpec([("email", 1)], unique=True),  # registration $or, OAuth login
+        IndexSpec([("username", 1)]),  # registration $or, login, admin bootstrap (not unique: Google sign-up reuses the email prefix)
+        IndexSpec([("created_at", -1)]),  # admin stats: recent users
+    ],
+    "sessions": [
+        IndexSpec([("session_token", 1)], unique=True),  # every authenticated request (expires_at is checked on the one match)
+        IndexSpec([("user_id", 1)]),  # logout
+    ],
+    "conversations": [
+        IndexSpec([("id", 1)], unique=True),  # ownership check on every conversation route
+        IndexSpec([("user_id", 1), ("updated_at", -1), ("id", -1)]),  # conversation list pages, newest first
+    ],
+    "messages": [
+        IndexSpec([("id", 1)], unique=True, required=True),  # upload notice updates; message_queue skips replayed duplicates
+        IndexSpec([("conversation_id", 1), ("timestamp", 1), ("id", 1)]),  # history pages, message counts, conversation delete
+    ],
+    "file_uploads": [
+        IndexSpec([("id", 1)], unique=True),
+        IndexSpec([("conversation_id", 1), ("uploaded_at", -1)]),  # most recent file per message, file list
+        IndexSpec([("summary_status", 1)], partial={"summary_status": "pending"}),  # summaries to restart at startup
+    ],
+    "upload_sessions": [
+        IndexSpec([("id", 1)], unique=True),
+        IndexSpec([("conversation_id", 1)]),  # conversation delete
+        IndexSpec([("expires_at", 1)]),  # expired session sweep
+    ],
+    "blobs": [
+        IndexSpec([("hash", 1)], unique=True, required=True),  # concurrent upserts in commit_upload_blob share one ref_count
+        IndexSpec([("unreferenced_since", 1)], partial={"ref_count": {"$lte": 0}}),  # GC candidates
+    ],
+    "reports": [
+        IndexSpec([("id", 1)], unique=True),
+        IndexSpec([("created_at", -1)]),  # admin report list
+    ],
+}
+
+index_report = {"created": 0, "failed": {}}
+
+async def create_indexes(required_only: bool = False) -> int:
+    """Create the declared indexes that don't exist yet. A failing performance index (e.g. duplicates under a unique
+    key) is logged and reported instead of stopping startup; a required index that can't be created raises"""
+    created = 0
+    for collection_name, specs in MONGO_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for spec in specs:
+            if required_only and not spec.required:
+                continue
+            if spec.name in existing:
+                if spec.required and bool(existing[spec.name].get("unique")) != spec.unique:
+                    raise RuntimeError(f"Index {collection_name}.{spec.name} exists without the required unique option")
+                continue
+            options = {"name": spec.name, "unique": spec.unique}
+            if spec.partial is not None:
+                options["partialFilterExpression"] = spec.partial
+            try:
+                await db[collection_name].create_index(spec.keys, **options)
+                created += 1
+            except OperationFailure as e:
+                index_report["failed"][f"{collection_name}.{spec.name}"] = str(e)
+                logging.error(f"Index {collection_name}.{spec.name} could not be created: {e}")
+                if spec.required:
+                    raise RuntimeError(f"Required index {collection_name}.{spec.name} could not be created: {e}") from e
+    index_report["created"] += created
+    return created
+
+async def get_index_usage(collection_name: str) -> Optional[dict]:
+    """Operations served by each index since the server started - None where $indexStats is unavailable"""
+    try:
+        return {stats["name"]: stats["accesses"]["ops"] async for stats in db[collection_name].aggregate([{"$indexStats": {}}])}
+    except OperationFailure:
+        return None
+
+async def build_index_report() -> dict:
+    """Declared indexes that are missing, indexes nothing declares, and indexes no query has used"""
+    report = {}
+    for collection_name, specs in MONGO_INDEXES.items():
+        declared = {spec.name for spec in specs}
+        existing = set(await db[collection_name].index_information())
+        usage = await get_index_usage(collection_name)
+        report[collection_name] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared - {"_id_"}),
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_") if usage is not None else None,
+            "usage": usage
+        }
+    return report
+
+async def init_indexes():
+    """Create the declared indexes (only the required ones if MONGO_INDEXES_AUTO_CREATE is off) and log what is still
+    missing - raises, stopping startup, if a required index can't be created"""
+    started = time.monotonic()
+    created = await create_indexes(required_only=not MONGO_INDEXES_AUTO_CREATE)
+    logging.info(f"MongoDB indexes ready: {created} created in {time.monotonic() - started:.2f}s")
+    try:
+        report = await build_index_report()
+    except Exception as e:
+        logging.warning(f"Could not build MongoDB index report: {e}")
+        return
+    for collection_name, collection_report in report.items():
+        if collection_report["missing"]:
+            logging.warning(f"Missing indexes on {collection_name}: {', '.join(collection_report['missing'])}")
+        if collection_report["undeclared"]:
+            logging.info(f"Undeclared indexes on {collection_name}: {', '.join(collection_report['undeclared'])}")
+
+async def backfill_conversation_read_model():
+    """Migration: fill message_count, last message and has_files on conversations created before the read model"""
+    migrated = 0
+    pending = db.conversations.find({"message_count": {"$exists": False}}, {"id": 1, "_id": 0})
+    while True:
+        batch = [conversation["id"] for conversation in await pending.to_list(CONVERSATION_BACKFILL_BATCH)]
+        if not batch:
+            break
+        last_messages = {
+            row["_id"]: row async for row in db.messages.aggregate([
+                {"$match": {"conversation_id": {"$in": batch}}},
+                {"$sort": {"timestamp": 1, "id": 1}},
+                {"$group": {"_id": "$conversation_id", "count": {"$sum": 1}, "content": {"$last": "$content"}, "role": {"$last": "$role"}}}
+            ])
+        }
+        with_files = set(await db.file_uploads.distinct("conversation_id", {"conversation_id": {"$in": batch}}))
+        updates = []
+        for conversation_id in batch:
+            last = last_messages.get(conversation_id)
+            updates.append(UpdateOne({"id": conversation_id, "message_count": {"$exists": False}}, {"$set": {
+                "message_count": last["count"] if last else 0,
+                "last_message_preview": message_preview(last["content"]) if last else None,
+                "last_role": last["role"] if last else None,
+                "has_files": conversation_id in with_files
+            }}))
+        await db.conversations.bulk_write(updates, ordered=False)
+        migrated += len(batch)
+    if migrated:
+        logging.info(f"Conversation read model backfilled for {migrated} conversations")
+
 # Initialize admin user
 async def init_admin():
     """Initialize admin user and update existing users"""
@@ -2271,17 +4581,17 @@ async def google_callback(request: Request, response: Response):
     
     try:
         # Get user data from Emergent Auth
-        async with httpx.AsyncClient() as client:
-            auth_response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            
-            if auth_response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Invalid session")
-            
-            user_data = auth_response.json()
-            
+        http_client = get_provider_client("emergent_auth")
+        auth_response = await http_client.get(
+            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+            headers={"X-Session-ID": session_id}
+        )
+        
+        if auth_response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Invalid session")
+        
+        user_data = auth_response.json()
+        
         # Check if user exists
         existing_user = await db.users.find_one({"email": user_data["email"]})
         
@@ -2367,11 +4677,37 @@ async def get_all_users(admin: dict = Depends(require_admin)):
     users = await db.users.find().sort("created_at", -1).to_list(1000)
     return [UserResponse(**parse_from_mongo(user)) for user in users]
 
+@api_router.get("/admin/providers")
+async def get_provider_health(admin: dict = Depends(require_admin)):
+    """Circuit breaker state for every upstream provider"""
+    return [breaker.snapshot() for breaker in provider_breakers.values()]
+
+@api_router.get("/admin/indexes")
+async def get_index_status(admin: dict = Depends(require_admin)):
+    """Missing, undeclared and unused MongoDB indexes per collection, with per-index usage counts"""
+    return {"collections": await build_index_report(), **index_report}
+
 # Debug Routes
 @api_router.get("/debug/info")
 async def debug_info():
     return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
 
+@api_router.get("/debug/cache-stats")
+async def debug_cache_stats(admin: dict = Depends(require_admin)):
+    """Cache, pool and queue counters for the answer, extraction, upload, message and retrieval paths"""
+    return {
+        "answer_cache": answer_cache.get_stats(),
+        "single_flight": single_flight.stats,
+        "extraction": {**extraction_stats, "pdf_uploads_in_progress": len(pdf_uploads_in_progress)},
+        "blobs": blob_stats,
+        "uploads": get_upload_stats(),
+        "vision": vision_stats,
+        "messages": message_stats,
+        "message_queue": message_queue.get_stats(),
+        "summaries": {**summary_stats, "in_progress": len(file_summaries_in_progress)},
+        "retrieval": {**retrieval_stats, "conversations": len(conversation_indexes)}
+    }
+
 @api_router.post("/debug/test-vision")
 async def test_vision_api(image_data: dict):
     """Test Vision API directly"""
@@ -2398,20 +4734,19 @@ async def test_vision_api(image_data: dict):
             "max_tokens": 100
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30.0
-            )
-            
-            return {
-                "status_code": response.status_code,
-                "response_text": response.text[:500],
-                "headers": dict(response.headers),
-                "emergent_key_prefix": EMERGENT_LLM_KEY[:10] + "..." if EMERGENT_LLM_KEY else "None"
-            }
+        http_client = get_provider_client("openai")
+        response = await http_client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        
+        return {
+            "status_code": response.status_code,
+            "response_text": response.text[:500],
+            "headers": dict(response.headers),
+            "emergent_key_prefix": EMERGENT_LLM_KEY[:10] + "..." if EMERGENT_LLM_KEY else "None"
+        }
     except Exception as e:
         return {"error": str(e), "type": str(type(e))}
 
@@ -2419,10 +4754,70 @@ async def test_vision_api(image_data: dict):
 # Anonymous user - no auth required
 ANONYMOUS_USER_ID = "anonymous"
 
+CONVERSATION_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "title": 1, "created_at": 1, "updated_at": 1, "message_count": 1,
+                       "last_message_preview": 1, "last_role": 1, "has_files": 1}
+MESSAGE_FIELDS = {"_id": 0, "id": 1, "conversation_id": 1, "role": 1, "content": 1, "timestamp": 1}
+
+def encode_page_cursor(document: dict, sort_field: str) -> str:
+    """Opaque cursor pointing at a document's (sort value, id) position"""
+    payload = json.dumps([document[sort_field], document["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_page_cursor(cursor: str) -> tuple:
+    try:
+        value, document_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(value, str) or not isinstance(document_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, document_id
+
+async def fetch_page(collection, query: dict, sort_field: str, direction: int, projection: dict, response: Response,
+                     limit: Optional[int] = None, before: Optional[str] = None, after: Optional[str] = None,
+                     from_end: bool = False) -> list:
+    """One page of a list ordered by (sort_field, id) in `direction`.
+
+    `after` returns the documents following the cursor in list order, `before` the ones preceding it (the `limit`
+    closest to it). Without a cursor the page starts at the top of the list, or at the bottom with `from_end`.
+    Cursors for the neighbouring pages go into the X-Cursor-Before / X-Cursor-After headers. Without limit and
+    cursors the first LIST_MAX_ITEMS are returned, as before pagination existed."""
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    sort = [(sort_field, direction), ("id", direction)]
+    if limit is None and not before and not after:
+        return await collection.find(query, projection).sort(sort).to_list(LIST_MAX_ITEMS)
+    
+    limit = limit or PAGE_SIZE_DEFAULT
+    backwards = bool(before) or (from_end and not after)
+    cursor = before or after
+    if cursor:
+        value, document_id = decode_page_cursor(cursor)
+        # Moving forward in an ascending list, or backwards in a descending one, means larger keys
+        op = "$gt" if (direction == 1) != backwards else "$lt"
+        query = {"$and": [query, {"$or": [{sort_field: {op: value}}, {sort_field: value, "id": {op: document_id}}]}]}
+    scan_sort = [(field, -order) for field, order in sort] if backwards else sort
+    documents = await collection.find(query, projection).sort(scan_sort).limit(limit + 1).to_list(limit + 1)
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    if backwards:
+        documents.reverse()
+    
+    if documents:
+        # The far side of the page has more documents if the scan found one past the limit; the near side has them
+        # whenever the page was reached through a cursor
+        more_before, more_after = (has_more, bool(cursor)) if backwards else (bool(cursor), has_more)
+        if more_before:
+            response.headers["X-Cursor-Before"] = encode_page_cursor(documents[0], sort_field)
+        if more_after:
+            response.headers["X-Cursor-After"] = encode_page_cursor(documents[-1], sort_field)
+    return documents
+
 @api_router.get("/conversations", response_model=List[Conversation])
-async def get_conversations():
-    conversations = await db.conversations.find({"user_id": ANONYMOUS_USER_ID}).sort("updated_at", -1).to_list(1000)
-    return [Conversation(**parse_from_mongo(conv)) for conv in conversations]
+async def get_conversations(response: Response, limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+                            before: Optional[str] = None, after: Optional[str] = None):
+    """Conversations, newest first - paginated with limit/before/after, see fetch_page()"""
+    return await fetch_page(db.conversations, {"user_id": ANONYMOUS_USER_ID}, "updated_at", -1, CONVERSATION_FIELDS,
+                            response, limit, before, after)
 
 @api_router.post("/conversations", response_model=Conversation)
 async def create_conversation(input: ConversationCreate):
@@ -2432,53 +4827,52 @@ async def create_conversation(input: ConversationCreate):
     return conversation
 
 @api_router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
-async def get_messages(conversation_id: str):
+async def get_messages(conversation_id: str, response: Response, limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+                       before: Optional[str] = None, after: Optional[str] = None):
+    """Messages, oldest first - a limit without a cursor returns the latest ones, `before` then pages back in history"""
     # Check if conversation exists for anonymous user
-    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
+    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID}, {"_id": 1})
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = await db.messages.find({"conversation_id": conversation_id}).sort("timestamp", 1).to_list(1000)
-    return [MessageResponse(**parse_from_mongo(msg)) for msg in messages]
+    return await fetch_page(db.messages, {"conversation_id": conversation_id}, "timestamp", 1, MESSAGE_FIELDS,
+                            response, limit, before, after, from_end=True)
 
 @api_router.post("/conversations/{conversation_id}/messages/stream")
-async def send_message_stream(conversation_id: str, input: MessageCreate):
-    """Send message with real-time streaming response"""
+async def send_message_stream(conversation_id: str, input: MessageCreate, stream_protocol: int = STREAM_PROTOCOL_VERSION):
+    """Send message with real-time streaming response (?stream_protocol=1 for the legacy full_content format)"""
     try:
-        # For PRO version, use Novita streaming
-        if input.version == "pro":
-            return StreamingResponse(
-                generate_novita_streaming_response(
-                    question=input.content,
-                    conversation_mode=input.conversationMode,
-                    file_content=getattr(input, 'file_content', None),
-                    file_name=getattr(input, 'file_name', None)
-                ),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Content-Type": "text/event-stream",
-                    "Access-Control-Allow-Origin": "*",
-                }
-            )
-        else:
-            # For FREE version, process normally then stream
-            ai_content = await process_with_ollama_free(input.content, input.conversationMode)
-            return StreamingResponse(
-                generate_streaming_response(ai_content),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Content-Type": "text/event-stream",
-                    "Access-Control-Allow-Origin": "*",
-                }
-            )
+        events = stream_ai_answer_events(
+            question=input.content,
+            version=input.version,
+            conversation_mode=input.conversationMode,
+            file_content=getattr(input, 'file_content', None),
+            file_name=getattr(input, 'file_name', None)
+        )
+        # Persist the exchange when the conversation exists - the stream itself doesn't depend on MongoDB
+        user_message_dict = prepare_for_mongo(Message(conversation_id=conversation_id, role="user", content=input.content).dict())
+        try:
+            conversation = await record_user_message(conversation_id, user_message_dict)
+        except PyMongoError as e:
+            logging.warning(f"Streamed message not persisted: {e}")
+            conversation = None
+        if conversation is not None:
+            first_question = input.content if conversation.get("message_count", 0) == 0 else None
+            events = persist_stream_answer(events, conversation_id, first_question)
+        return StreamingResponse(
+            encode_stream_events(events, stream_protocol),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "Content-Type": "text/event-stream",
+                "Access-Control-Allow-Origin": "*",
+            }
+        )
     except Exception as e:
         logging.error(f"Streaming message error: {e}")
         async def error_stream():
-            yield f"data: {json.dumps({'type': 'error', 'content': 'Bir hata oluştu. Lütfen tekrar deneyin.'})}\n\n"
+            yield SSEStreamEncoder(stream_protocol).event('error', 'Bir hata oluştu. Lütfen tekrar deneyin.')
         
         return StreamingResponse(
             error_stream(),
@@ -2491,38 +4885,321 @@ async def send_message_stream(conversation_id: str, input: MessageCreate):
             }
         )
 
-@api_router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
-async def send_message(conversation_id: str, input: MessageCreate):
-    # Check if conversation exists for anonymous user
-    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+class DbTimer:
+    """Wall-clock time one request spends waiting on MongoDB - overlapping operations are counted once"""
+    
+    def __init__(self):
+        self.seconds = 0.0
+        self.operations = 0
+        self._active = 0
+        self._since = 0.0
+    
+    async def run(self, operation):
+        """Await one database operation (a coroutine) and account for its time"""
+        self.operations += 1
+        if self._active == 0:
+            self._since = time.perf_counter()
+        self._active += 1
+        try:
+            return await operation
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self.seconds += time.perf_counter() - self._since
+
+message_stats = {"messages": 0, "db_seconds": 0.0, "db_operations": 0, "ai_seconds": 0.0, "max_db_ms": 0.0}
+
+def record_message_timing(response: Response, timer: DbTimer, ai_seconds: float, total_seconds: float):
+    """Report a message's DB and AI time in the Server-Timing header and the running totals"""
+    message_stats["messages"] += 1
+    message_stats["db_seconds"] += timer.seconds
+    message_stats["db_operations"] += timer.operations
+    message_stats["ai_seconds"] += ai_seconds
+    message_stats["max_db_ms"] = max(message_stats["max_db_ms"], timer.seconds * 1000)
+    response.headers["Server-Timing"] = (
+        f'db;dur={timer.seconds * 1000:.1f};desc="{timer.operations} ops", '
+        f'ai;dur={ai_seconds * 1000:.1f}, total;dur={total_seconds * 1000:.1f}'
+    )
+
+def _count_journal_lines(journal_path: Path) -> int:
+    if not journal_path.exists():
+        return 0
+    with open(journal_path, "r", encoding="utf-8") as journal:
+        return sum(1 for line in journal if line.strip())
+
+def _read_journal(journal_path: Path) -> list:
+    with open(journal_path, "r", encoding="utf-8") as journal:
+        return [json.loads(line) for line in journal if line.strip()]
+
+def _write_journal_lines(journal_path: Path, entries: list, mode: str):
+    """Append ("a") or write ("w", via a temp file and rename) journal entries and fsync them"""
+    target_path = journal_path.with_name(f"{journal_path.name}.tmp") if mode == "w" else journal_path
+    with open(target_path, mode, encoding="utf-8") as journal:
+        for entry in entries:
+            journal.write(json.dumps(entry) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+    if mode == "w":
+        os.replace(target_path, journal_path)
+
+class MessageWriteQueue:
+    """Write-behind queue for messages and the conversation updates that go with them.
+    
+    put() only appends to memory. A worker writes the queue in ordered insert_many batches of up to
+    MESSAGE_QUEUE_BATCH_SIZE, at most MESSAGE_QUEUE_MAX_AGE after the oldest message was queued, followed by the
+    batch's conversation updates. Batches that fail because MongoDB is unavailable are appended to the journal file;
+    while the journal has entries, new batches go behind them there so the write order is kept, and the journal is
+    replayed every MESSAGE_QUEUE_RETRY_SECONDS (and at startup)."""
+    
+    def __init__(self, journal_path: Path):
+        self.journal_path = journal_path
+        self.entries = []  # Queued, in order: {"message": ..., "conversation_update": ... or None, "queued_at": ...}
+        self.journal_depth = 0
+        self.last_failure = 0.0
+        self.wakeup = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        self.lock = asyncio.Lock()  # One batch in flight at a time
+        self.task = None
+        self.closing = False
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "max_batch": 0, "duplicates_skipped": 0, "rejected": 0,
+                      "journaled": 0, "replayed": 0, "write_failures": 0, "max_depth": 0}
+    
+    def put(self, message: dict, conversation_update: Optional[dict] = None):
+        """Queue a message insert (and the update of its conversation's read model) without waiting for it"""
+        self.entries.append({"message": message, "conversation_update": conversation_update, "queued_at": time.monotonic()})
+        self.stats["queued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self.entries))
+        self.wakeup.set()
+        if len(self.entries) >= MESSAGE_QUEUE_BATCH_SIZE:
+            self.batch_full.set()
+    
+    def get_stats(self) -> dict:
+        oldest = self.entries[0]["queued_at"] if self.entries else None
+        return {
+            **self.stats,
+            "depth": len(self.entries),
+            "journal_depth": self.journal_depth,
+            "oldest_age_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0
+        }
     
-    # Check if this is the first message BEFORE saving it
-    existing_message_count = await db.messages.count_documents({"conversation_id": conversation_id})
-    is_first_message = existing_message_count == 0
+    async def start(self):
+        self.journal_depth = await asyncio.to_thread(_count_journal_lines, self.journal_path)
+        if self.journal_depth:
+            logging.warning(f"Message journal has {self.journal_depth} unwritten messages - replaying")
+            self.wakeup.set()
+        self.task = asyncio.create_task(self.run())
+    
+    async def close(self):
+        """Stop the worker and write (or journal) whatever is still queued"""
+        # A flag rather than task.cancel() - wait_for() can swallow a cancellation that arrives as it times out
+        self.closing = True
+        self.wakeup.set()
+        self.batch_full.set()
+        if self.task is not None:
+            await self.task
+            self.task = None
+        await self.flush()
+    
+    async def run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), MESSAGE_QUEUE_RETRY_SECONDS if self.journal_depth else None)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if len(self.entries) < MESSAGE_QUEUE_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self.batch_full.wait(), MESSAGE_QUEUE_MAX_AGE)
+                except asyncio.TimeoutError:
+                    pass
+            self.batch_full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Message queue flush failed: {e}")
+    
+    async def flush(self):
+        """Write everything queued so far - the journal first, so nothing overtakes older messages"""
+        async with self.lock:
+            if self.journal_depth and not await self._replay_journal():
+                await self._append_journal(self._take(len(self.entries)))
+                return
+            while self.entries:
+                batch = self._take(MESSAGE_QUEUE_BATCH_SIZE)
+                try:
+                    await self._write_isolated(batch)
+                except Exception as e:
+                    # Nothing taken off the queue may be lost - it is journaled and replayed
+                    self._write_failed(e)
+                    await self._append_journal(batch + self._take(len(self.entries)))
+                    return
     
-    # Save user message
+    async def discard(self, conversation_id: str):
+        """Drop the queued and journaled messages of a deleted conversation, after any batch already writing them"""
+        self.entries = [entry for entry in self.entries if entry["message"]["conversation_id"] != conversation_id]
+        async with self.lock:
+            self.entries = [entry for entry in self.entries if entry["message"]["conversation_id"] != conversation_id]
+            if not self.journal_depth:
+                return
+            journaled = await asyncio.to_thread(_read_journal, self.journal_path)
+            kept = [entry for entry in journaled if entry["message"]["conversation_id"] != conversation_id]
+            if not kept:
+                await asyncio.to_thread(self.journal_path.unlink)
+            elif len(kept) < len(journaled):
+                await asyncio.to_thread(_write_journal_lines, self.journal_path, kept, "w")
+            self.journal_depth = len(kept)
+    
+    def _take(self, count: int) -> list:
+        batch = self.entries[:count]
+        del self.entries[:count]
+        return batch
+    
+    def _write_failed(self, error: Exception):
+        self.stats["write_failures"] += 1
+        self.last_failure = time.monotonic()
+        logging.error(f"Message batch could not be written, journaling it: {error}")
+    
+    async def _write_isolated(self, batch: list):
+        """_write(), dropping only the messages that can never be written (e.g. too large to encode as BSON) -
+        MongoDB errors propagate so the batch is journaled; writing it again later is a no-op for what got through"""
+        try:
+            await self._write(batch)
+        except PyMongoError:
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats["rejected"] += 1
+                logging.error(f"Message {batch[0]['message'].get('id')} dropped, it cannot be written: {e}")
+                return
+            for entry in batch:
+                await self._write_isolated([entry])
+    
+    async def _write(self, batch: list):
+        # Copies - insert_many adds an ObjectId _id, which the journal couldn't store
+        messages = [dict(entry["message"]) for entry in batch]
+        offset = 0
+        while offset < len(messages):
+            try:
+                await db.messages.insert_many(messages[offset:], ordered=True)
+                break
+            except BulkWriteError as e:
+                error = e.details["writeErrors"][0]
+                if error["code"] == 11000:
+                    # Written by an earlier attempt that failed half-way (replayed from the journal)
+                    self.stats["duplicates_skipped"] += 1
+                else:
+                    self.stats["rejected"] += 1
+                    logging.error(f"Message {messages[offset + error['index']].get('id')} rejected by MongoDB: {error.get('errmsg')}")
+                offset += error["index"] + 1
+        
+        # Idempotent, so a batch replayed after failing half-way doesn't count its messages twice
+        updates = [
+            conversation_update_once(entry["message"], entry["conversation_update"])
+            for entry in batch if entry["conversation_update"]
+        ]
+        if updates:
+            await db.conversations.bulk_write(updates, ordered=True)
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+    
+    async def _append_journal(self, batch: list):
+        if not batch:
+            return
+        entries = [{"message": entry["message"], "conversation_update": entry["conversation_update"]} for entry in batch]
+        try:
+            await asyncio.to_thread(_write_journal_lines, self.journal_path, entries, "a")
+        except OSError:
+            # Back to the front of the queue rather than lost
+            self.entries[:0] = batch
+            raise
+        self.journal_depth += len(batch)
+        self.stats["journaled"] += len(batch)
+    
+    async def _replay_journal(self) -> bool:
+        """Write the journal in batches - returns False (keeping what is left) if MongoDB is still unavailable"""
+        if time.monotonic() - self.last_failure < MESSAGE_QUEUE_RETRY_SECONDS:
+            return False
+        journaled = await asyncio.to_thread(_read_journal, self.journal_path)
+        written = 0
+        try:
+            while written < len(journaled):
+                batch = journaled[written:written + MESSAGE_QUEUE_BATCH_SIZE]
+                await self._write_isolated(batch)
+                written += len(batch)
+        except Exception as e:
+            self._write_failed(e)
+            # Keep the unwritten rest; the written prefix must not be replayed again
+            await asyncio.to_thread(_write_journal_lines, self.journal_path, journaled[written:], "w")
+            return False
+        finally:
+            self.stats["replayed"] += written
+            self.journal_depth = len(journaled) - written
+        await asyncio.to_thread(self.journal_path.unlink)
+        logging.info(f"Message journal replayed: {written} messages written")
+        return True
+
+message_queue = MessageWriteQueue(MESSAGE_JOURNAL_PATH)
+
+async def record_user_message(conversation_id: str, user_message_dict: dict) -> Optional[dict]:
+    """Count a user message on its conversation and queue its insert - returns the conversation as it was before,
+    so callers know whether this is the first message, or None if the conversation doesn't exist"""
+    conversation = await db.conversations.find_one_and_update(
+        {"id": conversation_id, "user_id": ANONYMOUS_USER_ID},
+        conversation_message_update(user_message_dict),
+        projection={"message_count": 1, "_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if conversation is not None:
+        message_queue.put(user_message_dict)
+    return conversation
+
+def queue_answer(conversation_id: str, content: str, first_question: Optional[str] = None) -> Message:
+    """Queue an assistant message with its conversation update - the title is generated from the first question"""
+    ai_message = Message(
+        conversation_id=conversation_id,
+        role="assistant",
+        content=content
+    )
+    ai_message_dict = prepare_for_mongo(ai_message.dict())
+    conversation_update = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    if first_question is not None:
+        # Generate meaningful title using the new function
+        conversation_update["title"] = generate_conversation_title(first_question)
+        logging.info(f"Generated new title for conversation {conversation_id}: {conversation_update['title']}")
+    message_queue.put(ai_message_dict, conversation_message_update(ai_message_dict, **conversation_update))
+    return ai_message
+
+async def persist_stream_answer(events, conversation_id: str, first_question: Optional[str]):
+    """Pass stream events through, queueing the answer once the stream completes"""
+    async for event_type, content in events:
+        if event_type == 'complete':
+            queue_answer(conversation_id, content, first_question)
+        yield event_type, content
+
+@api_router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
+async def send_message(conversation_id: str, input: MessageCreate, response: Response):
+    """Answer a message - both messages, the title and the read model are written behind the response by
+    message_queue. DB and AI time go into the Server-Timing header"""
+    started = time.perf_counter()
+    timer = DbTimer()
     user_message = Message(
         conversation_id=conversation_id,
         role="user",
         content=input.content
     )
     user_message_dict = prepare_for_mongo(user_message.dict())
-    await db.messages.insert_one(user_message_dict)
-    
-    # Update conversation title if this is the first message
-    if is_first_message:
-        # Generate meaningful title using the new function
-        new_title = generate_conversation_title(input.content)
-        logging.info(f"Generated new title for conversation {conversation_id}: {new_title}")
-            
-        # Update conversation title
-        await db.conversations.update_one(
-            {"id": conversation_id},
-            {"$set": {"title": new_title, "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+    # Recording the user message on the conversation also checks it exists and tells whether this is the first
+    # message; it runs together with the lookup of the most recent uploaded file
+    conversation, recent_file = await asyncio.gather(
+        timer.run(record_user_message(conversation_id, user_message_dict)),
+        timer.run(db.file_uploads.find_one({"conversation_id": conversation_id}, sort=[("uploaded_at", -1)]))
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    is_first_message = conversation.get("message_count", 0) == 0
     
+    ai_started = time.perf_counter()
     try:
         # SMART HYBRID SYSTEM: Quick analysis and intelligent routing
         logging.info(f"Using SMART HYBRID SYSTEM for question: {input.content}")
@@ -2533,13 +5210,7 @@ async def send_message(conversation_id: str, input: MessageCreate):
         file_path = None
         file_type = None
         
-        # Always check for uploaded files in the conversation
-        # Get the most recent uploaded file for this conversation
-        recent_file = await db.file_uploads.find_one(
-            {"conversation_id": conversation_id},
-            sort=[("uploaded_at", -1)]
-        )
-        
+        # Always check for uploaded files in the conversation - the most recent one was fetched above
         if recent_file and os.path.exists(recent_file["file_path"]):
             file_path = recent_file["file_path"]
             file_name = recent_file["file_name"]
@@ -2548,11 +5219,11 @@ async def send_message(conversation_id: str, input: MessageCreate):
             # For images, always use ChatGPT Vision when there's an uploaded image
             if file_type in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
                 logging.info(f"Uploaded image detected, using ChatGPT Vision: {file_name}")
-                ai_content = await process_image_with_chatgpt_vision(input.content, file_path, file_name)
+                ai_content = await process_image_with_chatgpt_vision(input.content, file_path, file_name, recent_file.get("content_hash"))
                 processed = True
             else:
-                # Extract text from non-image files and include context
-                file_content = await extract_text_from_file(file_path, file_type)
+                # Best passages for the question across every document uploaded to this conversation
+                file_content, file_name = await get_conversation_file_context(conversation_id, recent_file, input.content)
                 logging.info(f"Uploaded file detected, using file for context: {file_name}")
                 processed = False
         else:
@@ -2562,35 +5233,19 @@ async def send_message(conversation_id: str, input: MessageCreate):
         # Only process with hybrid system if not already processed (e.g., not an image)
         if not processed:
             # Check version and route accordingly
-            if input.version == "free":
-                logging.info("FREE version selected - using Ollama AnythingLLM")
-                ai_content = await process_with_ollama_free(input.content, input.conversationMode, file_content, file_name)
-            else:
-                # PRO version - use simple system: Current topics → Web Search, Others → AnythingLLM → GPT-5-nano
-                logging.info("PRO version selected - using simple system")
-                ai_content = await simple_pro_system(input.content, input.conversationMode, file_content, file_name)
+            ai_content = await generate_ai_answer(input.content, input.version, input.conversationMode, file_content, file_name)
         
             logging.info("AI processing completed successfully")
                 
     except Exception as e:
         logging.error(f"Smart hybrid system error: {e}")
         ai_content = "Üzgünüm, şu anda teknik bir sorun yaşıyorum. Lütfen sorunuzu tekrar deneyin."
+    ai_seconds = time.perf_counter() - ai_started
     
     # Save AI response
-    ai_message = Message(
-        conversation_id=conversation_id,
-        role="assistant",
-        content=ai_content
-    )
-    ai_message_dict = prepare_for_mongo(ai_message.dict())
-    await db.messages.insert_one(ai_message_dict)
-    
-    # Update conversation timestamp
-    await db.conversations.update_one(
-        {"id": conversation_id},
-        {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
+    ai_message = queue_answer(conversation_id, ai_content, input.content if is_first_message else None)
     
+    record_message_timing(response, timer, ai_seconds, time.perf_counter() - started)
     return MessageResponse(**ai_message.dict())
 
 @api_router.delete("/conversations/{conversation_id}")
@@ -2601,56 +5256,61 @@ async def delete_conversation(conversation_id: str):
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     # Delete conversation and associated messages
+    await message_queue.discard(conversation_id)
     await db.conversations.delete_one({"id": conversation_id})
     await db.messages.delete_many({"conversation_id": conversation_id})
     
     # Delete associated uploaded files
+    file_records = await db.file_uploads.find({"conversation_id": conversation_id}).to_list(None)
+    cancel_file_summaries([file_record["id"] for file_record in file_records])
     await db.file_uploads.delete_many({"conversation_id": conversation_id})
+    # Their part directories are swept by the blob GC
+    await db.upload_sessions.delete_many({"conversation_id": conversation_id})
+    drop_from_conversation_index(conversation_id)
+    await release_upload_storage(file_records)
     
     return {"message": "Conversation deleted successfully"}
 
-@api_router.post("/conversations/{conversation_id}/upload")
-async def upload_file(
-    conversation_id: str,
-    file: UploadFile = File(...),
-):
-    # Check if conversation exists for anonymous user
-    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    # Check file size
-    if file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024*1024):.1f}MB")
-    
-    # Check file type
-    file_type = get_file_type(file.filename)
-    allowed_types = ['pdf', 'xlsx', 'xls', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
-    if file_type not in allowed_types:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(allowed_types)}")
-    
+async def register_uploaded_file(conversation_id: str, file_name: str, file_type: str, file_path: str, content_hash: str, file_size: int) -> dict:
+    """Turn a stored blob into a file_uploads record with its extracted text, retrieval index and chat notice -
+    the blob reference is released if no record ends up holding it"""
+    pdf_extraction = None
+    record_saved = False
     try:
-        # Create unique filename
-        unique_filename = f"{uuid4()}_{file.filename}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Extract text once and persist it, so messages about this file read the cache instead of re-parsing.
+        # Long PDFs become usable after their first pages, the rest is extracted in the background
+        file_id = str(uuid.uuid4())
+        extracted_text, extraction_fields, pdf_extraction = await start_upload_extraction(file_id, file_name, file_path, file_type, content_hash)
+        
+        # Long documents are summarized in the background - identical content reuses the stored summary
+        summary_fields = {}
+        if wants_document_summary(file_type, extracted_text, pdf_extraction is not None):
+            shared_summary = await read_document_summary(content_hash)
+            if shared_summary is not None:
+                summary_stats["shared_hits"] += 1
+                summary_fields = {"summary_status": "ready", "summary": shared_summary["document"]}
+            else:
+                summary_fields = {"summary_status": "pending"}
         
+        system_message_id = str(uuid.uuid4())
         # Save file info to database
         file_upload = FileUpload(
+            id=file_id,
             conversation_id=conversation_id,
-            file_name=file.filename,
+            file_name=file_name,
             file_type=file_type,
-            file_path=str(file_path)
+            file_path=file_path,
+            summary_notice_id=system_message_id if summary_fields else None,
+            **extraction_fields,
+            **summary_fields
         )
         
         file_dict = prepare_for_mongo(file_upload.dict())
         await db.file_uploads.insert_one(file_dict)
-        
-        # Extract text from file
-        extracted_text = await extract_text_from_file(str(file_path), file_type)
+        record_saved = True
+        await add_file_to_conversation_index(conversation_id, file_dict, extracted_text)
+        if pdf_extraction is not None:
+            pdf_extraction.finisher = asyncio.create_task(pdf_extraction.finish(conversation_id, file_dict))
         
         # Auto-generate a system message about the uploaded file
         if file_type in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
@@ -2660,36 +5320,231 @@ async def upload_file(
             file_icon = "📎"
             file_description = "Bu dosya hakkında soru sorabilir, özet çıkartabilir, çeviri yaptırabilir veya analiz edebilirsiniz."
         
+        content = f"{file_icon} **{file_name}** dosyası başarıyla yüklendi!\n\nDosya türü: {file_type.upper()}\nDosya boyutu: {file_size / 1024:.1f} KB\n\n{file_description}"
+        if file_upload.summary_status == "pending":
+            content += f"\n\n{SUMMARY_PENDING_NOTE}"
+        elif file_upload.summary_status == "ready":
+            content += f"\n\n{SUMMARY_READY_NOTE}"
         system_message = Message(
+            id=system_message_id,
             conversation_id=conversation_id,
             role="assistant",
-            content=f"{file_icon} **{file.filename}** dosyası başarıyla yüklendi!\n\nDosya türü: {file_type.upper()}\nDosya boyutu: {file.size / 1024:.1f} KB\n\n{file_description}"
+            content=content
         )
         
         system_message_dict = prepare_for_mongo(system_message.dict())
         await db.messages.insert_one(system_message_dict)
+        if file_upload.summary_status == "pending":
+            start_file_summary(file_dict, extracted_text, pdf_extraction)
         
-        # Update conversation timestamp
+        # Update conversation timestamp and read model
         await db.conversations.update_one(
             {"id": conversation_id},
-            {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+            conversation_message_update(system_message_dict, has_files=True, updated_at=datetime.now(timezone.utc).isoformat())
         )
         
         return {
             "message": "File uploaded successfully",
             "file_id": file_upload.id,
-            "file_name": file.filename,
+            "file_name": file_name,
             "file_type": file_type,
+            "summary_status": file_upload.summary_status,
             "system_message": system_message.dict()
         }
-        
+    except Exception:
+        if pdf_extraction is not None and pdf_extraction.finisher is None:
+            pdf_extraction.cancel()
+        if not record_saved:
+            await release_blob(content_hash)
+        raise
+
+@api_router.post("/conversations/{conversation_id}/upload")
+async def upload_file(
+    conversation_id: str,
+    file: UploadFile = File(...),
+):
+    # Check if conversation exists for anonymous user
+    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Reject early when the size is known - the limit is enforced again while the upload is stored
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024*1024):.1f}MB")
+    
+    # Check file type
+    file_type = get_file_type(file.filename)
+    if file_type not in ALLOWED_FILE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_FILE_TYPES)}")
+    
+    try:
+        # Store by content - identical uploads share one file on disk and its extracted text
+        file_path, content_hash, file_size = await store_upload_blob(file, file_type)
+        return await register_uploaded_file(conversation_id, file.filename, file_type, file_path, content_hash, file_size)
+    except UploadRejectedError as e:
+        logging.warning(f"Upload rejected ({file.filename}): {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logging.error(f"File upload error: {e}")
-        # Clean up file if it was created
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
+def upload_session_response(session: dict) -> dict:
+    return {
+        "upload_id": session["id"],
+        "file_name": session["file_name"],
+        "file_size": session["file_size"],
+        "part_size": session["part_size"],
+        "part_count": session["part_count"],
+        "received_parts": sorted(int(part_number) for part_number in session["parts"]),
+        "status": session["status"],
+        "expires_at": session["expires_at"]
+    }
+
+async def get_upload_session(conversation_id: str, upload_id: str) -> dict:
+    session = await db.upload_sessions.find_one({"id": upload_id, "conversation_id": conversation_id}, {"_id": 0})
+    if not session or session["expires_at"] < datetime.now(timezone.utc).isoformat():
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session
+
+@api_router.post("/conversations/{conversation_id}/uploads")
+async def create_upload_session(conversation_id: str, request: UploadSessionCreate):
+    """Start a resumable upload - the file is then sent as part_count parts of part_size bytes (the last one shorter)"""
+    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    file_type = get_file_type(request.file_name)
+    if file_type not in ALLOWED_FILE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_FILE_TYPES)}")
+    if request.file_size < 1:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if request.file_size > MAX_RESUMABLE_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_RESUMABLE_FILE_SIZE / (1024*1024):.1f}MB")
+    part_size = request.part_size or UPLOAD_PART_SIZE
+    if not UPLOAD_PART_SIZE_RANGE[0] <= part_size <= UPLOAD_PART_SIZE_RANGE[1]:
+        raise HTTPException(status_code=400, detail=f"Part size must be between {UPLOAD_PART_SIZE_RANGE[0]} and {UPLOAD_PART_SIZE_RANGE[1]} bytes")
+    
+    now = datetime.now(timezone.utc)
+    session = {
+        "id": str(uuid.uuid4()),
+        "conversation_id": conversation_id,
+        "file_name": request.file_name,
+        "file_type": file_type,
+        "file_size": request.file_size,
+        "part_size": part_size,
+        "part_count": -(-request.file_size // part_size),
+        "parts": {},
+        "status": "open",
+        "created_at": now.isoformat(),
+        "expires_at": (now + timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)).isoformat()
+    }
+    await asyncio.to_thread((UPLOAD_PARTS_DIR / session["id"]).mkdir)
+    await db.upload_sessions.insert_one(dict(session))
+    upload_stats["sessions"] += 1
+    return upload_session_response(session)
+
+@api_router.get("/conversations/{conversation_id}/uploads/{upload_id}")
+async def get_upload_session_status(conversation_id: str, upload_id: str):
+    """Which parts the server already has - a client resuming an upload only sends the rest"""
+    return upload_session_response(await get_upload_session(conversation_id, upload_id))
+
+async def part_arrived_too_late(upload_id: str) -> HTTPException:
+    """The error for a part whose session directory disappeared while it was being stored"""
+    session = await db.upload_sessions.find_one({"id": upload_id}, {"status": 1, "_id": 0})
+    if session and session["status"] != "open":
+        return HTTPException(status_code=409, detail="Upload is already being completed")
+    return HTTPException(status_code=404, detail="Upload session not found or expired")
+
+@api_router.put("/conversations/{conversation_id}/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(conversation_id: str, upload_id: str, part_number: int, request: Request):
+    """Store one part from the raw request body - parts may arrive in any order and in parallel, re-sending one replaces it"""
+    session = await get_upload_session(conversation_id, upload_id)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    if not 0 <= part_number < session["part_count"]:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 0 and {session['part_count'] - 1}")
+    part_size = upload_part_size(session, part_number)
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length != str(part_size):
+        raise HTTPException(status_code=400, detail=f"Part {part_number} must be {part_size} bytes")
+    
+    part_path = upload_part_path(upload_id, part_number)
+    tmp_path = part_path.with_name(f"{part_number}.{uuid.uuid4().hex}.tmp")
+    try:
+        # The first part carries the file signature
+        part_hash, size = await write_chunks_to_file(request.stream(), tmp_path, part_size, session["file_type"] if part_number == 0 else None)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except FileNotFoundError:
+        # The session was aborted, expired or started completing (parts moved aside) while the part was on its way
+        raise await part_arrived_too_late(upload_id)
+    if size != part_size:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        raise HTTPException(status_code=400, detail=f"Part {part_number} must be {part_size} bytes, got {size}")
+    try:
+        # Fails once a completion has moved the parts directory aside, so assembly never sees a part change under it
+        await asyncio.to_thread(os.replace, tmp_path, part_path)
+    except FileNotFoundError:
+        raise await part_arrived_too_late(upload_id)
+    
+    upload_stats["parts"] += 1
+    await db.upload_sessions.update_one(
+        {"id": upload_id},
+        {"$set": {
+            f"parts.{part_number}": {"size": size, "sha256": part_hash},
+            "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)).isoformat()
+        }}
+    )
+    return {"upload_id": upload_id, "part_number": part_number, "size": size, "sha256": part_hash}
+
+@api_router.post("/conversations/{conversation_id}/uploads/{upload_id}/complete")
+async def complete_upload_session(conversation_id: str, upload_id: str):
+    """Assemble the parts into one stored file and register it like a single-shot upload - safe to retry"""
+    session = await get_upload_session(conversation_id, upload_id)
+    if session["status"] == "completed":
+        return session["result"]
+    missing_parts = [part_number for part_number in range(session["part_count"]) if str(part_number) not in session["parts"]]
+    if missing_parts:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {', '.join(map(str, missing_parts[:20]))}")
+    
+    # Only one request assembles the file - concurrent retries get 409 until it is done, or until the claim goes stale
+    # because the process holding it crashed
+    completing_since = datetime.now(timezone.utc).isoformat()
+    claimed = await db.upload_sessions.update_one(
+        {"id": upload_id, "$or": [{"status": "open"}, stale_completion_filter()]},
+        {"$set": {"status": "completing", "completing_since": completing_since}}
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    claim = {"id": upload_id, "status": "completing", "completing_since": completing_since}
+    
+    try:
+        tmp_path, content_hash, size = await asyncio.to_thread(_assemble_upload_parts, upload_id, session["part_count"])
+        file_path = await commit_upload_blob(tmp_path, content_hash, size)
+        result = await register_uploaded_file(conversation_id, session["file_name"], session["file_type"], file_path, content_hash, size)
+    except Exception as e:
+        await asyncio.to_thread(_restore_upload_parts, upload_id)
+        await db.upload_sessions.update_one(claim, {"$set": {"status": "open"}, "$unset": {"completing_since": ""}})
+        logging.error(f"Upload completion error ({session['file_name']}): {e}")
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+    
+    finished = await db.upload_sessions.update_one(
+        claim, {"$set": {"status": "completed", "result": result, "parts": {}}, "$unset": {"completing_since": ""}}
+    )
+    if not finished.modified_count:
+        logging.warning(f"Upload {upload_id} completed after its claim went stale - raise UPLOAD_COMPLETION_TIMEOUT_SECONDS")
+    await asyncio.to_thread(_remove_upload_parts, upload_id)
+    return result
+
+@api_router.delete("/conversations/{conversation_id}/uploads/{upload_id}")
+async def abort_upload_session(conversation_id: str, upload_id: str):
+    await get_upload_session(conversation_id, upload_id)
+    result = await db.upload_sessions.delete_one({"id": upload_id, "status": {"$ne": "completing"}})
+    if not result.deleted_count:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    await asyncio.to_thread(_remove_upload_parts, upload_id)
+    return {"message": "Upload aborted"}
+
 @api_router.get("/conversations/{conversation_id}/files")
 async def get_uploaded_files(conversation_id: str):
     # Check if conversation exists for anonymous user
@@ -2705,11 +5560,50 @@ async def get_uploaded_files(conversation_id: str):
             "id": file["id"],
             "file_name": file["file_name"],
             "file_type": file["file_type"],
+            "summary_status": file.get("summary_status"),
             "uploaded_at": file["uploaded_at"]
         }
         for file in files
     ]
 
+@api_router.get("/conversations/{conversation_id}/files/{file_id}/summary")
+async def get_file_summary(conversation_id: str, file_id: str):
+    """Background summary of an uploaded document - status is pending until it is ready"""
+    file_record = await db.file_uploads.find_one({"id": file_id, "conversation_id": conversation_id}, {"_id": 0})
+    if not file_record:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    summary = await read_document_summary(file_record.get("content_hash")) if file_record.get("summary_status") == "ready" else None
+    return {
+        "file_id": file_id,
+        "status": file_record.get("summary_status"),
+        "summary": summary["document"] if summary else None,
+        "sections": summary["sections"] if summary else []
+    }
+
+@api_router.delete("/conversations/{conversation_id}/files/{file_id}")
+async def delete_uploaded_file(conversation_id: str, file_id: str):
+    # Check if conversation exists for anonymous user
+    conversation = await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    file_record = await db.file_uploads.find_one({"id": file_id, "conversation_id": conversation_id})
+    if not file_record:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    in_progress = pdf_uploads_in_progress.get(file_id)
+    if in_progress is not None:
+        in_progress.cancel()
+    cancel_file_summaries([file_id])
+    await db.file_uploads.delete_one({"id": file_id})
+    remaining_file = await db.file_uploads.find_one({"conversation_id": conversation_id}, {"_id": 1})
+    await db.conversations.update_one({"id": conversation_id}, {"$set": {"has_files": remaining_file is not None}})
+    drop_from_conversation_index(conversation_id, file_id)
+    await release_upload_storage([file_record])
+    
+    return {"message": "File deleted successfully"}
+
 # Report endpoints
 @api_router.post("/reports", response_model=ReportResponse)
 async def create_report(input: ReportCreate, user: dict = Depends(require_auth)):
@@ -2757,6 +5651,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=PAGE_CURSOR_HEADERS + ["Server-Timing"],
 )
 
 # Configure logging
@@ -2768,8 +5663,23 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    await init_provider_clients()
+    init_extraction_executor()
+    await init_indexes()
+    await backfill_conversation_read_model()
+    await message_queue.start()
+    await init_blob_store()
+    await init_file_summaries()
     await init_admin()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await close_provider_clients()
+    shutdown_extraction_executor()
+    if blob_gc_task is not None:
+        blob_gc_task.cancel()
+    # Interrupted summaries stay pending and restart with the next startup
+    cancel_file_summaries(list(file_summaries_in_progress))
+    # Queued messages are written, or journaled if MongoDB is unavailable
+    await message_queue.close()
     client.close()
\ No newline at end of file
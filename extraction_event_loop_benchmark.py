@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark event-loop lag while large documents are being extracted.
+
+A ticker coroutine sleeps 10 ms in a loop and records how late it wakes up -
+that lateness is what every other request and SSE stream on the worker sees.
+Compares the old inline extraction (PyPDF2/openpyxl/python-docx called on the
+event loop) with extract_text_from_file() running in the extraction pool.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+import openpyxl  # noqa: E402
+from docx import Document  # noqa: E402
+
+from server import (  # noqa: E402
+    _extract_text_sync, extract_text_from_file, init_extraction_executor,
+    shutdown_extraction_executor, EXTRACTION_POOL_WORKERS
+)
+
+TICK_SECONDS = 0.01
+LINE = "Bilgin benchmark satiri - Ankara Istanbul Izmir 1234567890 lorem ipsum dolor sit amet"
+
+
+def make_pdf(path: Path, page_count: int, lines_per_page: int = 45):
+    """Write a plain-text PDF with page_count pages (no PDF library needed)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_number in range(page_count):
+        lines = "".join(f"({LINE} {page_number}-{line_number}) Tj T* " for line_number in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {lines}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, page_count)
+
+    with open(path, "wb") as pdf:
+        pdf.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(pdf.tell())
+            pdf.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref_offset = pdf.tell()
+        pdf.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            pdf.write(b"%010d 00000 n \n" % offset)
+        pdf.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+def make_xlsx(path: Path, row_count: int):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in range(row_count):
+        sheet.append([row, f"Urun {row}", row * 1.5, "Ankara", row % 7, "aktif"])
+    workbook.save(path)
+
+
+def make_docx(path: Path, paragraph_count: int):
+    document = Document()
+    for paragraph in range(paragraph_count):
+        document.add_paragraph(f"{LINE} {paragraph}")
+    document.save(path)
+
+
+async def measure_lag(extract, documents: list) -> dict:
+    """Run extract over all documents concurrently while sampling event-loop lag"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS * 2)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(extract(str(path), file_type) for path, file_type in documents))
+    wall_seconds = time.perf_counter() - started
+    done.set()
+    await ticker_task
+
+    return {
+        "wall_seconds": wall_seconds,
+        "chars": sum(len(text) for text in results),
+        "max_lag_ms": max(lags),
+        "p99_lag_ms": sorted(lags)[min(len(lags) - 1, int(len(lags) * 0.99))],
+        "ticks": len(lags),
+    }
+
+
+async def extract_inline(file_path: str, file_type: str) -> str:
+    """The pre-pool behaviour: blocking extraction straight on the event loop"""
+    return _extract_text_sync(file_path, file_type)
+
+
+async def run_benchmark():
+    print("📊 EXTRACTION EVENT-LOOP LAG BENCHMARK")
+    print(f"   extraction pool workers: {EXTRACTION_POOL_WORKERS}")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        make_pdf(tmp_dir / "big.pdf", 400)
+        make_xlsx(tmp_dir / "big.xlsx", 40000)
+        make_docx(tmp_dir / "big.docx", 15000)
+        documents = [(tmp_dir / "big.pdf", "pdf"), (tmp_dir / "big.xlsx", "xlsx"), (tmp_dir / "big.docx", "docx")]
+        for path, _ in documents:
+            print(f"   {path.name}: {path.stat().st_size / (1024 * 1024):.1f} MB")
+
+        # Start the workers first so the pool scenario measures extraction, not process start-up
+        (tmp_dir / "warmup.txt").write_text(LINE, encoding="utf-8")
+        init_extraction_executor()
+        await extract_text_from_file(str(tmp_dir / "warmup.txt"), "txt")
+
+        for name, extract in (("inline (event loop)", extract_inline), ("extraction pool", extract_text_from_file)):
+            result = await measure_lag(extract, documents)
+            print(f"\n🧪 {name}")
+            print(f"   wall time {result['wall_seconds']:.2f}s, {result['chars'] / 1024:.0f} KB text")
+            print(f"   event-loop lag: max {result['max_lag_ms']:.0f} ms, p99 {result['p99_lag_ms']:.0f} ms over {result['ticks']} ticks")
+
+        shutdown_extraction_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunked TF-IDF retrieval over uploaded documents.
+
+For a long report (~300 pages), a large spreadsheet, and a conversation holding
+both, measures index build time, per-question selection latency, and prompt
+tokens sent with the whole file(s) vs. only the selected chunks. Each question
+targets a planted fact, so the benchmark also checks that retrieval finds it.
+"""
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from server import (  # noqa: E402
+    FileChunkIndex, ConversationIndex, estimate_tokens, FILE_CONTEXT_TOKEN_BUDGET, FILE_RETRIEVAL_TOP_K
+)
+
+FILLER_WORDS = (
+    "rapor proje bütçe toplantı müşteri hizmet süreç analiz yönetim planlama kalite satış "
+    "pazarlama personel eğitim sistem teknik destek operasyon strateji hedef performans"
+).split()
+
+
+def make_report(page_count: int = 300, paragraphs_per_page: int = 6) -> str:
+    random.seed(7)
+    pages = []
+    for page in range(page_count):
+        paragraphs = [
+            " ".join(random.choice(FILLER_WORDS) for _ in range(60)) + "."
+            for _ in range(paragraphs_per_page)
+        ]
+        pages.append(f"Sayfa {page + 1}\n" + "\n".join(paragraphs))
+    pages[42] += "\nDeprem yönetmeliği kapsamında kolon donatı oranı yüzde 1.2 olarak belirlenmiştir."
+    pages[217] += "\nŞirketin İzmir şubesi 2019 yılında Karşıyaka'da açılmıştır."
+    return "\n".join(pages)
+
+
+def make_spreadsheet(row_count: int = 60000) -> str:
+    random.seed(11)
+    cities = ["Ankara", "İstanbul", "İzmir", "Bursa", "Antalya", "Konya"]
+    rows = ["--- Satışlar ---", "Sipariş\tŞehir\tÜrün\tAdet\tTutar"]
+    for row in range(row_count):
+        rows.append(f"{row}\t{random.choice(cities)}\tÜrün-{row % 500}\t{row % 17}\t{row * 3.5:.2f}")
+    rows[31337] = "31337\tTrabzon\tFındık ezmesi\t99\t12345.00"
+    return "\n".join(rows)
+
+
+REPORT = ("rapor.pdf", make_report())
+SPREADSHEET = ("satislar.xlsx", make_spreadsheet())
+REPORT_QUESTIONS = [("kolon donatı oranı kaç olmalı", "yüzde 1.2"), ("İzmir şubesi ne zaman açıldı", "Karşıyaka")]
+SPREADSHEET_QUESTIONS = [("Trabzon fındık ezmesi siparişi", "Fındık ezmesi")]
+
+SCENARIOS = {
+    "300-page report": ([REPORT], REPORT_QUESTIONS),
+    "60k-row spreadsheet": ([SPREADSHEET], SPREADSHEET_QUESTIONS),
+    "conversation with both files": ([REPORT, SPREADSHEET], REPORT_QUESTIONS + SPREADSHEET_QUESTIONS),
+}
+
+
+def run_benchmark():
+    print("📊 FILE RETRIEVAL BENCHMARK")
+    print(f"   token budget {FILE_CONTEXT_TOKEN_BUDGET}, top-k {FILE_RETRIEVAL_TOP_K}")
+    print("=" * 80)
+
+    for name, (files, questions) in SCENARIOS.items():
+        started = time.perf_counter()
+        index = ConversationIndex()
+        for file_name, text in files:
+            index.add_file({"id": file_name, "file_name": file_name}, FileChunkIndex(text))
+        build_ms = (time.perf_counter() - started) * 1000
+        total_chars = sum(len(text) for _, text in files)
+        whole_tokens = sum(estimate_tokens(text) for _, text in files)
+        print(f"\n🧪 {name}: {total_chars / (1024 * 1024):.1f} MB, ~{whole_tokens} tokens, {index.chunk_count} chunks (indexed in {build_ms:.0f} ms)")
+
+        for question, expected in questions:
+            # The first select after indexing also computes the conversation's TF-IDF weights
+            rounds = 20
+            started = time.perf_counter()
+            for _ in range(rounds):
+                chunk_refs = index.select(question, FILE_CONTEXT_TOKEN_BUDGET, FILE_RETRIEVAL_TOP_K)
+                context = index.render(chunk_refs)
+            select_ms = (time.perf_counter() - started) * 1000 / rounds
+            context_tokens = estimate_tokens(context)
+            found = "✅" if expected in context else "❌"
+            print(f"   {found} '{question}': {select_ms:.1f} ms, ~{context_tokens} tokens "
+                  f"({whole_tokens / context_tokens:.0f}x fewer than sending everything)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -19,6 +19,63 @@ axios.defaults.headers.common['Content-Type'] = 'application/json';
 // Backend API URL - Frontend artık backend'e bağlanacak
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
+// Files above 10MB are uploaded in parts through a resumable upload session
+const SINGLE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024;
+const MAX_UPLOAD_SIZE = 200 * 1024 * 1024;
+const PARALLEL_UPLOAD_PARTS = 3;
+const UPLOAD_PART_ATTEMPTS = 3;
+
+const readUploadError = async (response) => {
+  const errorData = await response.json().catch(() => ({}));
+  return new Error(errorData.detail || 'Dosya yükleme başarısız');
+};
+
+const uploadFileInParts = async (conversationId, file) => {
+  const uploadsUrl = `${BACKEND_URL}/api/conversations/${conversationId}/uploads`;
+  const sessionResponse = await fetch(uploadsUrl, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ file_name: file.name, file_size: file.size }),
+  });
+  if (!sessionResponse.ok) {
+    throw await readUploadError(sessionResponse);
+  }
+  const session = await sessionResponse.json();
+  const sessionUrl = `${uploadsUrl}/${session.upload_id}`;
+
+  // Each part is retried on its own - a dropped connection only re-sends that part
+  const sendPart = async (partNumber) => {
+    const part = file.slice(partNumber * session.part_size, (partNumber + 1) * session.part_size);
+    for (let attempt = 1; ; attempt++) {
+      let response = null;
+      try {
+        response = await fetch(`${sessionUrl}/parts/${partNumber}`, { method: 'PUT', body: part });
+      } catch (error) {
+        if (attempt >= UPLOAD_PART_ATTEMPTS) throw error;
+      }
+      if (response?.ok) return;
+      if (response && (response.status < 500 || attempt >= UPLOAD_PART_ATTEMPTS)) {
+        throw await readUploadError(response);
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
+    }
+  };
+
+  const remainingParts = [...Array(session.part_count).keys()];
+  const sendParts = async () => {
+    while (remainingParts.length > 0) {
+      await sendPart(remainingParts.shift());
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(PARALLEL_UPLOAD_PARTS, session.part_count) }, sendParts));
+
+  const completeResponse = await fetch(`${sessionUrl}/complete`, { method: 'POST' });
+  if (!completeResponse.ok) {
+    throw await readUploadError(completeResponse);
+  }
+  return completeResponse.json();
+};
+
 function App() {
   // Separate conversation states for each tab - Safe initialization
   const [normalMessages, setNormalMessages] = useState([]); // Safe empty array
@@ -179,19 +236,18 @@ function App() {
     const file = event.target.files[0];
     if (!file) return;
 
-    // Check file size (10MB limit)
-    const maxSize = 10 * 1024 * 1024; // 10MB
-    if (file.size > maxSize) {
+    // Check file size (200MB limit)
+    if (file.size > MAX_UPLOAD_SIZE) {
       toast({
         title: "Dosya çok büyük",
-        description: "Maksimum dosya boyutu 10MB'dir.",
+        description: "Maksimum dosya boyutu 200MB'dir.",
         variant: "destructive",
       });
       return;
     }
 
     // Check file type
-    const allowedTypes = ['pdf', 'xlsx', 'xls', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'];
+    const allowedTypes = ['pdf', 'xlsx', 'xls', 'csv', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'];
     const fileExtension = file.name.split('.').pop().toLowerCase();
     if (!allowedTypes.includes(fileExtension)) {
       toast({
@@ -230,20 +286,25 @@ function App() {
     setIsUploading(true);
     
     try {
-      const formData = new FormData();
-      formData.append('file', file);
+      let result;
+      if (file.size > SINGLE_UPLOAD_MAX_SIZE) {
+        result = await uploadFileInParts(conversationId, file);
+      } else {
+        const formData = new FormData();
+        formData.append('file', file);
 
-      const response = await fetch(`${BACKEND_URL}/api/conversations/${conversationId}/upload`, {
-        method: 'POST',
-        body: formData,
-      });
+        const response = await fetch(`${BACKEND_URL}/api/conversations/${conversationId}/upload`, {
+          method: 'POST',
+          body: formData,
+        });
 
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.detail || 'Dosya yükleme başarısız');
-      }
+        if (!response.ok) {
+          const errorData = await response.json();
+          throw new Error(errorData.detail || 'Dosya yükleme başarısız');
+        }
 
-      const result = await response.json();
+        result = await response.json();
+      }
       
       // Add uploaded file to state for display in chat
       const uploadedFile = {
@@ -785,6 +846,8 @@ function App() {
       const reader = response.body?.getReader();
       const decoder = new TextDecoder();
       let buffer = '';
+      // Stream protocol v2 sends only deltas - accumulate them locally
+      let streamedText = '';
 
       while (true) {
         const { done, value } = await reader.read();
@@ -818,9 +881,11 @@ function App() {
                 setIsMessageLoading(false);
               } else if (data.type === 'chunk') {
                 // Update message with streaming content
+                streamedText += data.content;
+                const streamedContent = data.full_content ?? streamedText;
                 const updateMessage = (prev) => prev.map(msg => 
                   msg.id === botMessageId 
-                    ? { ...msg, content: data.full_content, streaming: true }
+                    ? { ...msg, content: streamedContent, streaming: true }
                     : msg
                 );
                 
@@ -1510,7 +1575,7 @@ function App() {
                 <input
                   ref={fileInputRef}
                   type="file"
-                  accept=".pdf,.xlsx,.xls,.docx,.txt,.jpg,.jpeg,.png,.gif,.bmp,.webp"
+                  accept=".pdf,.xlsx,.xls,.csv,.docx,.txt,.jpg,.jpeg,.png,.gif,.bmp,.webp"
                   onChange={handleFileUpload}
                   className="hidden"
                 />
@@ -1787,7 +1852,7 @@ function App() {
                 <input
                   ref={fileInputRef}
                   type="file"
-                  accept=".pdf,.xlsx,.xls,.docx,.txt,.jpg,.jpeg,.png,.gif,.bmp,.webp"
+                  accept=".pdf,.xlsx,.xls,.csv,.docx,.txt,.jpg,.jpeg,.png,.gif,.bmp,.webp"
                   onChange={handleFileUpload}
                   className="hidden"
                 />
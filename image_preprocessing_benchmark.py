@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark vision preprocessing of uploaded images.
+
+For a ~10 MB PNG photo, a 12 MP camera JPEG (with EXIF orientation) and a
+transparent Retina screenshot, compares the base64 request body the vision
+model used to receive (the original file) with the reduced copy made by
+prepare_vision_image(): payload size, output resolution, preprocessing
+latency and the latency of a later cached lookup. Also checks that no
+metadata survives and that the EXIF orientation was applied.
+"""
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+os.environ.setdefault("EXTRACTION_CACHE_DIR", tempfile.mkdtemp(prefix="bilgin_vision_benchmark_"))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from server import prepare_vision_image, hash_file, init_extraction_executor, shutdown_extraction_executor  # noqa: E402
+from extraction_jobs import VISION_MAX_LONG_EDGE, VISION_MAX_SHORT_EDGE, VISION_JPEG_QUALITY  # noqa: E402
+
+
+def make_photo(size: tuple) -> Image.Image:
+    """Gradient plus sensor-like noise - compresses about as badly as a real photo"""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    return Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+
+def make_png_photo(path: Path):
+    make_photo((3400, 2400)).save(path, "PNG")
+
+
+def make_camera_jpeg(path: Path):
+    """12 MP, stored landscape with orientation 6 (rotate 90°) like a phone camera"""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "Benchmark Camera"
+    make_photo((4000, 3000)).save(path, "JPEG", quality=92, exif=exif)
+
+
+def make_screenshot(path: Path):
+    image = Image.new("RGBA", (2880, 1800), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for line in range(90):
+        draw.text((40, 20 + line * 19), f"Satır {line}: Ankara İstanbul İzmir toplam 1.234.567,89 TL", fill=(20, 20, 20, 255))
+    image.save(path, "PNG")
+
+
+FIXTURES = {
+    "photo.png": make_png_photo,
+    "camera.jpg": make_camera_jpeg,
+    "screenshot.png": make_screenshot,
+}
+
+
+def base64_kb(path: Path) -> float:
+    return len(base64.b64encode(path.read_bytes())) / 1024
+
+
+async def run_benchmark():
+    print("📊 IMAGE PREPROCESSING BENCHMARK")
+    print(f"   target {VISION_MAX_LONG_EDGE}px long / {VISION_MAX_SHORT_EDGE}px short edge, JPEG quality {VISION_JPEG_QUALITY}")
+    print("=" * 80)
+
+    init_extraction_executor()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        # Warm the workers up so the first measurement doesn't include process start-up
+        Image.new("RGB", (8, 8)).save(tmp_dir / "warmup.png")
+        await prepare_vision_image(str(tmp_dir / "warmup.png"))
+
+        for name, make in FIXTURES.items():
+            path = tmp_dir / name
+            make(path)
+            content_hash = hash_file(str(path))
+            with Image.open(path) as original:
+                original_size = original.size
+
+            started = time.perf_counter()
+            vision_path = await prepare_vision_image(str(path), content_hash)
+            prepare_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            assert await prepare_vision_image(str(path), content_hash) == vision_path
+            cached_ms = (time.perf_counter() - started) * 1000
+
+            with Image.open(vision_path) as reduced:
+                reduced_size = reduced.size
+                assert not reduced.getexif() and "icc_profile" not in reduced.info, f"{name}: metadata survived"
+            if name == "camera.jpg":
+                assert reduced_size[0] < reduced_size[1], "EXIF orientation was not applied"
+
+            original_kb = base64_kb(path)
+            reduced_kb = base64_kb(vision_path)
+            print(f"\n🧪 {name} ({path.stat().st_size / (1024 * 1024):.1f} MB, {original_size[0]}x{original_size[1]})")
+            print(f"   request body  {original_kb:>8.0f} KB -> {reduced_kb:>6.0f} KB base64  ({original_kb / reduced_kb:.0f}x smaller, {reduced_size[0]}x{reduced_size[1]})")
+            print(f"   preprocessing {prepare_ms:>8.0f} ms at upload, {cached_ms:.1f} ms cached lookup per question")
+
+    shutdown_extraction_executor()
+    print("\n✅ No EXIF/ICC metadata in any reduced image, camera orientation applied")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
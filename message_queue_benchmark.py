@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the write-behind message queue against per-message insert_one.
+
+Against a live MongoDB at MONGO_URL, CONCURRENT_CHATS simulated chats each
+store MESSAGES_PER_CHAT messages, first with an awaited insert_one per
+message (what the request path used to wait for) and then through
+message_queue. Reports the latency each request spends persisting, total
+throughput and the batch sizes the queue formed. Then points the queue at an
+unreachable MongoDB, checks that the batches land in the journal, and that
+they are replayed in order once the database is back. The benchmark
+database is dropped at the end.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+os.environ["MESSAGE_JOURNAL_PATH"] = str(Path(tempfile.mkdtemp(prefix="bilgin_journal_benchmark_")) / "message_journal.jsonl")
+os.environ.setdefault("MESSAGE_QUEUE_RETRY_SECONDS", "0.5")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import server  # noqa: E402
+from server import (  # noqa: E402
+    message_queue, create_indexes, prepare_for_mongo, Message, MESSAGE_QUEUE_BATCH_SIZE, MESSAGE_QUEUE_MAX_AGE, client, db
+)
+
+CONCURRENT_CHATS = 50
+MESSAGES_PER_CHAT = 40
+OUTAGE_MESSAGES = 300
+
+
+def make_message(chat: int, i: int) -> dict:
+    role = "user" if i % 2 == 0 else "assistant"
+    return prepare_for_mongo(Message(conversation_id=f"bench-{chat}", role=role, content=f"{i}. mesaj " * 20).dict())
+
+
+async def store_direct(chat: int) -> list:
+    latencies = []
+    for i in range(MESSAGES_PER_CHAT):
+        started = time.perf_counter()
+        await db.messages.insert_one(make_message(chat, i))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0)
+    return latencies
+
+
+async def store_queued(chat: int) -> list:
+    latencies = []
+    for i in range(MESSAGES_PER_CHAT):
+        started = time.perf_counter()
+        message_queue.put(make_message(chat, i))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0)
+    return latencies
+
+
+async def measure(name: str, store) -> None:
+    await db.messages.delete_many({})
+    started = time.perf_counter()
+    latencies = [ms for chat in await asyncio.gather(*(store(chat) for chat in range(CONCURRENT_CHATS))) for ms in chat]
+    await message_queue.flush()
+    wall_seconds = time.perf_counter() - started
+    stored = await db.messages.count_documents({})
+    assert stored == CONCURRENT_CHATS * MESSAGES_PER_CHAT, f"{name}: {stored} messages stored"
+    print(f"\n🧪 {name}")
+    print(f"   persistence latency per request: median {statistics.median(latencies):.3f} ms, "
+          f"p99 {sorted(latencies)[int(len(latencies) * 0.99)]:.3f} ms")
+    print(f"   {stored} messages in {wall_seconds:.2f}s ({stored / wall_seconds:.0f} messages/s)")
+
+
+async def run_benchmark():
+    print("📊 MESSAGE WRITE-BEHIND QUEUE BENCHMARK")
+    print(f"   {CONCURRENT_CHATS} chats x {MESSAGES_PER_CHAT} messages, batches of up to {MESSAGE_QUEUE_BATCH_SIZE}, "
+          f"max age {MESSAGE_QUEUE_MAX_AGE * 1000:.0f} ms")
+    print("=" * 80)
+
+    await client.drop_database(db.name)
+    await create_indexes()
+    await message_queue.start()
+
+    await measure("insert_one per message (request waits)", store_direct)
+    before = dict(message_queue.stats)
+    await measure("write-behind queue", store_queued)
+    batches = message_queue.stats["batches"] - before["batches"]
+    print(f"   {batches} insert_many batches, largest {message_queue.stats['max_batch']}, "
+          f"deepest queue {message_queue.stats['max_depth']}")
+
+    print("\n🧪 MongoDB outage")
+    await db.messages.delete_many({})
+    server.db = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=300)[db.name]
+    for i in range(OUTAGE_MESSAGES):
+        message_queue.put(make_message(0, i))
+    await message_queue.flush()
+    print(f"   while down: {message_queue.get_stats()['journal_depth']} messages journaled to {message_queue.journal_path}")
+    assert message_queue.journal_depth == OUTAGE_MESSAGES
+
+    server.db = db
+    message_queue.last_failure = 0.0
+    started = time.perf_counter()
+    await message_queue.flush()
+    replayed = [message["content"] async for message in db.messages.find({}, {"content": 1}).sort("_id", 1)]
+    assert message_queue.journal_depth == 0 and not message_queue.journal_path.exists()
+    assert replayed == [make_message(0, i)["content"] for i in range(OUTAGE_MESSAGES)], "journal replay lost or reordered messages"
+    print(f"   after recovery: {len(replayed)} messages replayed in order in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    await message_queue.close()
+    await client.drop_database(db.name)
+    print(f"\n   queue stats: {message_queue.get_stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot MongoDB queries before and after create_indexes().
+
+Seeds a throwaway database (DB_NAME, default bilgin_benchmark) with users,
+sessions, conversations, messages and file records, then explains each query
+the API runs on every request - session lookup, conversation list, message
+history, message count, latest file - with executionStats. Prints the winning
+plan (COLLSCAN / IXSCAN, in-memory SORT), documents and keys examined and the
+execution time without and with the declared indexes, and fails if any hot
+query still scans the collection afterwards. Needs a running MongoDB at
+MONGO_URL; the benchmark database is dropped at the end.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from server import create_indexes, build_index_report, client, db  # noqa: E402
+
+USER_COUNT = 500
+CONVERSATIONS_PER_USER = 10
+MESSAGES_PER_CONVERSATION = 40
+FILES_PER_CONVERSATION = 2
+
+
+async def seed() -> dict:
+    """Insert the fixture data and return the ids the queries look up"""
+    now = datetime.now(timezone.utc)
+    users, sessions, conversations, messages, files = [], [], [], [], []
+    for u in range(USER_COUNT):
+        user_id = str(uuid.uuid4())
+        users.append({"id": user_id, "username": f"user{u}", "email": f"user{u}@example.com", "created_at": now.isoformat()})
+        sessions.append({"user_id": user_id, "session_token": uuid.uuid4().hex, "expires_at": (now + timedelta(days=7)).isoformat()})
+        for c in range(CONVERSATIONS_PER_USER):
+            conversation_id = str(uuid.uuid4())
+            updated = now - timedelta(minutes=u * CONVERSATIONS_PER_USER + c)
+            conversations.append({"id": conversation_id, "user_id": user_id, "title": f"Sohbet {c}", "updated_at": updated.isoformat()})
+            for m in range(MESSAGES_PER_CONVERSATION):
+                messages.append({
+                    "id": str(uuid.uuid4()), "conversation_id": conversation_id, "role": "user" if m % 2 == 0 else "assistant",
+                    "content": "Merhaba, bu bir deneme mesajıdır. " * 4, "timestamp": (updated + timedelta(seconds=m)).isoformat()
+                })
+            for f in range(FILES_PER_CONVERSATION):
+                files.append({
+                    "id": str(uuid.uuid4()), "conversation_id": conversation_id, "file_name": f"rapor{f}.pdf",
+                    "uploaded_at": (updated + timedelta(seconds=f)).isoformat(), "summary_status": "ready"
+                })
+    for name, documents in (("users", users), ("sessions", sessions), ("conversations", conversations),
+                            ("messages", messages), ("file_uploads", files)):
+        await db[name].insert_many(documents, ordered=False)
+    middle = USER_COUNT // 2
+    return {
+        "user_id": users[middle]["id"], "username": users[middle]["username"], "email": users[middle]["email"],
+        "session_token": sessions[middle]["session_token"],
+        "conversation_id": conversations[middle * CONVERSATIONS_PER_USER]["id"],
+    }
+
+
+def hot_queries(ids: dict) -> dict:
+    """The API's per-request queries as explain commands"""
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "session lookup": {"find": "sessions", "filter": {"session_token": ids["session_token"], "expires_at": {"$gt": now}}, "limit": 1},
+        "login / register": {"find": "users", "filter": {"$or": [{"username": ids["username"]}, {"email": ids["email"]}]}, "limit": 1},
+        "conversation list": {"find": "conversations", "filter": {"user_id": ids["user_id"]}, "sort": {"updated_at": -1, "id": -1}, "limit": 51},
+        "message history": {"find": "messages", "filter": {"conversation_id": ids["conversation_id"]}, "sort": {"timestamp": -1, "id": -1}, "limit": 51},
+        "message count": {"count": "messages", "query": {"conversation_id": ids["conversation_id"]}},
+        "latest file": {"find": "file_uploads", "filter": {"conversation_id": ids["conversation_id"]}, "sort": {"uploaded_at": -1}, "limit": 1},
+    }
+
+
+def plan_stages(plan: dict) -> list:
+    """Stage names of a winning plan, outermost first"""
+    stages = [plan.get("stage", "?")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+async def explain(command: dict) -> dict:
+    result = await db.command({"explain": command, "verbosity": "executionStats"})
+    stats = result["executionStats"]
+    return {
+        "stages": plan_stages(result["queryPlanner"]["winningPlan"]),
+        "docs": stats["totalDocsExamined"],
+        "keys": stats["totalKeysExamined"],
+        "returned": stats["nReturned"],
+        "ms": stats["executionTimeMillis"],
+    }
+
+
+def describe(result: dict) -> str:
+    return (f"{' <- '.join(result['stages']):<38} docs {result['docs']:>7}  keys {result['keys']:>5}  "
+            f"returned {result['returned']:>3}  {result['ms']:>4} ms")
+
+
+async def run_benchmark():
+    print("📊 MONGODB INDEX BENCHMARK")
+    print(f"   {USER_COUNT} users, {USER_COUNT * CONVERSATIONS_PER_USER} conversations, "
+          f"{USER_COUNT * CONVERSATIONS_PER_USER * MESSAGES_PER_CONVERSATION} messages in {db.name}")
+    print("=" * 80)
+
+    await client.drop_database(db.name)
+    ids = await seed()
+    queries = hot_queries(ids)
+
+    before = {name: await explain(command) for name, command in queries.items()}
+    started = time.perf_counter()
+    created = await create_indexes()
+    build_seconds = time.perf_counter() - started
+    after = {name: await explain(command) for name, command in queries.items()}
+
+    for name in queries:
+        print(f"\n🧪 {name}")
+        print(f"   without indexes  {describe(before[name])}")
+        print(f"   with indexes     {describe(after[name])}")
+
+    print(f"\n   {created} indexes built in {build_seconds:.2f}s")
+    report = await build_index_report()
+    for collection_name, collection_report in report.items():
+        usage = collection_report["usage"] or {}
+        print(f"   {collection_name:<16} missing {collection_report['missing'] or '-'}  "
+              f"used {sorted(name for name, ops in usage.items() if ops) or '-'}")
+
+    await client.drop_database(db.name)
+    scans = [name for name, result in after.items() if "COLLSCAN" in result["stages"] or "SORT" in result["stages"]]
+    assert not scans, f"Still scanning or sorting in memory after indexing: {scans}"
+    print("\n✅ Every hot query uses an index, no collection scans or in-memory sorts")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
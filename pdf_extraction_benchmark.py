@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for page-parallel PDF extraction.
+
+For 50-, 300- and 1000-page fixtures, compares the serial PyPDF2 walk (one
+worker, every page in turn) with extract_pdf_text(), which shards page ranges
+across the extraction pool. Also reports how long an upload waits before the
+first PDF_EARLY_PAGES pages are usable. Speedup is bounded by
+EXTRACTION_POOL_WORKERS (at most the number of CPUs).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from extraction_event_loop_benchmark import make_pdf  # noqa: E402
+from server import (  # noqa: E402
+    _extract_text_sync, extract_pdf_text, run_extraction_job, init_extraction_executor,
+    shutdown_extraction_executor, EXTRACTION_POOL_WORKERS, PDF_PAGES_PER_SHARD, PDF_EARLY_PAGES
+)
+
+PAGE_COUNTS = (50, 300, 1000)
+
+
+class Progress:
+    """The parts of PdfUploadExtraction that extract_pdf_text() fills in"""
+
+    def __init__(self):
+        self.pages = []
+        self.page_count = None
+        self.early_ready = asyncio.Event()
+
+
+async def measure_serial(path: Path) -> tuple:
+    started = time.perf_counter()
+    text = await run_extraction_job(_extract_text_sync, str(path), "pdf")
+    return time.perf_counter() - started, text
+
+
+async def measure_parallel(path: Path) -> tuple:
+    progress = Progress()
+
+    async def wait_for_early_pages():
+        await progress.early_ready.wait()
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    early_task = asyncio.create_task(wait_for_early_pages())
+    text = await extract_pdf_text(str(path), progress)
+    wall_seconds = time.perf_counter() - started
+    # Documents shorter than PDF_EARLY_PAGES are only usable once they are complete
+    early_seconds = (await early_task - started) if progress.early_ready.is_set() else wall_seconds
+    early_task.cancel()
+    return wall_seconds, early_seconds, text
+
+
+async def run_benchmark():
+    print("📊 PDF EXTRACTION THROUGHPUT BENCHMARK")
+    print(f"   extraction pool workers: {EXTRACTION_POOL_WORKERS}, at least {PDF_PAGES_PER_SHARD} pages per shard, early pages: {PDF_EARLY_PAGES}")
+    print("=" * 80)
+
+    init_extraction_executor()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        # Warm the workers up so the first measurement doesn't include process start-up
+        make_pdf(tmp_dir / "warmup.pdf", 2)
+        await extract_pdf_text(str(tmp_dir / "warmup.pdf"))
+
+        for page_count in PAGE_COUNTS:
+            path = tmp_dir / f"fixture-{page_count}.pdf"
+            make_pdf(path, page_count)
+            print(f"\n🧪 {page_count} pages ({path.stat().st_size / (1024 * 1024):.1f} MB)")
+
+            serial_seconds, serial_text = await measure_serial(path)
+            parallel_seconds, early_seconds, parallel_text = await measure_parallel(path)
+            assert parallel_text == serial_text, "page-parallel text differs from the serial extraction"
+
+            print(f"   serial          {serial_seconds:>7.2f}s  {page_count / serial_seconds:>7.0f} pages/s")
+            print(f"   page-parallel   {parallel_seconds:>7.2f}s  {page_count / parallel_seconds:>7.0f} pages/s"
+                  f"  ({serial_seconds / parallel_seconds:.1f}x)")
+            print(f"   first {min(PDF_EARLY_PAGES, page_count)} pages usable after {early_seconds:.2f}s")
+
+    shutdown_extraction_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
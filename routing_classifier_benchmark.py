@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Equivalence check and microbenchmark for the compiled routing classifier.
+
+classify_question() must return exactly what the legacy predicates kept
+below (get_question_category, is_formula_based_question, requires_web_search,
+...) return for the same normalized question. Normalization is the only intended
+difference: Turkish casefolding (İ -> i, I -> ı) and stripping, so e.g.
+"İstanbul hava" now matches the 'istanbul' rules that str.lower() missed.
+An uppercase I is read both ways - "IRR" and "BITCOIN" keep matching as
+Latin terms - so for plain ASCII questions nothing the legacy predicates
+found on the raw input may be lost.
+"""
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from server import (  # noqa: E402
+    classify_question, casefold_readings, CATEGORY_CASUAL_PATTERNS, CATEGORY_CURRENT_PATTERNS,
+    CATEGORY_FACTUAL_PATTERNS, CATEGORY_MATH_PATTERN, FORMULA_KEYWORDS, FORMULA_MATH_PATTERNS,
+    WEB_SEARCH_PATTERNS, CASUAL_SHORT_WORDS, CASUAL_CHAT_PATTERNS, TECHNICAL_CREATIVE_KEYWORDS,
+    GENERAL_KNOWLEDGE_KEYWORDS, FILE_DIRECT_REFERENCES, FILE_PROCESSING_ACTIONS, FILE_CONTEXT_WORDS
+)
+
+
+# Legacy predicates - the pattern-by-pattern routing server.py used before classify_question
+
+
+def get_question_category(question: str) -> str:
+    question_lower = question.lower().strip()
+    for category, patterns in (
+        ('casual', CATEGORY_CASUAL_PATTERNS),
+        ('current', CATEGORY_CURRENT_PATTERNS),
+        ('factual', CATEGORY_FACTUAL_PATTERNS),
+        ('math', [CATEGORY_MATH_PATTERN]),
+    ):
+        if any(re.search(pattern, question_lower) for pattern in patterns):
+            return category
+    return 'general'
+
+
+def is_formula_based_question(question: str) -> bool:
+    question_lower = question.lower()
+    has_keywords = any(keyword in question_lower for keyword in FORMULA_KEYWORDS)
+    has_math_pattern = any(re.search(pattern, question_lower) for pattern in FORMULA_MATH_PATTERNS)
+    return has_keywords or has_math_pattern
+
+
+def requires_web_search(question: str) -> bool:
+    question_lower = question.lower()
+    return any(re.search(pattern, question_lower) for pattern in WEB_SEARCH_PATTERNS)
+
+
+def is_casual_chat(question: str) -> bool:
+    question_lower = question.lower().strip()
+    if len(question_lower) <= 15 and any(word in question_lower for word in CASUAL_SHORT_WORDS):
+        return True
+    return any(re.search(pattern, question_lower) for pattern in CASUAL_CHAT_PATTERNS)
+
+
+def is_technical_or_creative_question(question: str) -> bool:
+    question_lower = question.lower()
+    return any(keyword in question_lower for keyword in TECHNICAL_CREATIVE_KEYWORDS)
+
+
+def is_general_knowledge_question(question: str) -> bool:
+    question_lower = question.lower()
+    return any(keyword in question_lower for keyword in GENERAL_KNOWLEDGE_KEYWORDS)
+
+
+def is_question_about_uploaded_file(question: str) -> bool:
+    question_lower = question.lower()
+    if any(keyword in question_lower for keyword in FILE_DIRECT_REFERENCES):
+        return True
+    has_processing_action = any(action in question_lower for action in FILE_PROCESSING_ACTIONS)
+    has_context_word = any(context in question_lower for context in FILE_CONTEXT_WORDS)
+    return has_processing_action and has_context_word
+
+
+LEGACY_PREDICATES = {
+    "category": get_question_category,
+    "is_formula": is_formula_based_question,
+    "requires_web_search": requires_web_search,
+    "is_casual_chat": is_casual_chat,
+    "is_technical_or_creative": is_technical_or_creative_question,
+    "is_general_knowledge": is_general_knowledge_question,
+    "is_about_uploaded_file": is_question_about_uploaded_file,
+}
+
+QUESTIONS = [
+    # Casual
+    "merhaba", "Selam", "naber", "nasılsın", "hi", "teşekkür ederim", "tamam", "günaydın",
+    "bugün çok yoruldum, işten yeni geldim", "canım sıkılıyor biraz sohbet edelim mi",
+    "nasıl gidiyor?", "ne yapıyorsun şu an?",
+    # Current / web search
+    "bugün hava durumu nasıl", "İstanbul hava sıcaklık kaç derece", "dolar kuru ne kadar",
+    "bugün dolar kur fiyatı", "son dakika haber var mı", "Galatasaray maçı skoru ne oldu",
+    "dün maç sonuç ne", "trafik durumu nasıl", "2025 çıkan filmler hangileri",
+    "market çalışma saatleri", "konser etkinlikleri bu hafta tarih", "bitcoin anlık fiyat",
+    "iphone yeni model ne zaman çıkıyor", "chatgpt son sürümü nedir", "canlı borsa verileri",
+    # Factual
+    "Türkiye'nin başkenti neresidir", "Nutuk'u kim yazdı", "Everest kaç metre",
+    "Atatürk'ün doğum tarihi nedir", "Osmanlı İmparatorluğu ne zaman kuruldu ve kim kurdu",
+    "Sefiller kimin eseri",
+    # Formula / math
+    "2+2 kaç eder", "bir kredinin aylık faiz ödemesini nasıl hesaplarım", "x = 5 ise 2x + 3 nedir",
+    "integral ve türev arasındaki fark", "standart sapma formülü", "NPV ve IRR hesaplama",
+    "ohm kanunu nedir", "∫ x dx çöz", "%20 indirimli fiyat", "p_{0} olasılığı",
+    "Reynolds sayısı nasıl bulunur", "karekök 144",
+    # General / technical / creative
+    "bana bir şiir yaz", "bu metni İngilizce çevir", "özgeçmiş yazmama yardım et",
+    "iş planı hazırla", "yapay zeka etik sorunları", "sağlıklı beslenme önerileri",
+    "felsefe nedir", "kariyer tavsiyesi ver",
+    # Files
+    "bu pdf'i özetle", "yüklediğim dosyada ne yazıyor", "excel tablosundaki veriyi analiz et",
+    "bu belgeyi düzelt", "şu içeriği özetle",
+    # Casefolding and whitespace edge cases
+    "İSTANBUL HAVA NASIL", "IŞIK HIZI KAÇ", "  merhaba  ", "Merhaba\n", "NASILSIN",
+    "", "   ", "?", "neden gökyüzü mavi?",
+    # Latin-script terms in capitals (I is i here, not ı)
+    "IRR nedir", "ROI hesapla", "AI nedir", "BITCOIN FIYAT", "SUMMARIZE THIS", "HI",
+]
+QUESTIONS += [question.upper() for question in QUESTIONS] + [question.capitalize() for question in QUESTIONS]
+
+
+CATEGORY_PRECEDENCE = ["casual", "current", "factual", "math", "general"]
+
+
+def merge_readings(field: str, values: list):
+    """A flag is set if any reading sets it; the category is the highest-precedence one any reading gets"""
+    if field == "category":
+        return min(values, key=CATEGORY_PRECEDENCE.index)
+    return any(values)
+
+
+def check_equivalence():
+    mismatches = []
+    for question in QUESTIONS:
+        readings = [reading.strip() for reading in casefold_readings(question)]
+        features = classify_question(question)
+        for field, predicate in LEGACY_PREDICATES.items():
+            expected = merge_readings(field, [predicate(reading) for reading in readings])
+            if getattr(features, field) != expected:
+                mismatches.append((question, field, getattr(features, field), expected))
+            # Plain ASCII questions must keep everything the legacy predicates found on the raw input
+            if question.isascii() and question == question.strip():
+                raw = predicate(question)
+                if merge_readings(field, [getattr(features, field), raw]) != getattr(features, field):
+                    mismatches.append((question, f"{field} (raw)", getattr(features, field), raw))
+
+    for mismatch in mismatches:
+        print(f"   ❌ {mismatch}")
+    assert not mismatches, f"{len(mismatches)} routing mismatches"
+    print(f"✅ Equivalence: {len(QUESTIONS)} questions x {len(LEGACY_PREDICATES)} flags match the legacy predicates")
+
+
+def run_legacy(question: str):
+    return tuple(predicate(question) for predicate in LEGACY_PREDICATES.values())
+
+
+def measure(name: str, func, rounds: int = 20):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for question in QUESTIONS:
+            func(question)
+    per_question_us = (time.perf_counter() - start) / (rounds * len(QUESTIONS)) * 1_000_000
+    return name, per_question_us
+
+
+def run_benchmark():
+    print("📊 ROUTING CLASSIFIER BENCHMARK")
+    print("=" * 80)
+
+    check_equivalence()
+
+    results = [
+        measure("legacy predicates (7 calls)", run_legacy),
+        measure("classify_question (uncached)", classify_question.__wrapped__),
+        measure("classify_question (lru_cache)", classify_question),
+    ]
+
+    baseline = results[0][1]
+    print()
+    for name, per_question_us in results:
+        print(f"   {name:<32} {per_question_us:>9.1f} µs/question  ({baseline / per_question_us:>6.1f}x)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
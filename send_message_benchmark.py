@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark the MongoDB round trips on the send_message path.
+
+Replays the original strictly sequential persistence (find conversation,
+count, insert user message, set title, find latest file, answer, insert
+answer, set updated_at) and the pipelined send_message() against a live
+MongoDB at MONGO_URL, with the AI answer replaced by a fixed AI_LATENCY
+sleep so only the database work differs. Reports per message the time
+spent before the answer starts, the time after it finishes and the total DB
+time from the Server-Timing header. The benchmark database is dropped at the end.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from fastapi import Response  # noqa: E402
+
+import server  # noqa: E402
+from server import (  # noqa: E402
+    send_message, create_conversation, create_indexes, generate_conversation_title, prepare_for_mongo,
+    ConversationCreate, Message, MessageCreate, ANONYMOUS_USER_ID, message_queue, client, db
+)
+
+AI_LATENCY = 0.3
+MESSAGES = 20
+ai_started_at = []
+
+
+async def fixed_latency_answer(question, *args, **kwargs):
+    ai_started_at.append(time.perf_counter())
+    await asyncio.sleep(AI_LATENCY)
+    return f"Yanıt: {question}"
+
+
+async def send_original(conversation_id: str, content: str):
+    """The pre-pipelining sequence, one awaited round trip after another"""
+    await db.conversations.find_one({"id": conversation_id, "user_id": ANONYMOUS_USER_ID})
+    is_first_message = await db.messages.count_documents({"conversation_id": conversation_id}) == 0
+    await db.messages.insert_one(prepare_for_mongo(Message(conversation_id=conversation_id, role="user", content=content).dict()))
+    if is_first_message:
+        await db.conversations.update_one(
+            {"id": conversation_id},
+            {"$set": {"title": generate_conversation_title(content), "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+    await db.file_uploads.find_one({"conversation_id": conversation_id}, sort=[("uploaded_at", -1)])
+    answer = await fixed_latency_answer(content)
+    await db.messages.insert_one(prepare_for_mongo(Message(conversation_id=conversation_id, role="assistant", content=answer).dict()))
+    await db.conversations.update_one({"id": conversation_id}, {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}})
+
+
+async def send_pipelined(conversation_id: str, content: str) -> float:
+    response = Response()
+    await send_message(conversation_id, MessageCreate(content=content), response)
+    return float(response.headers["Server-Timing"].split("db;dur=")[1].split(";")[0])
+
+
+async def measure(name: str, send) -> dict:
+    conversation = await create_conversation(ConversationCreate(title="Yeni Sohbet"))
+    before_ai, after_ai, db_ms = [], [], []
+    for i in range(MESSAGES):
+        ai_started_at.clear()
+        started = time.perf_counter()
+        result = await send(conversation.id, f"{i}. soru: enflasyon oranı nedir?")
+        total = time.perf_counter() - started
+        before_ai.append((ai_started_at[0] - started) * 1000)
+        after_ai.append((total - (ai_started_at[0] - started) - AI_LATENCY) * 1000)
+        if result is not None:
+            db_ms.append(result)
+    return {"name": name, "before_ai": before_ai, "after_ai": after_ai, "db_ms": db_ms}
+
+
+async def run_benchmark():
+    print("📊 SEND_MESSAGE PERSISTENCE BENCHMARK")
+    print(f"   {MESSAGES} messages per run, AI answer replaced by a {AI_LATENCY * 1000:.0f} ms sleep, {os.environ['DB_NAME']} at {os.environ['MONGO_URL']}")
+    print("=" * 80)
+
+    await client.drop_database(db.name)
+    await create_indexes()
+    server.generate_ai_answer = fixed_latency_answer
+    await message_queue.start()
+
+    for result in (await measure("sequential (original)", send_original), await measure("pipelined", send_pipelined)):
+        print(f"\n🧪 {result['name']}")
+        print(f"   before the answer starts  median {statistics.median(result['before_ai']):6.1f} ms, max {max(result['before_ai']):6.1f} ms")
+        print(f"   after the answer is ready median {statistics.median(result['after_ai']):6.1f} ms, max {max(result['after_ai']):6.1f} ms")
+        if result["db_ms"]:
+            print(f"   Server-Timing db          median {statistics.median(result['db_ms']):6.1f} ms")
+
+    await message_queue.close()
+    await client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark bytes-per-stream and CPU-per-stream of the /messages/stream SSE formats.
+
+Compares the original encoding (full_content re-serialized on every chunk with
+json.dumps and `+=` accumulation) against SSEStreamEncoder protocol v1 (legacy
+flag) and protocol v2 (delta-only).
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from server import SSEStreamEncoder, ORJSON_AVAILABLE  # noqa: E402
+
+
+def make_chunks(token_count: int) -> list:
+    """Simulate a Novita answer of token_count tokens (~4 chars per token, Turkish text)"""
+    words = "Türkiye'nin başkenti Ankara'dır ve şehir İç Anadolu bölgesinde yer alır .".split()
+    return [words[i % len(words)] + " " for i in range(token_count)]
+
+
+def encode_original(chunks: list) -> int:
+    """The pre-v2 implementation, kept verbatim as the baseline"""
+    total_bytes = 0
+    full_content = ""
+    total_bytes += len(f"data: {json.dumps({'type': 'thinking', 'content': 'BİLGİN düşünüyor...'})}\n\n".encode('utf-8'))
+    for chunk_content in chunks:
+        full_content += chunk_content
+        event = f"data: {json.dumps({'type': 'chunk', 'content': chunk_content, 'full_content': full_content})}\n\n"
+        total_bytes += len(event.encode('utf-8'))
+    total_bytes += len(f"data: {json.dumps({'type': 'complete', 'content': full_content})}\n\n".encode('utf-8'))
+    return total_bytes
+
+
+def encode_with_protocol(chunks: list, protocol: int) -> int:
+    encoder = SSEStreamEncoder(protocol)
+    total_bytes = len(encoder.event('thinking', 'BİLGİN düşünüyor...').encode('utf-8'))
+    for chunk_content in chunks:
+        total_bytes += len(encoder.chunk(chunk_content).encode('utf-8'))
+    total_bytes += len(encoder.complete().encode('utf-8'))
+    return total_bytes
+
+
+def measure(name: str, func, *args):
+    start = time.process_time()
+    total_bytes = func(*args)
+    cpu_ms = (time.process_time() - start) * 1000
+    return name, total_bytes, cpu_ms
+
+
+def run_benchmark():
+    print("📊 SSE STREAMING PROTOCOL BENCHMARK")
+    print(f"   orjson available: {ORJSON_AVAILABLE}")
+    print("=" * 80)
+
+    for token_count in (1000, 4000, 16000):
+        chunks = make_chunks(token_count)
+        answer_bytes = len("".join(chunks).encode('utf-8'))
+        print(f"\n🧪 {token_count} tokens ({answer_bytes / 1024:.1f} KB answer)")
+
+        results = [
+            measure("original (full_content)", encode_original, chunks),
+            measure("protocol v1 (?stream_protocol=1)", encode_with_protocol, chunks, 1),
+            measure("protocol v2 (delta-only)", encode_with_protocol, chunks, 2),
+        ]
+
+        baseline_bytes, baseline_cpu = results[0][1], results[0][2]
+        for name, total_bytes, cpu_ms in results:
+            print(f"   {name:<34} {total_bytes / 1024:>12.1f} KB  {cpu_ms:>9.1f} ms CPU"
+                  f"  ({baseline_bytes / total_bytes:>6.1f}x bytes, {baseline_cpu / max(cpu_ms, 0.001):>6.1f}x CPU)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
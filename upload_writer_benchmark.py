@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chunked upload writer against the original blocking copy.
+
+A ticker coroutine sleeps 10 ms in a loop and records how late it wakes up,
+while several MAX_FILE_SIZE uploads are stored concurrently. Compares the
+original shutil.copyfileobj + hash_file() on the event loop with
+write_upload_to_tmp(), and reports write throughput. Also shows how much an
+oversized upload with an unknown size and a mislabelled upload read before
+they were rejected.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bilgin_benchmark")
+
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from server import (  # noqa: E402
+    write_upload_to_tmp, hash_file, get_upload_stats, UploadRejectedError, BLOB_DIR, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE
+)
+
+TICK_SECONDS = 0.01
+UPLOAD_COUNT = 4
+
+
+def make_upload(size: int, head: bytes = b"%PDF-1.4\n", known_size: bool = True) -> UploadFile:
+    """An upload as FastAPI hands it over - a spooled temp file already rolled over to disk"""
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(head)
+    spool.write(os.urandom(size - len(head)))
+    spool.seek(0)
+    return UploadFile(file=spool, size=size if known_size else None, filename="rapor.pdf")
+
+
+async def write_original(upload: UploadFile, file_type: str) -> tuple:
+    """The pre-chunking behaviour: blocking copy and hash straight on the event loop"""
+    tmp_path = BLOB_DIR / "tmp" / uuid.uuid4().hex
+    with open(tmp_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+    return tmp_path, hash_file(str(tmp_path)), tmp_path.stat().st_size
+
+
+async def measure_lag(write, uploads: list) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS * 2)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(write(upload, "pdf") for upload in uploads))
+    wall_seconds = time.perf_counter() - started
+    done.set()
+    await ticker_task
+
+    for tmp_path, _, _ in results:
+        tmp_path.unlink()
+    return {
+        "wall_seconds": wall_seconds,
+        "bytes": sum(size for _, _, size in results),
+        "hashes": [content_hash for _, content_hash, _ in results],
+        "max_lag_ms": max(lags),
+        "p99_lag_ms": sorted(lags)[min(len(lags) - 1, int(len(lags) * 0.99))],
+        "ticks": len(lags),
+    }
+
+
+async def measure_rejection(name: str, upload: UploadFile, file_type: str):
+    started = time.perf_counter()
+    try:
+        await write_upload_to_tmp(upload, file_type)
+        outcome = "accepted"
+    except UploadRejectedError as e:
+        outcome = f"{e.status_code} after {upload.file.tell() / (1024 * 1024):.1f} MB read"
+    print(f"   {name:<36} {outcome} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+async def run_benchmark():
+    print("📊 UPLOAD WRITER BENCHMARK")
+    print(f"   {UPLOAD_COUNT} concurrent uploads of {MAX_FILE_SIZE / (1024 * 1024):.0f} MB, chunk {UPLOAD_CHUNK_SIZE // 1024} KB")
+    print("=" * 80)
+
+    for name, write in (("blocking copy (event loop)", write_original), ("chunked writer", write_upload_to_tmp)):
+        uploads = [make_upload(MAX_FILE_SIZE) for _ in range(UPLOAD_COUNT)]
+        digests = [hashlib.sha256(upload.file.read()).hexdigest() for upload in uploads]
+        for upload in uploads:
+            upload.file.seek(0)
+        result = await measure_lag(write, uploads)
+        assert result["hashes"] == digests, f"{name}: stored content hash differs from the upload"
+        print(f"\n🧪 {name}")
+        print(f"   wall time {result['wall_seconds']:.2f}s, {result['bytes'] / (1024 * 1024) / result['wall_seconds']:.0f} MB/s")
+        print(f"   event-loop lag: max {result['max_lag_ms']:.0f} ms, p99 {result['p99_lag_ms']:.0f} ms over {result['ticks']} ticks")
+
+    stats = get_upload_stats()
+    print(f"\n   writer stats: {stats['throughput_mb_s']} MB/s per upload, longest event-loop step {stats['max_loop_block_ms']:.2f} ms")
+
+    print("\n🧪 rejections")
+    await measure_rejection("50 MB upload, size unknown", make_upload(50 * 1024 * 1024, known_size=False), "pdf")
+    await measure_rejection("10 MB zip renamed to .pdf", make_upload(MAX_FILE_SIZE, head=b"PK\x03\x04"), "pdf")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())